@@ -8,13 +8,23 @@ for candidate in (backend_dir_parent, backend_dir_local):
     if os.path.isdir(candidate) and candidate not in sys.path:
         sys.path.append(candidate)
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+import multiprocessing
 import time
 import logging
-from services.email_processor import EmailProcessor
+from services.email_processor import EmailProcessor, UnsupportedFileError
 from services.ai_classifier import AIClassifier
 from services.response_generator import ResponseGenerator
+from services.pipeline import EmailPipeline
+from services.result_cache import ResultCache
+from services.near_duplicate_cache import NearDuplicateCache
+from services.llm_client import get_llm_factory
+from services.metrics import REGISTRY
+from services.tracing import trace_span
+from services.stream_reader import JsonStreamReader, StreamFormatError
+from services.request_helpers import (add_timings, detach_upload, ndjson_response, register_request_hooks,
+                                      sse_response, use_cache_for)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -25,28 +35,58 @@ CORS(app, origins=['*'])
 email_processor = EmailProcessor()
 ai_classifier = AIClassifier()
 response_generator = ResponseGenerator()
+result_cache = ResultCache()
+near_duplicate_cache = NearDuplicateCache()
+pipeline = EmailPipeline(email_processor, ai_classifier, response_generator, result_cache,
+                         near_duplicate_cache)
+
+# Processos do pool de PDFs (start method 'spawn') reimportam este arquivo como __mp_main__:
+# neles nada é pré-carregado e nenhuma thread em segundo plano é iniciada
+if multiprocessing.parent_process() is None:
+    # Por padrão módulos pesados (PyPDF2, openai, modelo local) carregam no primeiro uso;
+    # LAZY_INIT=false antecipa esse custo para a inicialização
+    if os.environ.get('LAZY_INIT', 'true').lower() == 'false':
+        pipeline.warm_up()
+
+    # Com METRICS_MULTIPROC_DIR cada worker grava suas métricas para o /metrics somar
+    REGISTRY.start()
+
+register_request_hooks(app)
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'healthy', 'message': 'AutoU Email Classifier API is running'})
 
+@app.route('/api/stats', methods=['GET'])
+def stats():
+    return jsonify({'cache': result_cache.stats(), 'near_duplicate': near_duplicate_cache.stats(),
+                    'coalescing': pipeline.single_flight.stats(), 'llm_pool': get_llm_factory().stats(),
+                    'cascade': ai_classifier.cascade_stats.stats()})
+
 @app.route('/api/classify', methods=['POST'])
 def classify_email():
     start_time = time.time()
     
     try:
-        if 'file' in request.files:
-            file = request.files['file']
+        data = None
+        with trace_span('upload'):
+            file = request.files.get('file')
+            if file is None:
+                try:
+                    data = request.get_json(force=True)
+                except Exception as json_error:
+                    logger.error(f"Erro ao decodificar JSON: {str(json_error)}")
+                    return jsonify({'error': 'JSON inválido ou problema de encoding'}), 400
+
+        if file is not None:
             if file.filename == '':
                 return jsonify({'error': 'Nenhum arquivo selecionado'}), 400
             email_text = email_processor.process_file(file)
         else:
-            try:
-                data = request.get_json(force=True)
-            except Exception as json_error:
-                logger.error(f"Erro ao decodificar JSON: {str(json_error)}")
-                return jsonify({'error': 'JSON inválido ou problema de encoding'}), 400
-            
             if not data or 'text' not in data:
                 return jsonify({'error': 'Texto do email é obrigatório'}), 400
             email_text = data.get('text', '')
@@ -54,22 +94,23 @@ def classify_email():
         if not email_text.strip():
             return jsonify({'error': 'Email vazio ou inválido'}), 400
 
-        processed_text = email_processor.preprocess_text(email_text)
-        classification = ai_classifier.classify(processed_text)
-        suggested_response = response_generator.generate_response(email_text, classification)
+        result = pipeline.process(email_text, use_cache=use_cache_for(data))
 
         processing_time = round(time.time() - start_time, 3)
 
         response_data = {
             'original_text': email_text,
-            'category': classification,
-            'suggested_response': suggested_response,
-            'confidence': ai_classifier.get_last_confidence(),
+            'category': result['category'],
+            'suggested_response': result['suggested_response'],
+            'confidence': result['confidence'],
+            'cached': result['cached'],
             'processing_time': processing_time
         }
         
-        return jsonify(response_data), 200
+        return jsonify(add_timings(response_data, data)), 200
 
+    except (UnsupportedFileError, StreamFormatError) as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Erro ao processar email: {str(e)}")
         return jsonify({'error': f'Erro interno do servidor: {str(e)}'}), 500
@@ -77,8 +118,23 @@ def classify_email():
 @app.route('/api/classify/batch', methods=['POST'])
 def classify_batch():
     try:
+        file = request.files.get('file')
+        if file is not None:
+            # Só .eml: os resultados de um .mbox inteiro não caberiam em uma única resposta
+            # em memória, então caixas vão para as rotas que gravam ou enviam aos poucos
+            if file.filename.lower().endswith('.mbox'):
+                return jsonify({'error': 'Arquivos .mbox devem ser enviados para /api/classify/stream'}), 400
+            if not file.filename.lower().endswith('.eml'):
+                return jsonify({'error': 'Envie um arquivo .eml'}), 400
+            start_time = time.time()
+            use_cache = use_cache_for()
+            results = pipeline.process_items(list(email_processor.iter_mail_items(file)), use_cache=use_cache)
+            processing_time = round(time.time() - start_time, 3)
+            return jsonify(add_timings({'results': results, 'processing_time': processing_time})), 200
+
         try:
-            data = request.get_json(force=True)
+            with trace_span('upload'):
+                data = request.get_json(force=True)
         except Exception as json_error:
             logger.error(f"Erro ao decodificar JSON: {str(json_error)}")
             return jsonify({'error': 'JSON inválido ou problema de encoding'}), 400
@@ -87,31 +143,70 @@ def classify_batch():
             return jsonify({'error': 'Lista de emails é obrigatória'}), 400
 
         emails = data.get('emails', [])
-        results = []
+        if not isinstance(emails, list):
+            return jsonify({'error': 'Lista de emails é obrigatória'}), 400
 
-        for i, email_text in enumerate(emails):
-            try:
-                item_start_time = time.time()
-                processed_text = email_processor.preprocess_text(email_text)
-                classification = ai_classifier.classify(processed_text)
-                suggested_response = response_generator.generate_response(email_text, classification)
-                item_processing_time = round(time.time() - item_start_time, 3)
-                
-                results.append({
-                    'index': i,
-                    'category': classification,
-                    'suggested_response': suggested_response,
-                    'confidence': ai_classifier.get_last_confidence(),
-                    'processing_time': item_processing_time
-                })
-            except Exception as e:
-                results.append({'index': i, 'error': str(e)})
-
-        return jsonify({'results': results}), 200
+        start_time = time.time()
+        results = pipeline.process_many(emails, use_cache=use_cache_for(data))
+        processing_time = round(time.time() - start_time, 3)
+
+        return jsonify(add_timings({'results': results, 'processing_time': processing_time}, data)), 200
 
     except Exception as e:
         logger.error(f"Erro ao processar lote de emails: {str(e)}")
         return jsonify({'error': f'Erro interno do servidor: {str(e)}'}), 500
 
+@app.route('/api/classify/stream', methods=['POST'])
+def classify_stream():
+    # O corpo é lido direto de request.stream (NDJSON ou array JSON), ou vem
+    # como arquivo .eml/.mbox em multipart, e os resultados saem em NDJSON à
+    # medida que ficam prontos
+    if request.mimetype == 'multipart/form-data':
+        file = request.files.get('file')
+        if file is None or not email_processor.is_mail_file(file.filename):
+            return jsonify({'error': 'Envie um arquivo .eml ou .mbox'}), 400
+        use_cache = use_cache_for()
+        upload = detach_upload(file)
+        reader = email_processor.iter_mail_items(upload)
+    else:
+        upload = None
+        use_cache = use_cache_for(read_form=False)
+        reader = JsonStreamReader(request.stream)
+
+    return ndjson_response(pipeline, reader, use_cache, upload)
+
+@app.route('/api/classify/sse', methods=['POST'])
+def classify_sse():
+    # Mesma entrada de /classify; categoria e confiança saem como evento assim
+    # que o classificador termina e a resposta sugerida vem em seguida, trecho a trecho
+    data = None
+    with trace_span('upload'):
+        file = request.files.get('file')
+        if file is None:
+            try:
+                data = request.get_json(force=True)
+            except Exception as json_error:
+                logger.error(f"Erro ao decodificar JSON: {str(json_error)}")
+                return jsonify({'error': 'JSON inválido ou problema de encoding'}), 400
+
+    try:
+        if file is not None:
+            if file.filename == '':
+                return jsonify({'error': 'Nenhum arquivo selecionado'}), 400
+            email_text = email_processor.process_file(file)
+        else:
+            if not data or 'text' not in data:
+                return jsonify({'error': 'Texto do email é obrigatório'}), 400
+            email_text = data.get('text', '')
+    except (UnsupportedFileError, StreamFormatError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro ao processar email: {str(e)}")
+        return jsonify({'error': f'Erro interno do servidor: {str(e)}'}), 500
+
+    if not isinstance(email_text, str) or not email_text.strip():
+        return jsonify({'error': 'Email vazio ou inválido'}), 400
+    return sse_response(pipeline, email_text, use_cache_for(data))
+
 if __name__ == '__main__':
     app.run(debug=False)
\ No newline at end of file
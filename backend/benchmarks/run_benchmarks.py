@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks dos caminhos quentes do pipeline de emails.
+
+Mede pré-processamento, extração de features, extração de texto de PDFs de
+vários tamanhos, classificação por regras, parsing das respostas do modelo,
+geração de resposta por templates e as rotas /classify e /classify/batch
+(pelo test client do Flask, com regras e com um LLM falso). Roda offline:
+as entradas vêm de um corpus sintético gerado a partir do TRAINING_DATA
+com semente fixa (benchmarks/synthetic.py).
+
+Cada caso é aquecido, calibrado para que uma repetição dure cerca de
+--min-time segundos e repetido --repeats vezes com o coletor de lixo
+desligado. O resultado em JSON (--output) traz o commit e o ambiente, e
+--compare mostra a variação da mediana entre duas execuções.
+
+Uso:
+    python benchmarks/run_benchmarks.py [--quick] [--filter pdf] [--output antes.json]
+    python benchmarks/run_benchmarks.py --output depois.json --compare antes.json
+    python benchmarks/run_benchmarks.py --compare antes.json depois.json [--fail-above 15]
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import logging
+import platform
+import argparse
+import statistics
+import subprocess
+from io import BytesIO
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, NamedTuple, Sequence
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+# Configuração fixa: resultados comparáveis entre máquinas e commits, sem rede e sem caches
+os.environ.pop('OPENAI_API_KEY', None)
+os.environ.pop('METRICS_MULTIPROC_DIR', None)
+os.environ.pop('TRACE_EXPORT_PATH', None)
+os.environ['CLASSIFIER_BACKEND'] = 'rules'
+os.environ['RESULT_CACHE_ENABLED'] = 'false'
+os.environ['NEAR_DUP_CACHE'] = 'false'
+
+from synthetic import MODEL_OUTPUTS, build_corpus, build_email_pdf, fake_clients
+from werkzeug.datastructures import FileStorage
+from services.email_processor import EmailProcessor
+from services.ai_classifier import AIClassifier
+from services.response_generator import ResponseGenerator
+
+PDF_SIZES = (1, 10, 60)
+BATCH_SIZE = 50
+
+
+class Case(NamedTuple):
+    name: str
+    function: Callable
+    inputs: Sequence
+    # Emails processados por chamada (rotas de lote), para a vazão em emails/s
+    items: int = 1
+    context: Callable = nullcontext
+
+
+def _run(function: Callable, inputs: Sequence, ops: int) -> float:
+    count = len(inputs)
+    start = time.perf_counter()
+    for i in range(ops):
+        function(inputs[i % count])
+    return time.perf_counter() - start
+
+
+def measure(case: Case, min_time: float, repeats: int) -> Dict:
+    with case.context():
+        # Aquecimento: imports sob demanda, pools e caches internos ficam fora da medição
+        warmup_ops = min(len(case.inputs), 50)
+        elapsed = _run(case.function, case.inputs, warmup_ops)
+        ops = max(1, int(min_time / max(elapsed / warmup_ops, 1e-9)))
+
+        samples = []
+        gc_enabled = gc.isenabled()
+        for _ in range(repeats):
+            gc.collect()
+            gc.disable()
+            try:
+                samples.append(_run(case.function, case.inputs, ops) / ops)
+            finally:
+                if gc_enabled:
+                    gc.enable()
+
+    median = statistics.median(samples)
+    return {
+        'ops': ops,
+        'repeats': repeats,
+        'items_per_op': case.items,
+        'min_us': round(min(samples) * 1e6, 3),
+        'median_us': round(median * 1e6, 3),
+        'mean_us': round(statistics.fmean(samples) * 1e6, 3),
+        'stdev_us': round(statistics.stdev(samples) * 1e6, 3) if len(samples) > 1 else 0.0,
+        'ops_per_sec': round(1 / median, 2),
+        'items_per_sec': round(case.items / median, 2),
+    }
+
+
+@contextmanager
+def stubbed_llm(classifier: AIClassifier, generator: ResponseGenerator, latency: float):
+    """Troca os clientes da OpenAI por clientes falsos enquanto o caso é medido."""
+    fields = ('client', 'async_client', 'use_openai', 'timeout', 'backend')
+    saved = [(target, {name: getattr(target, name) for name in fields if hasattr(target, name)})
+             for target in (classifier, generator)]
+    try:
+        for target in (classifier, generator):
+            target.client, target.async_client = fake_clients(latency)
+            target.use_openai = True
+        classifier.backend = 'openai'
+        yield
+    finally:
+        for target, values in saved:
+            for name, value in values.items():
+                setattr(target, name, value)
+
+
+def build_cases(corpus: List[str], seed: int, llm_latency: float) -> List[Case]:
+    processor = EmailProcessor()
+    classifier = AIClassifier()
+    generator = ResponseGenerator()
+
+    processed = [processor.preprocess_text(text) for text in corpus]
+    categories = [classifier._classify_with_rules(text)[0] for text in processed]
+    outputs = [(MODEL_OUTPUTS[i % len(MODEL_OUTPUTS)], text) for i, text in enumerate(processed)]
+
+    cases = [
+        Case('preprocess_text', processor.preprocess_text, corpus),
+        Case('extract_email_features', processor.extract_email_features, corpus),
+        Case('classify_with_rules', classifier._classify_with_rules, processed),
+        Case('parse_openai_response', lambda pair: classifier._parse_openai_response(*pair), outputs),
+        Case('generate_with_templates', lambda pair: generator._generate_with_templates(*pair),
+             list(zip(corpus, categories))),
+    ]
+
+    for pages in PDF_SIZES:
+        upload = FileStorage(stream=BytesIO(build_email_pdf(pages, seed)), filename=f'email_{pages}p.pdf')
+        cases.append(Case(f'extract_pdf_text[{pages}p]', processor._extract_pdf_text, [upload]))
+
+    from main import app, pipeline
+    client = app.test_client()
+
+    def post(path: str, payload: Dict):
+        response = client.post(path, json=payload)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} respondeu {response.status_code}: {response.get_data(as_text=True)}")
+        response.close()
+
+    single = [{'text': text, 'cache': False} for text in corpus]
+    batches = [{'emails': corpus[i:i + BATCH_SIZE], 'cache': False}
+               for i in range(0, len(corpus) - BATCH_SIZE + 1, BATCH_SIZE)] or \
+        [{'emails': corpus, 'cache': False}]
+
+    def llm():
+        return stubbed_llm(pipeline.ai_classifier, pipeline.response_generator, llm_latency)
+
+    cases += [
+        Case('route_classify[rules]', lambda payload: post('/classify', payload), single),
+        Case('route_classify[llm]', lambda payload: post('/classify', payload), single, context=llm),
+        Case(f'route_classify_batch[rules,{BATCH_SIZE}]', lambda payload: post('/classify/batch', payload),
+             batches, items=len(batches[0]['emails'])),
+        Case(f'route_classify_batch[llm,{BATCH_SIZE}]', lambda payload: post('/classify/batch', payload),
+             batches, items=len(batches[0]['emails']), context=llm),
+    ]
+    return cases
+
+
+def environment(args) -> Dict:
+    def git(*command):
+        try:
+            return subprocess.run(['git', *command], cwd=BACKEND_DIR, capture_output=True,
+                                  text=True, timeout=10).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    return {
+        'commit': git('rev-parse', 'HEAD'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': args.seed,
+        'corpus_size': args.corpus_size,
+        'min_time': args.min_time,
+        'repeats': args.repeats,
+        'llm_latency_ms': args.llm_latency_ms,
+    }
+
+
+def print_results(results: Dict[str, Dict]):
+    print(f"{'caso':<36} {'mediana':>12} {'mínimo':>12} {'desvio':>8} {'ops/s':>12} {'itens/s':>12}")
+    for name, result in results.items():
+        spread = result['stdev_us'] / result['median_us'] * 100 if result['median_us'] else 0.0
+        print(f"{name:<36} {result['median_us']:>10.1f}µs {result['min_us']:>10.1f}µs "
+              f"{spread:>7.1f}% {result['ops_per_sec']:>12.1f} {result['items_per_sec']:>12.1f}")
+
+
+def compare(baseline: Dict, current: Dict, fail_above: float = None) -> bool:
+    """Variação da mediana por caso; False se algum caso piorou mais que ``fail_above`` %."""
+    print(f"base: {baseline['environment'].get('commit')}  atual: {current['environment'].get('commit')}")
+    print(f"{'caso':<36} {'base':>12} {'atual':>12} {'variação':>10}")
+    ok = True
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            print(f"{name:<36} {'-':>12} {result['median_us']:>10.1f}µs {'novo':>10}")
+            continue
+        change = (result['median_us'] / before['median_us'] - 1) * 100
+        flag = ''
+        if fail_above is not None and change > fail_above:
+            flag = '  REGRESSÃO'
+            ok = False
+        print(f"{name:<36} {before['median_us']:>10.1f}µs {result['median_us']:>10.1f}µs "
+              f"{change:>+9.1f}%{flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmarks do pipeline de emails')
+    parser.add_argument('--filter', default='', help='mede só os casos cujo nome contém o texto')
+    parser.add_argument('--corpus-size', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--min-time', type=float, default=0.2, help='duração alvo de cada repetição (s)')
+    parser.add_argument('--repeats', type=int, default=7)
+    parser.add_argument('--quick', action='store_true', help='--min-time 0.05 --repeats 3')
+    parser.add_argument('--llm-latency-ms', type=float, default=0.0,
+                        help='latência simulada de cada chamada ao LLM falso')
+    parser.add_argument('--output', help='grava os resultados em JSON neste arquivo')
+    parser.add_argument('--compare', nargs='+', metavar='JSON',
+                        help='base (compara com esta execução) ou base e atual (só compara os arquivos)')
+    parser.add_argument('--fail-above', type=float,
+                        help='sai com código 1 se alguma mediana piorar mais que esta porcentagem')
+    args = parser.parse_args()
+    if args.quick:
+        args.min_time, args.repeats = 0.05, 3
+
+    if args.compare and len(args.compare) > 2:
+        parser.error('--compare aceita no máximo dois arquivos')
+    if args.compare and len(args.compare) == 2:
+        with open(args.compare[0], encoding='utf-8') as file:
+            baseline = json.load(file)
+        with open(args.compare[1], encoding='utf-8') as file:
+            current = json.load(file)
+        sys.exit(0 if compare(baseline, current, args.fail_above) else 1)
+
+    # As rotas registram cada requisição; o custo das chamadas fica, a saída no terminal não
+    logging.disable(logging.WARNING)
+    corpus = build_corpus(args.corpus_size, args.seed)
+    cases = [case for case in build_cases(corpus, args.seed, args.llm_latency_ms / 1000)
+             if args.filter in case.name]
+
+    results = {}
+    for case in cases:
+        results[case.name] = measure(case, args.min_time, args.repeats)
+        print(f"  {case.name}: {results[case.name]['median_us']:.1f}µs", file=sys.stderr)
+    report = {'environment': environment(args), 'results': results}
+
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        print(f"Resultados gravados em {args.output}")
+
+    if args.compare:
+        with open(args.compare[0], encoding='utf-8') as file:
+            baseline = json.load(file)
+        if not compare(baseline, report, args.fail_above):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Dados sintéticos para os benchmarks: corpus de emails derivado do
+TRAINING_DATA, PDFs gerados em memória e respostas típicas do modelo.
+
+Tudo é determinístico para uma mesma semente, então execuções em commits
+diferentes medem exatamente as mesmas entradas.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import random
+import hashlib
+import textwrap
+from types import SimpleNamespace
+from typing import List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'training'))
+
+from training_data import TRAINING_DATA
+
+GREETINGS = ['', 'Olá,', 'Bom dia,', 'Boa tarde, equipe.', 'Prezados,', 'Oi pessoal!']
+NAMES = ['Ana Paula Costa', 'Pedro Henrique', 'Mariana Souza', 'Carlos Eduardo Lima', 'Juliana', 'Roberto Alves']
+CLOSINGS = ['', 'Obrigado.', 'Atenciosamente,', 'Aguardo retorno.', 'Grato pela atenção.']
+SIGNATURES = [
+    '',
+    '{name}\nGerente de Contas\nTel.: (11) 9{phone}',
+    '--\n{name}\nEnviado do meu celular',
+    '{name} | Financeiro\nEsta mensagem pode conter informação confidencial. '
+    'Se você a recebeu por engano, apague-a e avise o remetente.',
+]
+QUOTED_HEADER = 'Em {day}/0{month}/2024 às 10:{minute}, {name} <{user}@exemplo.com.br> escreveu:'
+
+
+def build_corpus(size: int, seed: int = 42) -> List[str]:
+    """
+    ``size`` emails variados a partir do TRAINING_DATA: saudação, nomes,
+    números de protocolo, assinatura e, em parte deles, a mensagem anterior
+    citada, de modo a cobrir de bilhetes curtos a threads longas.
+    """
+    rng = random.Random(seed)
+    base = [item['email'] for item in TRAINING_DATA]
+    corpus = []
+    for i in range(size):
+        name = rng.choice(NAMES)
+        parts = [rng.choice(GREETINGS), rng.choice(base)]
+        if rng.random() < 0.5:
+            parts.append(f"Protocolo {rng.randint(2020, 2024)}-{rng.randint(10000, 99999)}.")
+        parts.append(rng.choice(CLOSINGS))
+        parts.append(rng.choice(SIGNATURES).format(name=name, phone=rng.randint(10000000, 99999999)))
+        if rng.random() < 0.25:
+            quoted = ' '.join(rng.sample(base, 3))
+            header = QUOTED_HEADER.format(day=rng.randint(10, 28), month=rng.randint(1, 9),
+                                          minute=rng.randint(10, 59), name=rng.choice(NAMES),
+                                          user=f"cliente{i}")
+            parts.append(header + '\n' + '\n'.join('> ' + line for line in textwrap.wrap(quoted, 72)))
+        corpus.append('\n'.join(part for part in parts if part))
+    return corpus
+
+
+def build_pdf(pages_text: List[str]) -> bytes:
+    """PDF mínimo (Helvetica, uma página por texto), suficiente para o PyPDF2 extrair o conteúdo."""
+    count = len(pages_text)
+    kids = ' '.join(f'{4 + 2 * i} 0 R' for i in range(count))
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        f'<< /Type /Pages /Kids [{kids}] /Count {count} >>'.encode(),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    for i, text in enumerate(pages_text):
+        lines = ' '.join(
+            '(%s) Tj T*' % line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+            for line in text.split('\n')
+        )
+        content = f'BT /F1 10 Tf 12 TL 40 800 Td {lines} ET'.encode('latin-1', 'replace')
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+                       f'/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>'.encode())
+        objects.append(b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream')
+
+    output = b'%PDF-1.4\n'
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(output)
+    output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    output += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    output += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return output
+
+
+def build_email_pdf(pages: int, seed: int = 42) -> bytes:
+    """PDF de ``pages`` páginas com cerca de 60 linhas de emails do corpus cada."""
+    corpus = build_corpus(pages * 8, seed)
+    pages_text = []
+    for page in range(pages):
+        text = '\n\n'.join(corpus[page * 8:(page + 1) * 8])
+        lines = [wrapped for line in text.split('\n') for wrapped in (textwrap.wrap(line, 90) or [''])]
+        pages_text.append('\n'.join(lines[:60]))
+    return build_pdf(pages_text)
+
+
+# Saídas típicas do gpt-4o-mini e do modelo ajustado, em todos os formatos que o parser trata
+MODEL_OUTPUTS = [
+    '{"classificacao": "Produtivo", "confianca": 0.93, '
+    '"justificativa": "O cliente solicita a atualização do status de um chamado."}',
+    '```json\n{\n  "classificacao": "Improdutivo",\n  "confianca": 0.88,\n'
+    '  "justificativa": "Mensagem de agradecimento, sem pedido de ação."\n}\n```',
+    '{"classificacao": "Produtivo", "confianca": 0.81, "resposta_sugerida": '
+    '"Olá! Recebemos sua solicitação e nossa equipe vai analisá-la em até 2 dias úteis."}',
+    'Classificação: Improdutivo\nResposta sugerida: Agradecemos a mensagem e ficamos felizes '
+    'com o seu feedback. Continuamos à disposição.',
+    'Classificação: Produtivo\nResposta sugerida: Vamos verificar o ocorrido e retornaremos '
+    'com uma atualização do protocolo em breve.',
+    'Este é um email produtivo. Nossa equipe vai analisar a solicitação e entrar em contato.',
+    'Olá! Como posso ajudar?',
+]
+
+RESPONSE_OUTPUT = ('Olá! Recebemos sua mensagem e nossa equipe já está verificando a solicitação. '
+                   'Retornaremos com uma atualização em até 2 dias úteis.')
+
+
+def fake_llm_output(messages) -> str:
+    """Resposta determinística para um pedido ao LLM, no formato que o pipeline espera."""
+    prompt = messages[-1]['content']
+    if not prompt.startswith('Classifique este email'):
+        return RESPONSE_OUTPUT
+    digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+    verdict = {
+        'classificacao': 'Produtivo' if digest[0] % 2 else 'Improdutivo',
+        'confianca': round(0.5 + digest[1] / 512, 4),
+    }
+    if 'resposta_sugerida' in prompt:
+        verdict['resposta_sugerida'] = RESPONSE_OUTPUT
+    return json.dumps(verdict, ensure_ascii=False)
+
+
+def _completion(messages):
+    content = fake_llm_output(messages)
+    usage = SimpleNamespace(prompt_tokens=sum(len(m['content']) for m in messages) // 4,
+                            completion_tokens=len(content) // 4)
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+
+class FakeCompletions:
+    """
+    Imita client.chat.completions sem rede; ``latency`` simula o tempo do
+    modelo e ``jitter`` soma a ele um atraso aleatório de até tantos segundos,
+    para que chamadas concorrentes terminem fora de ordem.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+
+    def _delay(self) -> float:
+        return self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def create(self, model, messages, **kwargs):
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+        return _completion(messages)
+
+
+class AsyncFakeCompletions(FakeCompletions):
+    async def create(self, model, messages, **kwargs):
+        delay = self._delay()
+        if delay:
+            await asyncio.sleep(delay)
+        return _completion(messages)
+
+
+def fake_clients(latency: float = 0.0, jitter: float = 0.0):
+    """Par (cliente, cliente assíncrono) com a mesma interface do SDK da OpenAI."""
+    return (SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(latency, jitter))),
+            SimpleNamespace(chat=SimpleNamespace(completions=AsyncFakeCompletions(latency, jitter))))
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Classificação em massa de emails arquivados, sem passar pela API HTTP.
+
+Lê a entrada em streaming (JSONL ou array JSON, CSV ou .mbox/.eml), divide
+os emails em blocos de --chunk-size e os distribui em um pool de processos;
+cada processo monta o pipeline (EmailProcessor, AIClassifier,
+ResponseGenerator) uma única vez e classifica os blocos pelo mesmo caminho
+em lote de /classify/batch. O resultado é gravado em JSONL, um objeto por
+email com o "index" na entrada (e o "id", quando houver), na ordem da
+entrada ou, com --unordered, na ordem em que os blocos terminam.
+
+O progresso é salvo em um checkpoint (<saída>.checkpoint) a cada bloco
+gravado: se a execução for interrompida, rodar o mesmo comando de novo
+continua de onde parou. O backend segue as mesmas variáveis de ambiente da
+API (CLASSIFIER_BACKEND, OPENAI_API_KEY...); com regras ou modelo local não
+há chamadas de rede.
+
+Uso:
+    python classify_bulk.py emails.jsonl -o resultados.jsonl [--workers 8] [--unordered]
+    python classify_bulk.py emails.csv -o resultados.jsonl --text-column corpo --id-column id
+    python classify_bulk.py caixa.mbox -o resultados.jsonl
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import signal
+import logging
+import argparse
+import queue
+import multiprocessing
+from collections import Counter, deque
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+
+from services.email_processor import EmailProcessor
+from services.ai_classifier import AIClassifier
+from services.response_generator import ResponseGenerator
+from services.pipeline import EmailPipeline
+from services.result_cache import ResultCache
+from services.near_duplicate_cache import NearDuplicateCache
+from services.stream_reader import JsonStreamReader
+
+FORMATS = {'.jsonl': 'jsonl', '.ndjson': 'jsonl', '.json': 'jsonl', '.csv': 'csv', '.mbox': 'mbox', '.eml': 'mbox'}
+
+# Pipeline do processo worker, montado uma vez por _init_worker
+_pipeline: Optional[EmailPipeline] = None
+_use_cache = True
+
+
+def _init_worker(use_cache: bool):
+    global _pipeline, _use_cache
+    # Ctrl+C é tratado só no processo principal, que encerra o pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.getLogger().setLevel(logging.WARNING)
+    _pipeline = EmailPipeline(EmailProcessor(), AIClassifier(), ResponseGenerator(), ResultCache(),
+                              NearDuplicateCache())
+    _pipeline.warm_up()
+    _use_cache = use_cache
+
+
+def classify_chunk(chunk: Tuple[int, int, List]) -> Tuple[int, List[Dict]]:
+    number, start, items = chunk
+    results = _pipeline.process_items(items, use_cache=_use_cache)
+    for result in results:
+        result['index'] += start
+    return number, results
+
+
+def read_items(path: str, input_format: str, text_column: str, id_column: str) -> Iterator:
+    """Itens no formato de EmailPipeline.process_items(), lidos sob demanda."""
+    if input_format == 'jsonl':
+        with open(path, 'rb') as stream:
+            yield from JsonStreamReader(stream)
+    elif input_format == 'csv':
+        csv.field_size_limit(2 ** 31 - 1)
+        with open(path, newline='', encoding='utf-8-sig') as stream:
+            reader = csv.DictReader(stream)
+            if text_column not in (reader.fieldnames or []):
+                raise ValueError(f'Coluna "{text_column}" não encontrada no CSV (use --text-column)')
+            for row in reader:
+                item = {'text': row[text_column] or ''}
+                if row.get(id_column):
+                    item['id'] = row[id_column]
+                yield item
+    else:
+        # Anexos PDF são extraídos aqui, no processo que lê a caixa
+        with open(path, 'rb') as stream:
+            yield from EmailProcessor().iter_mail_items(stream, filename=path)
+
+
+class Checkpoint:
+    """
+    Blocos já gravados na saída e o tamanho da saída naquele momento. Ao
+    retomar, a saída é truncada nesse tamanho (descarta um bloco gravado pela
+    metade) e os blocos concluídos são pulados.
+    """
+
+    def __init__(self, path: str, input_path: str, chunk_size: int):
+        self.path = path
+        self.input_path = os.path.abspath(input_path)
+        self.chunk_size = chunk_size
+        # Blocos abaixo de `contiguous` estão todos concluídos; `extra` guarda os demais (modo --unordered)
+        self.contiguous = 0
+        self.extra = set()
+        self.output_bytes = 0
+        self.emails = 0
+        self.errors = 0
+        self.categories = Counter()
+
+    def load(self) -> bool:
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, encoding='utf-8') as f:
+            state = json.load(f)
+        if state['input'] != self.input_path or state['chunk_size'] != self.chunk_size:
+            raise ValueError(f'Checkpoint {self.path} é de outra entrada ou outro --chunk-size; '
+                             'apague-o para recomeçar')
+        self.contiguous = state['contiguous']
+        self.extra = set(state['extra'])
+        self.output_bytes = state['output_bytes']
+        self.emails = state['emails']
+        self.errors = state['errors']
+        self.categories = Counter(state['categories'])
+        return True
+
+    def is_done(self, number: int) -> bool:
+        return number < self.contiguous or number in self.extra
+
+    def mark(self, number: int, results: List[Dict], output_bytes: int):
+        self.extra.add(number)
+        while self.contiguous in self.extra:
+            self.extra.remove(self.contiguous)
+            self.contiguous += 1
+        self.output_bytes = output_bytes
+        self.emails += len(results)
+        for result in results:
+            if 'error' in result:
+                self.errors += 1
+            else:
+                self.categories[result['category']] += 1
+        self.save()
+
+    def save(self):
+        state = {
+            'input': self.input_path,
+            'chunk_size': self.chunk_size,
+            'contiguous': self.contiguous,
+            'extra': sorted(self.extra),
+            'output_bytes': self.output_bytes,
+            'emails': self.emails,
+            'errors': self.errors,
+            'categories': dict(self.categories),
+        }
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.path)
+
+
+def iter_chunks(items: Iterable, chunk_size: int, checkpoint: Checkpoint) -> Iterator[Tuple[int, int, List]]:
+    """Blocos (número, índice inicial, itens) ainda não concluídos."""
+    number = start = 0
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) < chunk_size:
+            continue
+        if not checkpoint.is_done(number):
+            yield number, start, chunk
+        number += 1
+        start += len(chunk)
+        chunk = []
+    if chunk and not checkpoint.is_done(number):
+        yield number, start, chunk
+
+
+class OutputWriter:
+    """Grava os resultados de cada bloco, atualiza o checkpoint e mostra o progresso."""
+
+    def __init__(self, output, checkpoint: Checkpoint, progress: float):
+        self.output = output
+        self.checkpoint = checkpoint
+        self.progress = progress
+        self.emails_at_start = checkpoint.emails
+        self.start_time = self.last_report = time.perf_counter()
+
+    @property
+    def processed(self) -> int:
+        return self.checkpoint.emails - self.emails_at_start
+
+    def write(self, number: int, results: List[Dict]):
+        self.output.write(''.join(json.dumps(result, ensure_ascii=False) + '\n' for result in results)
+                          .encode('utf-8'))
+        self.output.flush()
+        os.fsync(self.output.fileno())
+        self.checkpoint.mark(number, results, self.output.tell())
+
+        now = time.perf_counter()
+        if self.progress and now - self.last_report >= self.progress:
+            self.last_report = now
+            print(f"   {self.checkpoint.emails:,} emails | {format_rate(self.processed, now - self.start_time)}",
+                  file=sys.stderr)
+
+
+def run_pool(pool, chunks: Iterable, writer: OutputWriter, window: int, unordered: bool):
+    """
+    Envia os blocos ao pool a partir desta thread, com no máximo ``window``
+    blocos pendentes: a entrada só é lida à medida que os workers liberam
+    espaço, e um Ctrl+C interrompe a espera e encerra o pool na hora.
+    """
+    completions = queue.Queue()
+    pending = deque()
+    finished: Dict[int, List[Dict]] = {}
+
+    def handle(outcome):
+        if isinstance(outcome, BaseException):
+            raise outcome
+        number, results = outcome
+        if unordered:
+            pending.remove(number)
+            writer.write(number, results)
+            return
+        # Em ordem: guarda o bloco até que todos os anteriores tenham sido gravados
+        finished[number] = results
+        while pending and pending[0] in finished:
+            number = pending.popleft()
+            writer.write(number, finished.pop(number))
+
+    for chunk in chunks:
+        pool.apply_async(classify_chunk, (chunk,), callback=completions.put, error_callback=completions.put)
+        pending.append(chunk[0])
+        while len(pending) >= window:
+            handle(completions.get())
+    while pending:
+        handle(completions.get())
+
+
+def format_rate(emails: int, elapsed: float) -> str:
+    return f"{emails / elapsed:,.0f} emails/s" if elapsed > 0 else '-'
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Classificação em massa de emails (JSONL, CSV ou mbox)')
+    parser.add_argument('input', help='Arquivo de entrada: .jsonl/.json, .csv, .mbox ou .eml')
+    parser.add_argument('-o', '--output', required=True, help='Arquivo JSONL de saída')
+    parser.add_argument('--format', choices=('jsonl', 'csv', 'mbox'),
+                        help='Formato da entrada (padrão: pela extensão do arquivo)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Processos no pool (padrão: número de CPUs; 0 = no próprio processo)')
+    parser.add_argument('--chunk-size', type=int, default=500, help='Emails por bloco enviado a um worker')
+    parser.add_argument('--unordered', action='store_true',
+                        help='Grava cada bloco assim que termina, fora da ordem da entrada')
+    parser.add_argument('--checkpoint', help='Arquivo de checkpoint (padrão: <saída>.checkpoint)')
+    parser.add_argument('--restart', action='store_true', help='Ignora o checkpoint e recomeça do início')
+    parser.add_argument('--text-column', default='text', help='Coluna do texto no CSV (padrão: text)')
+    parser.add_argument('--id-column', default='id', help='Coluna do identificador no CSV (padrão: id)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Não reaproveita resultados de emails repetidos dentro de cada worker')
+    parser.add_argument('--progress', type=float, default=10.0,
+                        help='Intervalo em segundos entre as linhas de progresso (0 = desliga)')
+    args = parser.parse_args(argv)
+
+    if args.format is None:
+        args.format = FORMATS.get(os.path.splitext(args.input)[1].lower())
+        if args.format is None:
+            parser.error('Não foi possível deduzir o formato pela extensão; use --format')
+    if args.chunk_size < 1:
+        parser.error('--chunk-size deve ser positivo')
+    if args.workers < 0:
+        parser.error('--workers não pode ser negativo')
+    args.checkpoint = args.checkpoint or args.output + '.checkpoint'
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    checkpoint = Checkpoint(args.checkpoint, args.input, args.chunk_size)
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    resumed = checkpoint.load()
+    if resumed:
+        print(f"↩️  Retomando: {checkpoint.emails:,} emails já classificados", file=sys.stderr)
+        output = open(args.output, 'r+b')
+        output.truncate(checkpoint.output_bytes)
+        output.seek(checkpoint.output_bytes)
+    else:
+        output = open(args.output, 'wb')
+        checkpoint.save()
+
+    chunks = iter_chunks(read_items(args.input, args.format, args.text_column, args.id_column),
+                         args.chunk_size, checkpoint)
+    use_cache = not args.no_cache
+
+    pool = None
+    if args.workers == 0:
+        _init_worker(use_cache)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+    else:
+        pool = multiprocessing.Pool(args.workers, initializer=_init_worker, initargs=(use_cache,))
+
+    print(f"🚀 {args.input} ({args.format}) → {args.output} | {args.workers} workers, "
+          f"blocos de {args.chunk_size}{', fora de ordem' if args.unordered else ''}", file=sys.stderr)
+    writer = OutputWriter(output, checkpoint, args.progress)
+    try:
+        if pool is None:
+            for chunk in chunks:
+                writer.write(*classify_chunk(chunk))
+        else:
+            run_pool(pool, chunks, writer, args.workers * 4, args.unordered)
+    except KeyboardInterrupt:
+        if pool is not None:
+            pool.terminate()
+        output.close()
+        print(f"\n⏸️  Interrompido com {checkpoint.emails:,} emails gravados; rode o mesmo comando "
+              f"para continuar", file=sys.stderr)
+        return 130
+    except Exception as e:
+        if pool is not None:
+            pool.terminate()
+        output.close()
+        print(f"❌ Erro: {e}; o progresso foi salvo em {args.checkpoint}", file=sys.stderr)
+        return 1
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+    output.close()
+    os.remove(args.checkpoint)
+
+    elapsed = time.perf_counter() - writer.start_time
+    processed = writer.processed
+    print(f"✅ {checkpoint.emails:,} emails em {args.output} ({processed:,} nesta execução, "
+          f"{elapsed:.1f} s, {format_rate(processed, elapsed)})", file=sys.stderr)
+    categories = ', '.join(f"{category}: {count:,}" for category, count in checkpoint.categories.most_common())
+    print(f"   {categories or 'nenhuma categoria'} | erros: {checkpoint.errors:,}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
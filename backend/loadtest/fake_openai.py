@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Servidor local que imita o endpoint de chat completions da OpenAI, para
+testes de carga sem rede e sem custo.
+
+Responde em /v1/chat/completions com latência sorteada de uma distribuição
+configurável, uma fração de erros 500, respostas 429 (por probabilidade ou
+por um limite de requisições por minuto, como o rate limit da OpenAI) e
+saídas nos formatos que AIClassifier._parse_openai_response trata: JSON,
+JSON dentro de bloco ```json, "Classificação: ...\\nResposta sugerida: ..."
+e texto livre. A categoria depende só do prompt, então o mesmo email recebe
+sempre a mesma classificação. Com "stream": true a resposta sai em eventos
+SSE, uma palavra a cada --token-interval-ms depois da latência sorteada.
+GET /stats mostra as contagens.
+
+Para apontar a API para ele:
+    OPENAI_API_KEY=sk-local OPENAI_BASE_URL=http://127.0.0.1:8089/v1 python main.py
+
+Uso:
+    python loadtest/fake_openai.py [--port 8089] [--latency lognormal:400,0.5]
+        [--error-rate 0.01] [--rate-limit-rate 0.02] [--rpm 3000]
+        [--formats json=6,fenced=2,plain=1,text=1]
+"""
+
+import os
+import sys
+import json
+import math
+import re
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+RESPONSES = {
+    'Produtivo': ('Olá! Recebemos sua solicitação e nossa equipe vai analisá-la. '
+                  'Retornaremos com uma atualização em até 2 dias úteis.'),
+    'Improdutivo': ('Olá! Agradecemos a sua mensagem e ficamos felizes com o contato. '
+                    'Continuamos à disposição.'),
+}
+JUSTIFICATIONS = {
+    'Produtivo': 'O remetente pede uma ação ou informação da equipe.',
+    'Improdutivo': 'Mensagem sem pedido de ação, como agradecimentos e felicitações.',
+}
+FORMATS = ('json', 'fenced', 'plain', 'text')
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    Distribuição de latência em ms: ``fixed:200``, ``uniform:100,600``,
+    ``exponential:300`` (média) ou ``lognormal:400,0.5`` (mediana e sigma,
+    com a cauda longa típica de um LLM). Devolve um sorteador em segundos.
+    """
+    kind, _, values = spec.partition(':')
+    try:
+        numbers = [float(value) for value in values.split(',') if value]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Latência inválida: {spec}")
+    if kind == 'fixed' and len(numbers) == 1:
+        return lambda rng: numbers[0] / 1000
+    if kind == 'uniform' and len(numbers) == 2:
+        return lambda rng: rng.uniform(*numbers) / 1000
+    if kind == 'exponential' and len(numbers) == 1:
+        return lambda rng: rng.expovariate(1 / numbers[0]) / 1000 if numbers[0] else 0.0
+    if kind == 'lognormal' and len(numbers) == 2:
+        mu = math.log(numbers[0]) if numbers[0] > 0 else 0.0
+        return lambda rng: rng.lognormvariate(mu, numbers[1]) / 1000 if numbers[0] > 0 else 0.0
+    raise argparse.ArgumentTypeError(f"Latência inválida: {spec}")
+
+
+def parse_formats(spec: str) -> Tuple[List[str], List[float]]:
+    """Pesos dos formatos de saída, ex.: ``json=6,fenced=2,plain=1,text=1``."""
+    names, weights = [], []
+    for part in spec.split(','):
+        name, _, weight = part.strip().partition('=')
+        if name not in FORMATS:
+            raise argparse.ArgumentTypeError(f"Formato desconhecido: {name} (use {', '.join(FORMATS)})")
+        names.append(name)
+        weights.append(float(weight or 1))
+    return names, weights
+
+
+class RateLimiter:
+    """Balde de fichas com ``rpm`` fichas por minuto, reabastecido continuamente."""
+
+    def __init__(self, rpm: int):
+        self.rpm = rpm
+        self.tokens = float(rpm)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> Optional[float]:
+        """None se a requisição passa; senão, segundos até haver uma ficha."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.rpm, self.tokens + (now - self.updated) * self.rpm / 60)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return None
+            return (1 - self.tokens) * 60 / self.rpm
+
+
+class FakeOpenAI:
+    def __init__(self, latency: Callable[[random.Random], float], error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, rpm: int = 0,
+                 formats: Tuple[List[str], List[float]] = (['json'], [1.0]), seed: int = 42):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.limiter = RateLimiter(rpm) if rpm > 0 else None
+        self.formats = formats
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {'requests': 0, 'ok': 0, 'errors': 0, 'rate_limited': 0}
+        self.format_counts: Dict[str, int] = {name: 0 for name in FORMATS}
+        self.started_at = time.time()
+
+    def _draw(self) -> Tuple[float, float, str, float]:
+        # random.Random não é seguro entre threads sem lock
+        with self._lock:
+            return (self._rng.random(), self.latency(self._rng),
+                    self._rng.choices(*self.formats)[0], self._rng.random())
+
+    def _count(self, name: str, output_format: Optional[str] = None):
+        with self._lock:
+            self.counts[name] += 1
+            if output_format:
+                self.format_counts[output_format] += 1
+
+    def complete(self, body: Dict) -> Tuple[int, Dict, Dict[str, str]]:
+        """Status, corpo JSON e headers da resposta a um pedido de chat completion."""
+        self._count('requests')
+        roll, latency, output_format, rate_roll = self._draw()
+
+        retry_after = self.limiter.acquire() if self.limiter else None
+        if retry_after is None and rate_roll < self.rate_limit_rate:
+            retry_after = 1.0
+        if retry_after is not None:
+            self._count('rate_limited')
+            return 429, _error('Rate limit reached for requests', 'requests', 'rate_limit_exceeded'), \
+                {'retry-after': f"{retry_after:.3f}", 'x-ratelimit-remaining-requests': '0'}
+
+        time.sleep(latency)
+        if roll < self.error_rate:
+            self._count('errors')
+            return 500, _error('The server had an error while processing your request.', 'server_error'), {}
+
+        messages = body.get('messages') or [{'content': ''}]
+        prompt = str(messages[-1].get('content', ''))
+        content, output_format = self.output(prompt, output_format, body)
+        self._count('ok', output_format)
+        prompt_tokens = sum(len(str(message.get('content', ''))) for message in messages) // 4
+        completion_tokens = len(content) // 4
+        return 200, {
+            'id': 'chatcmpl-' + os.urandom(12).hex(),
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'gpt-4o-mini'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop',
+            }],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                      'total_tokens': prompt_tokens + completion_tokens},
+        }, {}
+
+    def output(self, prompt: str, output_format: str, body: Dict) -> Tuple[str, Optional[str]]:
+        if not prompt.startswith('Classifique este email'):
+            # Geração de resposta (ResponseGenerator): texto livre
+            category = 'Improdutivo' if 'classificado como "Improdutivo"' in prompt else 'Produtivo'
+            return RESPONSES[category], None
+
+        digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+        category = 'Produtivo' if digest[0] % 2 else 'Improdutivo'
+        confidence = round(0.55 + digest[1] / 600, 2)
+        if 'resposta_sugerida' in prompt or body.get('response_format', {}).get('type') == 'json_object':
+            # Modo combinado pede JSON com a resposta sugerida
+            return json.dumps({'classificacao': category, 'confianca': confidence,
+                               'resposta_sugerida': RESPONSES[category]}, ensure_ascii=False), 'json'
+
+        verdict = json.dumps({'classificacao': category, 'confianca': confidence,
+                              'justificativa': JUSTIFICATIONS[category]}, ensure_ascii=False)
+        if output_format == 'json':
+            return verdict, output_format
+        if output_format == 'fenced':
+            return f"```json\n{verdict}\n```", output_format
+        if output_format == 'plain':
+            return f"Classificação: {category}\nResposta sugerida: {RESPONSES[category]}", output_format
+        return f"Este é um email {category.lower()}. {RESPONSES[category]}", output_format
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self.counts, 'formats': dict(self.format_counts),
+                    'uptime': round(time.time() - self.started_at, 1)}
+
+
+def _error(message: str, error_type: str, code: Optional[str] = None) -> Dict:
+    return {'error': {'message': message, 'type': error_type, 'param': None, 'code': code}}
+
+
+class Handler(BaseHTTPRequestHandler):
+    # Keep-alive, como a API real: o pool de conexões do cliente é exercitado
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeOpenAI/1.0'
+
+    def _send(self, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length)
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send(404, _error(f"Unknown request URL: POST {self.path}", 'invalid_request_error'))
+            return
+        try:
+            body = json.loads(raw or b'{}')
+        except ValueError:
+            self._send(400, _error('Invalid JSON body', 'invalid_request_error'))
+            return
+        status, payload, headers = self.server.fake.complete(body)
+        if status == 200 and body.get('stream'):
+            self._send_stream(payload, bool((body.get('stream_options') or {}).get('include_usage')))
+        else:
+            self._send(status, payload, headers)
+
+    def _send_stream(self, completion: Dict, include_usage: bool):
+        """A mesma completion em eventos SSE (chat.completion.chunk), uma palavra por evento."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        base = {key: completion[key] for key in ('id', 'created', 'model')}
+        base['object'] = 'chat.completion.chunk'
+        content = completion['choices'][0]['message']['content']
+        events = [{'role': 'assistant', 'content': ''}] + [{'content': piece}
+                                                         for piece in re.findall(r'\s*\S+', content)]
+        for index, delta in enumerate(events):
+            if index > 1:
+                time.sleep(self.server.token_interval)
+            self._write_event(dict(base, choices=[{'index': 0, 'delta': delta, 'finish_reason': None}]))
+        self._write_event(dict(base, choices=[{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]))
+        if include_usage:
+            self._write_event(dict(base, choices=[], usage=completion['usage']))
+        self._write_chunk(b'data: [DONE]\n\n')
+        self._write_chunk(b'')
+
+    def _write_event(self, payload: Dict):
+        self._write_chunk(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode('utf-8'))
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        path = self.path.rstrip('/')
+        if path.endswith('/stats'):
+            self._send(200, self.server.fake.stats())
+        elif path.endswith('/models'):
+            self._send(200, {'object': 'list', 'data': [{'id': 'gpt-4o-mini', 'object': 'model'}]})
+        else:
+            self._send(404, _error(f"Unknown request URL: GET {self.path}", 'invalid_request_error'))
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor falso da API de chat completions da OpenAI')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=parse_latency, default='lognormal:400,0.5',
+                        help='fixed:MS, uniform:MIN,MAX, exponential:MÉDIA ou lognormal:MEDIANA,SIGMA')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fração de respostas 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='fração de respostas 429')
+    parser.add_argument('--rpm', type=int, default=0, help='limite de requisições por minuto (0 = sem limite)')
+    parser.add_argument('--formats', type=parse_formats, default='json=6,fenced=2,plain=1,text=1',
+                        help=f"pesos dos formatos de saída ({', '.join(FORMATS)})")
+    parser.add_argument('--token-interval-ms', type=float, default=20,
+                        help='intervalo entre palavras nas respostas em streaming (stream=true)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--verbose', action='store_true', help='registra cada requisição')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    server.verbose = args.verbose
+    server.token_interval = args.token_interval_ms / 1000
+    server.fake = FakeOpenAI(args.latency, args.error_rate, args.rate_limit_rate, args.rpm,
+                             args.formats, args.seed)
+    print(f"OpenAI falsa em http://{args.host}:{server.server_address[1]}/v1", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
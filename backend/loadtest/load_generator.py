@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Gerador de carga para a API: reproduz um corpus de emails contra
+/classify (JSON), /classify/batch e uploads de arquivos (.txt e .pdf) e
+relata vazão e latências p50/p95/p99 por tipo de requisição.
+
+Dois modos:
+  --rps N           carga aberta: requisições disparadas a uma taxa fixa,
+                    independente de quanto a API demora. A latência conta a
+                    partir do instante programado, então filas do lado do
+                    gerador aparecem no resultado em vez de esconder a
+                    saturação (coordinated omission).
+  --concurrency N   carga fechada: N clientes, cada um enviando a próxima
+                    requisição assim que recebe a anterior.
+
+O corpus vem de um arquivo (JSONL com campo "text" ou "email", ou texto com
+um email por linha) ou é gerado a partir do TRAINING_DATA com semente fixa.
+
+Uso:
+    python loadtest/load_generator.py --url http://127.0.0.1:5000 --rps 20 --duration 60
+    python loadtest/load_generator.py --concurrency 16 --mix classify=6,batch=2,upload=2 \\
+        --no-cache --output carga.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import http.client
+from itertools import count
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'benchmarks'))
+
+from synthetic import build_corpus, build_email_pdf
+
+KINDS = ('classify', 'batch', 'upload')
+
+
+class Sample(NamedTuple):
+    kind: str
+    status: int
+    latency: float
+    emails: int
+    error: Optional[str] = None
+
+
+class Workload:
+    """Monta as requisições a partir do corpus, em rodízio, com a mistura de tipos pedida."""
+
+    def __init__(self, corpus: List[str], mix: Tuple[List[str], List[float]], batch_size: int,
+                 pdf_files: List[bytes], prefix: str, use_cache: bool, seed: int):
+        self.corpus = corpus
+        self.mix = mix
+        self.batch_size = batch_size
+        self.pdf_files = pdf_files
+        self.prefix = prefix.rstrip('/')
+        self.query = '' if use_cache else '?cache=false'
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._position = count()
+
+    def _next_kind(self) -> str:
+        with self._lock:
+            return self._rng.choices(*self.mix)[0]
+
+    def next(self) -> Tuple[str, str, bytes, Dict[str, str], int]:
+        """(tipo, caminho, corpo, headers, emails) da próxima requisição."""
+        kind = self._next_kind()
+        position = next(self._position)
+        if kind == 'classify':
+            body = json.dumps({'text': self.corpus[position % len(self.corpus)]}).encode('utf-8')
+            return kind, f"{self.prefix}/classify{self.query}", body, \
+                {'Content-Type': 'application/json'}, 1
+        if kind == 'batch':
+            start = position * self.batch_size
+            emails = [self.corpus[(start + i) % len(self.corpus)] for i in range(self.batch_size)]
+            body = json.dumps({'emails': emails}).encode('utf-8')
+            return kind, f"{self.prefix}/classify/batch{self.query}", body, \
+                {'Content-Type': 'application/json'}, len(emails)
+
+        # Uploads alternam entre .txt e .pdf
+        if position % 2 and self.pdf_files:
+            filename, data = 'email.pdf', self.pdf_files[position % len(self.pdf_files)]
+            content_type = 'application/pdf'
+        else:
+            filename, data = 'email.txt', self.corpus[position % len(self.corpus)].encode('utf-8')
+            content_type = 'text/plain'
+        boundary = f"----loadtest{os.urandom(8).hex()}"
+        body = (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode('utf-8') + data + f"\r\n--{boundary}--\r\n".encode('utf-8')
+        return kind, f"{self.prefix}/classify{self.query}", body, \
+            {'Content-Type': f"multipart/form-data; boundary={boundary}"}, 1
+
+
+class Client:
+    """Uma conexão keep-alive por thread, refeita após erros."""
+
+    def __init__(self, url: str, timeout: float):
+        parts = urlsplit(url)
+        self.https = parts.scheme == 'https'
+        self.host = parts.hostname or '127.0.0.1'
+        self.port = parts.port or (443 if self.https else 80)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            factory = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            connection = self._local.connection = factory(self.host, self.port, timeout=self.timeout)
+        return connection
+
+    def send(self, path: str, body: bytes, headers: Dict[str, str]) -> int:
+        connection = self._connection()
+        try:
+            connection.request('POST', path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except Exception:
+            connection.close()
+            self._local.connection = None
+            raise
+
+
+def execute(client: Client, workload: Workload, scheduled: float) -> Sample:
+    kind, path, body, headers, emails = workload.next()
+    try:
+        status = client.send(path, body, headers)
+        return Sample(kind, status, time.perf_counter() - scheduled, emails)
+    except Exception as e:
+        return Sample(kind, 0, time.perf_counter() - scheduled, emails, f"{type(e).__name__}: {e}")
+
+
+def run_open_loop(client: Client, workload: Workload, rps: float, duration: float,
+                  max_requests: Optional[int], max_workers: int, poisson: bool, seed: int) -> List:
+    rng = random.Random(seed)
+    futures = []
+    start = time.perf_counter()
+    scheduled = start
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while scheduled - start < duration and (max_requests is None or len(futures) < max_requests):
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(executor.submit(execute, client, workload, scheduled))
+            scheduled += rng.expovariate(rps) if poisson else 1 / rps
+    return [future.result() for future in futures]
+
+
+def run_closed_loop(client: Client, workload: Workload, concurrency: int, duration: float,
+                    max_requests: Optional[int]) -> List:
+    samples: List[Sample] = []
+    lock = threading.Lock()
+    issued = count()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        while time.perf_counter() < deadline and (max_requests is None or next(issued) < max_requests):
+            sample = execute(client, workload, time.perf_counter())
+            with lock:
+                samples.append(sample)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Percentil pelo posto mais próximo, em ms."""
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(fraction * len(values) + 0.5)) - 1))
+    return round(values[index] * 1000, 2)
+
+
+def summarize(samples: List[Sample], elapsed: float) -> Dict:
+    latencies = sorted(sample.latency for sample in samples)
+    ok = [sample for sample in samples if 200 <= sample.status < 300]
+    statuses: Dict[str, int] = {}
+    for sample in samples:
+        key = str(sample.status) if sample.status else 'connection_error'
+        statuses[key] = statuses.get(key, 0) + 1
+    return {
+        'requests': len(samples),
+        'ok': len(ok),
+        'error_rate': round(1 - len(ok) / len(samples), 4) if samples else 0.0,
+        'statuses': statuses,
+        'throughput_rps': round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        'emails_per_sec': round(sum(sample.emails for sample in ok) / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+            'max': round(latencies[-1] * 1000, 2) if latencies else None,
+        },
+    }
+
+
+def load_corpus(path: str) -> List[str]:
+    with open(path, encoding='utf-8') as file:
+        lines = [line.strip() for line in file if line.strip()]
+    if path.endswith('.jsonl'):
+        items = [json.loads(line) for line in lines]
+        return [item if isinstance(item, str) else item.get('text') or item.get('email', '') for item in items]
+    return lines
+
+
+def parse_mix(spec: str) -> Tuple[List[str], List[float]]:
+    kinds, weights = [], []
+    for part in spec.split(','):
+        kind, _, weight = part.strip().partition('=')
+        if kind not in KINDS:
+            raise argparse.ArgumentTypeError(f"Tipo desconhecido: {kind} (use {', '.join(KINDS)})")
+        kinds.append(kind)
+        weights.append(float(weight or 1))
+    return kinds, weights
+
+
+def print_report(report: Dict):
+    print(f"{'tipo':<10} {'reqs':>7} {'ok':>7} {'erros':>7} {'req/s':>9} {'emails/s':>9} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'máx ms':>9}")
+    for name, summary in [('total', report['total'])] + list(report['by_kind'].items()):
+        latency = summary['latency_ms']
+        print(f"{name:<10} {summary['requests']:>7} {summary['ok']:>7} "
+              f"{summary['requests'] - summary['ok']:>7} {summary['throughput_rps']:>9.2f} "
+              f"{summary['emails_per_sec']:>9.2f} {latency['p50'] or 0:>9.1f} {latency['p95'] or 0:>9.1f} "
+              f"{latency['p99'] or 0:>9.1f} {latency['max'] or 0:>9.1f}")
+    print(f"status: {report['total']['statuses']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gerador de carga para a API de classificação')
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='endereço da API')
+    parser.add_argument('--prefix', default='', help='prefixo das rotas (ex.: /api na versão serverless)')
+    rate = parser.add_mutually_exclusive_group()
+    rate.add_argument('--rps', type=float, help='taxa alvo de requisições por segundo (carga aberta)')
+    rate.add_argument('--concurrency', type=int, help='clientes simultâneos (carga fechada, padrão 8)')
+    parser.add_argument('--arrivals', choices=('uniform', 'poisson'), default='uniform',
+                        help='intervalo entre requisições com --rps')
+    parser.add_argument('--duration', type=float, default=30, help='duração do teste em segundos')
+    parser.add_argument('--requests', type=int, help='encerra após este número de requisições')
+    parser.add_argument('--mix', type=parse_mix, default='classify=1',
+                        help=f"pesos dos tipos de requisição ({', '.join(KINDS)}), ex.: classify=6,batch=2,upload=2")
+    parser.add_argument('--batch-size', type=int, default=20)
+    parser.add_argument('--pdf-pages', type=int, default=2, help='páginas dos PDFs enviados como upload')
+    parser.add_argument('--corpus', help='arquivo .jsonl ou .txt com os emails (padrão: corpus sintético)')
+    parser.add_argument('--corpus-size', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-cache', action='store_true', help='envia ?cache=false em todas as requisições')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--max-workers', type=int, default=256, help='threads de envio com --rps')
+    parser.add_argument('--output', help='grava o relatório em JSON neste arquivo')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else build_corpus(args.corpus_size, args.seed)
+    if not corpus:
+        parser.error('corpus vazio')
+    pdf_files = [build_email_pdf(args.pdf_pages, args.seed + i) for i in range(8)] \
+        if 'upload' in args.mix[0] else []
+    workload = Workload(corpus, args.mix, args.batch_size, pdf_files, args.prefix, not args.no_cache, args.seed)
+    client = Client(args.url, args.timeout)
+
+    concurrency = args.concurrency or 8
+    mode = f"{args.rps} req/s ({args.arrivals})" if args.rps else f"{concurrency} clientes"
+    print(f"Carga em {args.url}{args.prefix}: {mode}, {args.duration:g}s, {len(corpus)} emails", file=sys.stderr)
+    start = time.perf_counter()
+    if args.rps:
+        samples = run_open_loop(client, workload, args.rps, args.duration, args.requests,
+                                args.max_workers, args.arrivals == 'poisson', args.seed)
+    else:
+        samples = run_closed_loop(client, workload, concurrency, args.duration, args.requests)
+    elapsed = time.perf_counter() - start
+
+    errors: Dict[str, int] = {}
+    for sample in samples:
+        if sample.error:
+            errors[sample.error] = errors.get(sample.error, 0) + 1
+    report = {
+        'config': {'url': args.url + args.prefix, 'rps': args.rps,
+                   'concurrency': None if args.rps else concurrency, 'arrivals': args.arrivals,
+                   'duration': round(elapsed, 2), 'mix': dict(zip(*args.mix)),
+                   'batch_size': args.batch_size, 'corpus_size': len(corpus), 'cache': not args.no_cache},
+        'total': summarize(samples, elapsed),
+        'by_kind': {kind: summarize([sample for sample in samples if sample.kind == kind], elapsed)
+                    for kind in KINDS if any(sample.kind == kind for sample in samples)},
+        'errors': dict(sorted(errors.items(), key=lambda item: -item[1])[:10]),
+    }
+
+    print_report(report)
+    if report['errors']:
+        print(f"erros de conexão: {report['errors']}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        print(f"Relatório gravado em {args.output}")
+
+
+if __name__ == '__main__':
+    main()
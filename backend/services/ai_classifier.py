@@ -1,130 +1,448 @@
 import os
+import re
+import time
+import asyncio
+import contextvars
+import threading
 import logging
-from typing import Tuple
+from typing import AbstractSet, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
 import json
 from dotenv import load_dotenv
+from services.analyzed_email import AnalyzedEmail, prime_keyword_hits
+from services.keywords import get_email_matcher
+from services.cascade_stats import CascadeStats
+from services.metrics import CLASSIFICATION_SECONDS, FALLBACKS, track_llm_request
+from services.tracing import record_token_usage
+from services.local_model import DEFAULT_MODEL_PATH
+from services.llm_fanout import get_fanout
+from services.llm_client import get_llm_factory
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+class ClassificationResult(NamedTuple):
+    category: str
+    confidence: float
+    backend: str
+    processing_time: float = 0.0
+    suggested_response: Optional[str] = None
+
+
 class AIClassifier:
     def __init__(self):
         self.openai_api_key = os.getenv('OPENAI_API_KEY')
-        self.last_confidence = 0.0
         self.client = None
+        self.async_client = None
+        # Processo que obteve os clientes da fábrica: depois de um fork (ex.: gunicorn
+        # --preload com LAZY_INIT=false) o filho pede clientes novos, sem herdar conexões
+        self._clients_pid: Optional[int] = None
+        self.timeout = None
         self.use_openai = False
+        self.local_model = None
+        self.use_local_model = False
         self.custom_model = os.getenv('OPENAI_CUSTOM_MODEL', 'gpt-4o-mini')
+        # Uma única chamada devolve classificação, confiança e resposta sugerida
+        self.combined_mode = os.getenv('OPENAI_COMBINED_MODE', 'false').lower() == 'true'
+        self.local_model_path = os.getenv('LOCAL_MODEL_PATH', DEFAULT_MODEL_PATH)
+        # SDK da OpenAI e modelo local só são carregados no primeiro uso (ou em warm_up)
+        self._init_lock = threading.Lock()
+        self.keyword_matcher = get_email_matcher()
+        
+        # 'openai', 'local', 'rules' ou 'cascade'; sem valor, escolhe o melhor backend disponível
+        requested_backend = os.getenv('CLASSIFIER_BACKEND', '').strip().lower()
+        # Cascata: modelo local (ou regras) primeiro; só emails com confiança
+        # abaixo do limiar vão para a OpenAI
+        self.cascade = requested_backend == 'cascade'
+        self.cascade_threshold = float(os.getenv('CASCADE_THRESHOLD', 0.7))
+        self.cascade_stats = CascadeStats(self.cascade_threshold)
         
+        if requested_backend in ('', 'openai', 'cascade'):
+            self._init_openai()
+        if (not self.use_openai or self.cascade) and requested_backend in ('', 'local', 'cascade'):
+            self._init_local_model(required=requested_backend == 'local')
+        
+        if self.cascade_active:
+            self.backend = 'cascade'
+            logger.info(f"Usando cascata de classificação (limiar {self.cascade_threshold})")
+        elif self.use_openai:
+            self.backend = 'openai'
+        elif self.use_local_model:
+            self.backend = 'local'
+        else:
+            self.backend = 'rules'
+            logger.info("Usando classificação baseada em regras")
+    
+    @property
+    def cascade_active(self) -> bool:
+        # Sem OpenAI disponível a cascata se reduz ao classificador barato
+        return self.cascade and self.use_openai
+    
+    @property
+    def model_identity(self) -> str:
+        openai_identity = f"openai:{self.custom_model}{':combined' if self.combined_mode else ''}"
+        if self.cascade_active:
+            return f"cascade:{self._cheap_identity()}>{openai_identity}@{self.cascade_threshold}"
+        if self.use_openai:
+            return openai_identity
+        return self._cheap_identity()
+    
+    def _cheap_identity(self) -> str:
+        if self.use_local_model:
+            try:
+                return f"local:{self._get_local_model().version}"
+            except Exception:
+                pass
+        return f"rules:{int(self.keyword_matcher.word_boundary)}:{int(self.keyword_matcher.fold_accents)}"
+    
+    def warm_up(self):
+        try:
+            if self.use_openai:
+                self._ensure_openai_clients()
+            if self.use_local_model and (self.cascade or not self.use_openai):
+                self._get_local_model()
+        except Exception as e:
+            logger.error(f"Erro ao inicializar classificador: {str(e)}")
+    
+    def _init_openai(self):
         if self.openai_api_key and self.openai_api_key != 'your_openai_api_key_here':
+            self.use_openai = True
+            logger.info("Usando OpenAI para classificação")
+        else:
+            logger.info("OpenAI não configurado")
+    
+    def _clients_ready(self) -> bool:
+        # Clientes atribuídos de fora (ex.: falsos nos benchmarks) não têm processo registrado
+        return self.client is not None and self._clients_pid in (None, os.getpid())
+    
+    def _ensure_openai_clients(self):
+        if self._clients_ready():
+            return
+        with self._init_lock:
+            if self._clients_ready():
+                return
             try:
                 import openai
-                import httpx
                 
                 if hasattr(openai, 'OpenAI'):
-                    self.client = openai.OpenAI(
-                        api_key=self.openai_api_key,
-                        http_client=httpx.Client(timeout=15)
-                    )
+                    factory = get_llm_factory()
+                    self.timeout = factory.timeout_for('classify')
+                    if hasattr(openai, 'AsyncOpenAI'):
+                        self.async_client = factory.get_async_client(self.openai_api_key)
+                    self.client = factory.get_client(self.openai_api_key)
+                    self._clients_pid = os.getpid()
                 else:
                     openai.api_key = self.openai_api_key
                     self.client = openai
-                
-                self.use_openai = True
-                logger.info("Usando OpenAI para classificação")
             except Exception as e:
                 logger.error(f"Erro ao inicializar OpenAI: {str(e)}")
                 logger.info("Fallback para classificação baseada em regras")
                 self.use_openai = False
-        else:
-            logger.info("OpenAI não configurado, usando classificação baseada em regras")
+                raise
     
-    def classify(self, text: str) -> str:
+    def _init_local_model(self, required: bool = False):
+        if not os.path.exists(self.local_model_path):
+            if required:
+                logger.error(f"Modelo local não encontrado: {self.local_model_path}")
+            return
+        self.use_local_model = True
+        logger.info(f"Usando modelo local para classificação ({self.local_model_path})")
+    
+    def _get_local_model(self):
+        if self.local_model is not None:
+            return self.local_model
+        with self._init_lock:
+            if self.local_model is None:
+                try:
+                    from services.local_model import LocalModel
+                    
+                    self.local_model = LocalModel.load(self.local_model_path)
+                    logger.info(f"Modelo local carregado (versão {self.local_model.version})")
+                except Exception as e:
+                    logger.error(f"Erro ao carregar modelo local {self.local_model_path}: {str(e)}")
+                    self.use_local_model = False
+                    raise
+        return self.local_model
+    
+    @staticmethod
+    def _as_analyzed(text: Union[str, AnalyzedEmail]) -> AnalyzedEmail:
+        # Texto simples é tratado como já pré-processado
+        return text if isinstance(text, AnalyzedEmail) else AnalyzedEmail(text, text)
+    
+    def classify(self, text: Union[str, AnalyzedEmail]) -> ClassificationResult:
+        start_time = time.perf_counter()
+        suggested_response = None
+        email = self._as_analyzed(text)
+        if self.cascade_active:
+            return self._classify_cascade(email)
+        text = email.normalized
         try:
             if self.use_openai:
-                return self._classify_with_openai(text)
+                classification, confidence, suggested_response = self._classify_with_openai(email.llm_text)
+                backend = 'openai'
+            elif self.use_local_model:
+                classification, confidence = self._classify_with_local_model(text)
+                backend = 'local'
             else:
-                return self._classify_with_rules(text)
+                classification, confidence = self._classify_with_rules(email)
+                backend = 'rules'
         except Exception as e:
             logger.error(f"Erro na classificação: {str(e)}")
-            return self._classify_with_rules(text)
+            FALLBACKS.inc(stage='classification', backend=self.backend)
+            classification, confidence = self._classify_with_rules(email)
+            backend = 'rules'
+        
+        return self._observe(ClassificationResult(classification, confidence, backend,
+                                                  time.perf_counter() - start_time, suggested_response))
+    
+    @staticmethod
+    def _observe(result: ClassificationResult) -> ClassificationResult:
+        CLASSIFICATION_SECONDS.observe(result.processing_time, backend=result.backend)
+        return result
     
-    def _classify_with_openai(self, text: str) -> str:
+    def _classify_cheap(self, email: AnalyzedEmail) -> Tuple[str, float, str]:
+        if self.use_local_model:
+            try:
+                return (*self._classify_with_local_model(email.normalized), 'local')
+            except Exception as e:
+                logger.error(f"Erro na classificação com modelo local: {str(e)}")
+                FALLBACKS.inc(stage='classification', backend='local')
+        return (*self._classify_with_rules(email), 'rules')
+    
+    def _cascade_cheap(self, email: AnalyzedEmail) -> Tuple[Tuple[str, float, str], float,
+                                                          Optional[ClassificationResult]]:
+        """Primeira etapa da cascata: classificação barata, seu tempo e o resultado final se a confiança bastar."""
+        start_time = time.perf_counter()
+        cheap = self._classify_cheap(email)
+        cheap_time = time.perf_counter() - start_time
+        if cheap[1] < self.cascade_threshold:
+            return cheap, cheap_time, None
+        self.cascade_stats.record(cheap_time)
+        return cheap, cheap_time, self._observe(ClassificationResult(*cheap, cheap_time))
+    
+    def _cascade_escalated(self, cheap: Tuple[str, float, str], cheap_time: float, llm_start: float,
+                           llm_output: Optional[Tuple[str, float, Optional[str]]] = None,
+                           error: Optional[Exception] = None) -> ClassificationResult:
+        """Segunda etapa: o resultado da OpenAI ou, se ela falhou, o da classificação barata."""
+        llm_time = time.perf_counter() - llm_start
+        if llm_output is None:
+            logger.error(f"Erro na classificação OpenAI da cascata: {str(error)}")
+            FALLBACKS.inc(stage='classification', backend='cascade')
+            self.cascade_stats.record(cheap_time, llm_time)
+            return self._observe(ClassificationResult(*cheap, cheap_time + llm_time))
+        
+        llm_classification, llm_confidence, suggested_response = llm_output
+        self.cascade_stats.record(cheap_time, llm_time, llm_classification == cheap[0])
+        return self._observe(ClassificationResult(llm_classification, llm_confidence, 'openai',
+                                                  cheap_time + llm_time, suggested_response))
+    
+    # Só a chamada à OpenAI difere entre as versões síncrona e assíncrona da cascata
+    def _classify_cascade(self, email: AnalyzedEmail) -> ClassificationResult:
+        cheap, cheap_time, result = self._cascade_cheap(email)
+        if result is not None:
+            return result
+        llm_start = time.perf_counter()
         try:
-            prompt = self._build_classification_prompt(text)
-            
-            if hasattr(self.client, 'chat') and hasattr(self.client.chat, 'completions'):
-                response = self.client.chat.completions.create(
-                    model=self.custom_model,
-                    messages=[
-                        {"role": "system", "content": self._get_system_prompt()},
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=200,
-                    temperature=0.0
-                )
-                result = response.choices[0].message.content.strip()
-            else:
-                # Legacy SDK
-                response = self.client.ChatCompletion.create(
-                    model=self.custom_model,
-                    messages=[
-                        {"role": "system", "content": self._get_system_prompt()},
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=200,
-                    temperature=0.0
-                )
-                result = response.choices[0].message.content.strip()
-            
-            classification, confidence = self._parse_openai_response(result, text)
-            self.last_confidence = confidence
+            llm_output = self._classify_with_openai(email.llm_text)
+        except Exception as e:
+            return self._cascade_escalated(cheap, cheap_time, llm_start, error=e)
+        return self._cascade_escalated(cheap, cheap_time, llm_start, llm_output)
+    
+    async def _aclassify_cascade(self, email: AnalyzedEmail) -> ClassificationResult:
+        cheap, cheap_time, result = self._cascade_cheap(email)
+        if result is not None:
+            return result
+        llm_start = time.perf_counter()
+        try:
+            llm_output = await self._aclassify_with_openai(email.llm_text)
+        except Exception as e:
+            return self._cascade_escalated(cheap, cheap_time, llm_start, error=e)
+        return self._cascade_escalated(cheap, cheap_time, llm_start, llm_output)
+    
+    def _classification_request(self, text: str) -> Dict:
+        if self.combined_mode:
+            return {
+                'model': self.custom_model,
+                'messages': [
+                    {"role": "system", "content": self._get_system_prompt()},
+                    {"role": "user", "content": self._build_combined_prompt(text)}
+                ],
+                'max_tokens': 400,
+                'temperature': 0.0,
+                'response_format': {"type": "json_object"}
+            }
+        return {
+            'model': self.custom_model,
+            'messages': [
+                {"role": "system", "content": self._get_system_prompt()},
+                {"role": "user", "content": self._build_classification_prompt(text)}
+            ],
+            'max_tokens': 200,
+            'temperature': 0.0
+        }
+    
+    def _parse_result(self, result: str, text: str) -> Tuple[str, float, Optional[str]]:
+        classification, confidence = self._parse_openai_response(result, text)
+        suggested_response = self._parse_suggested_response(result) if self.combined_mode else None
+        return classification, confidence, suggested_response
+    
+    def _classify_with_openai(self, text: str) -> Tuple[str, float, Optional[str]]:
+        self._ensure_openai_clients()
+        try:
+            with track_llm_request('classify', self.custom_model) as span:
+                if hasattr(self.client, 'chat') and hasattr(self.client.chat, 'completions'):
+                    response = self.client.chat.completions.create(
+                        **self._classification_request(text), timeout=self.timeout
+                    )
+                else:
+                    # Legacy SDK
+                    response = self.client.ChatCompletion.create(**self._classification_request(text))
+                record_token_usage(span, response)
+            result = response.choices[0].message.content.strip()
             
-            return classification
+            return self._parse_result(result, text)
             
         except Exception as e:
             logger.error(f"Erro na classificação OpenAI: {str(e)}")
             raise
     
-    def _classify_with_rules(self, text: str) -> str:
-        text_lower = text.lower()
+    async def aclassify(self, text: Union[str, AnalyzedEmail]) -> ClassificationResult:
+        if not self.use_openai:
+            return self.classify(text)
         
-        productive_keywords = [
-            'suporte', 'técnico', 'problema', 'erro', 'bug', 'falha',
-            'solicitação', 'pedido', 'requisição', 'dúvida', 'questão',
-            'status', 'atualização', 'andamento', 'prazo', 'urgente',
-            'sistema', 'aplicação', 'funcionalidade', 'recurso',
-            'configuração', 'instalação', 'acesso', 'login', 'senha',
-            'relatório', 'dados', 'informação', 'documento', 'arquivo'
-        ]
+        email = self._as_analyzed(text)
+        if self.cascade_active:
+            return await self._aclassify_cascade(email)
         
-        unproductive_keywords = [
-            'parabéns', 'felicitações', 'aniversário', 'natal', 'ano novo',
-            'feriado', 'férias', 'obrigado', 'agradecimento', 'grato',
-            'bom dia', 'boa tarde', 'boa noite', 'cumprimento',
-            'convite', 'evento', 'festa', 'reunião social', 'coffee'
-        ]
+        start_time = time.perf_counter()
+        suggested_response = None
+        try:
+            classification, confidence, suggested_response = await self._aclassify_with_openai(email.llm_text)
+            backend = 'openai'
+        except Exception as e:
+            logger.error(f"Erro na classificação: {str(e)}")
+            FALLBACKS.inc(stage='classification', backend=self.backend)
+            classification, confidence = self._classify_with_rules(email)
+            backend = 'rules'
         
-        productive_score = sum(1 for keyword in productive_keywords if keyword in text_lower)
-        unproductive_score = sum(1 for keyword in unproductive_keywords if keyword in text_lower)
+        return self._observe(ClassificationResult(classification, confidence, backend,
+                                                  time.perf_counter() - start_time, suggested_response))
+    
+    async def _aclassify_with_openai(self, text: str) -> Tuple[str, float, Optional[str]]:
+        self._ensure_openai_clients()
+        if self.async_client is None:
+            # SDK sem cliente assíncrono: executa a chamada bloqueante fora do loop
+            loop = asyncio.get_running_loop()
+            async with get_fanout().in_flight():
+                return await loop.run_in_executor(
+                    None, contextvars.copy_context().run, self._classify_with_openai, text
+                )
         
-        has_question = '?' in text
-        has_request_words = any(word in text_lower for word in ['preciso', 'gostaria', 'poderia', 'favor', 'solicito'])
-        has_problem_indicators = any(word in text_lower for word in ['não funciona', 'erro', 'problema', 'falha'])
+        try:
+            async with get_fanout().in_flight():
+                with track_llm_request('classify', self.custom_model) as span:
+                    response = await self.async_client.chat.completions.create(
+                        **self._classification_request(text), timeout=self.timeout
+                    )
+                    record_token_usage(span, response)
+            result = response.choices[0].message.content.strip()
+            return self._parse_result(result, text)
+        except Exception as e:
+            logger.error(f"Erro na classificação OpenAI: {str(e)}")
+            raise
+    
+    def _classify_with_local_model(self, text: str) -> Tuple[str, float]:
+        return self._get_local_model().predict_one(text)
+    
+    def _classify_with_rules(self, text: Union[str, AnalyzedEmail]) -> Tuple[str, float]:
+        email = self._as_analyzed(text)
+        return self._score_rule_hits(email.keyword_hits, email.has_question)
+    
+    def _score_rule_hits(self, hits: Dict[str, AbstractSet[str]], has_question: bool) -> Tuple[str, float]:
+        productive_score = len(hits['rules.productive'])
+        unproductive_score = len(hits['rules.unproductive'])
+        
+        has_request_words = bool(hits['rules.request'])
+        has_problem_indicators = bool(hits['rules.problem'])
         
         if has_question or has_request_words or has_problem_indicators:
             productive_score += 2
         
         if productive_score > unproductive_score:
-            self.last_confidence = min(0.9, 0.6 + (productive_score - unproductive_score) * 0.1)
-            return "Produtivo"
+            return "Produtivo", min(0.9, 0.6 + (productive_score - unproductive_score) * 0.1)
         else:
-            self.last_confidence = min(0.9, 0.6 + (unproductive_score - productive_score) * 0.1)
-            return "Improdutivo"
+            return "Improdutivo", min(0.9, 0.6 + (unproductive_score - productive_score) * 0.1)
+    
+    def classify_many(self, texts: Sequence[Union[str, AnalyzedEmail]]) -> List[ClassificationResult]:
+        emails = [self._as_analyzed(text) for text in texts]
+        if self.use_openai:
+            results = get_fanout().map(self.aclassify, emails)
+            failed = sum(not isinstance(result, ClassificationResult) for result in results)
+            if failed:
+                FALLBACKS.inc(failed, stage='classification', backend=self.backend)
+            return [result if isinstance(result, ClassificationResult)
+                    else ClassificationResult(*self._classify_with_rules(email), 'rules')
+                    for email, result in zip(emails, results)]
+        
+        start_time = time.perf_counter()
+        try:
+            if self.use_local_model:
+                predictions = self._get_local_model().predict([email.normalized for email in emails])
+                backend = 'local'
+            else:
+                predictions = self._classify_many_with_rules(emails)
+                backend = 'rules'
+        except Exception as e:
+            logger.error(f"Erro na classificação em lote: {str(e)}")
+            FALLBACKS.inc(len(emails), stage='classification', backend=self.backend)
+            predictions = self._classify_many_with_rules(emails)
+            backend = 'rules'
+        
+        # Tempo amortizado: o lote é processado como uma unidade
+        item_time = (time.perf_counter() - start_time) / max(1, len(emails))
+        CLASSIFICATION_SECONDS.observe(item_time, count=len(emails), backend=backend)
+        return [ClassificationResult(classification, confidence, backend, item_time)
+                for classification, confidence in predictions]
+    
+    def _classify_many_with_rules(self, emails: List[AnalyzedEmail]) -> List[Tuple[str, float]]:
+        # Uma varredura para o lote; o gerador de respostas reaproveita as mesmas ocorrências
+        prime_keyword_hits(emails)
+        return [self._score_rule_hits(email.keyword_hits, email.has_question) for email in emails]
     
     def _build_classification_prompt(self, text: str) -> str:
         return f"Classifique este email e sugira uma resposta: {text}"
     
+    def _build_combined_prompt(self, text: str) -> str:
+        return (
+            f"{self._build_classification_prompt(text)}\n\n"
+            "Responda apenas com um objeto JSON com as chaves: "
+            '"classificacao" ("Produtivo" ou "Improdutivo"), '
+            '"confianca" (número entre 0 e 1) e '
+            '"resposta_sugerida" (resposta cordial e profissional, no máximo 3 frases).'
+        )
+    
+    def _parse_suggested_response(self, response_text: str) -> Optional[str]:
+        response_text = response_text.strip()
+        if response_text.startswith('```json'):
+            response_text = response_text.replace('```json', '').replace('```', '').strip()
+        
+        try:
+            response_data = json.loads(response_text)
+            if isinstance(response_data, dict):
+                for key in ('resposta_sugerida', 'suggested_response', 'resposta'):
+                    value = response_data.get(key)
+                    if isinstance(value, str) and value.strip():
+                        return value.strip()
+                return None
+        except (json.JSONDecodeError, ValueError):
+            pass
+        
+        # Formato do modelo ajustado: "Classificação: X\nResposta sugerida: Y"
+        match = re.search(r'resposta sugerida:\s*(.+)', response_text, re.IGNORECASE | re.DOTALL)
+        if match and match.group(1).strip():
+            return match.group(1).strip()
+        return None
+    
     def _get_system_prompt(self) -> str:
         return "Você é um assistente especializado em classificar emails bancários como Produtivo (requer ação) ou Improdutivo (não requer ação) e sugerir respostas apropriadas."
     
@@ -276,6 +594,3 @@ class AIClassifier:
         
         confidence = base_confidence + clarity_bonus - ambiguity_penalty
         return max(0.70, min(0.95, confidence))
-
-    def get_last_confidence(self) -> float:
-        return self.last_confidence
\ No newline at end of file
@@ -0,0 +1,93 @@
+import re
+from typing import AbstractSet, Dict, List, Optional, Sequence, Tuple
+from services.keywords import get_email_matcher
+from services.email_condenser import CondensedText, get_email_condenser
+
+# Normalização em uma passada: cada sequência de caracteres fora de [\w.,!?-]
+# (espaços inclusive) vira um único espaço
+NORMALIZE_PATTERN = re.compile(r'[^\w.,!?\-]+')
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def normalize_text(text: str) -> str:
+    return NORMALIZE_PATTERN.sub(' ', text).lower().strip()
+
+
+class AnalyzedEmail:
+    """
+    Análise de um email feita uma única vez e compartilhada por todas as etapas.
+
+    Guarda o texto original e o normalizado (o mesmo de
+    EmailProcessor.preprocess_text, já em minúsculas). As demais formas
+    (original em minúsculas, tokens e ocorrências das palavras-chave de
+    regras, templates e features) são calculadas na primeira vez em que
+    alguma etapa as pede, então o caminho da OpenAI não paga pela
+    varredura de palavras-chave.
+
+    O texto enviado ao LLM (llm_text) é a versão condensada, sem histórico
+    citado, assinatura e avisos legais; regras, modelo local e chaves de
+    cache continuam usando o texto completo.
+    """
+
+    __slots__ = ('original', 'normalized', '_lower', '_tokens', '_keyword_hits', '_condensed')
+
+    def __init__(self, original: str, normalized: Optional[str] = None):
+        self.original = original
+        self.normalized = normalize_text(original) if normalized is None else normalized
+        self._lower: Optional[str] = None
+        self._tokens: Optional[List[Tuple[int, int]]] = None
+        self._keyword_hits: Optional[Dict[str, AbstractSet[str]]] = None
+        self._condensed: Optional[CondensedText] = None
+
+    @property
+    def lower(self) -> str:
+        if self._lower is None:
+            self._lower = self.original.lower()
+        return self._lower
+
+    @property
+    def tokens(self) -> List[Tuple[int, int]]:
+        """Posições (início, fim) de cada palavra no texto normalizado."""
+        if self._tokens is None:
+            self._tokens = [match.span() for match in TOKEN_PATTERN.finditer(self.normalized)]
+        return self._tokens
+
+    @property
+    def word_count(self) -> int:
+        return len(self.original.split())
+
+    @property
+    def has_question(self) -> bool:
+        return '?' in self.normalized
+
+    @property
+    def keyword_hits(self) -> Dict[str, AbstractSet[str]]:
+        """Palavras-chave encontradas, por grupo ('rules.*', 'template.*', 'feature.*')."""
+        if self._keyword_hits is None:
+            self._keyword_hits = get_email_matcher().hits_normalized(self.normalized)
+        return self._keyword_hits
+
+    @property
+    def condensed(self) -> CondensedText:
+        if self._condensed is None:
+            self._condensed = get_email_condenser().condense(self.original)
+        return self._condensed
+
+    @property
+    def llm_text(self) -> str:
+        """Texto normalizado do email condensado, usado nos prompts de classificação."""
+        condensed = self.condensed
+        return normalize_text(condensed.text) if condensed.removed else self.normalized
+
+    def __repr__(self) -> str:
+        return f"AnalyzedEmail({self.normalized[:40]!r})"
+
+
+def prime_keyword_hits(emails: Sequence[AnalyzedEmail]):
+    """Calcula as palavras-chave de um lote em uma única varredura."""
+    pending = [email for email in emails if email._keyword_hits is None]
+    if not pending:
+        return
+    all_hits = get_email_matcher().hits_many_normalized([email.normalized for email in pending])
+    for email, hits in zip(pending, all_hits):
+        email._keyword_hits = hits
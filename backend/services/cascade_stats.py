@@ -0,0 +1,78 @@
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+
+class TierLatency:
+    """Latência de um nível da cascata: contagem, média e percentis das últimas amostras."""
+
+    def __init__(self, window: int = 1000):
+        self.count = 0
+        self.total = 0.0
+        self._samples = deque(maxlen=window)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self._samples.append(seconds)
+
+    def summary(self) -> Dict:
+        samples = sorted(self._samples)
+
+        def percentile(fraction: float) -> Optional[float]:
+            if not samples:
+                return None
+            return round(samples[min(len(samples) - 1, int(fraction * len(samples)))] * 1000, 3)
+
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count * 1000, 3) if self.count else None,
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+        }
+
+
+class CascadeStats:
+    """
+    Métricas da cascata de classificação: taxa de escalonamento para o LLM,
+    latência de cada nível e concordância entre o classificador barato e o
+    LLM nos emails escalonados.
+    """
+
+    def __init__(self, threshold: float, window: int = 1000):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._cheap = TierLatency(window)
+        self._llm = TierLatency(window)
+        self.total = 0
+        self.escalated = 0
+        self.llm_failures = 0
+        self.agreements = 0
+
+    def record(self, cheap_seconds: float, llm_seconds: Optional[float] = None,
+               agreed: Optional[bool] = None):
+        """Registra um email; llm_seconds só quando foi escalonado, agreed=None se o LLM falhou."""
+        with self._lock:
+            self.total += 1
+            self._cheap.add(cheap_seconds)
+            if llm_seconds is None:
+                return
+            self.escalated += 1
+            self._llm.add(llm_seconds)
+            if agreed is None:
+                self.llm_failures += 1
+            elif agreed:
+                self.agreements += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            answered = self.escalated - self.llm_failures
+            return {
+                'threshold': self.threshold,
+                'total': self.total,
+                'escalated': self.escalated,
+                'escalation_rate': round(self.escalated / self.total, 4) if self.total else 0.0,
+                'llm_failures': self.llm_failures,
+                'agreement_rate': round(self.agreements / answered, 4) if answered else None,
+                'tiers': {'cheap': self._cheap.summary(), 'llm': self._llm.summary()},
+            }
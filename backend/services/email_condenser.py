@@ -0,0 +1,191 @@
+import os
+import re
+import threading
+import logging
+from typing import List, NamedTuple, Optional, Tuple
+from services.metrics import CONDENSE_REMOVED_RATIO
+from services.tracing import trace_span
+
+logger = logging.getLogger(__name__)
+
+# Cabeçalhos que abrem a mensagem anterior citada em uma resposta
+REPLY_HEADER_PATTERNS = [
+    # "Em qua., 5 de jun. de 2024 às 10:12, Fulano <fulano@x.com> escreveu:" (às vezes quebrado em duas linhas)
+    re.compile(r'^[ \t]*Em\s[^\n]{0,200}(?:\n[^\n]{0,200})?\bescreveu:[ \t]*$', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'^[ \t]*On\s[^\n]{0,200}(?:\n[^\n]{0,200})?\bwrote:[ \t]*$', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'^[ \t]*-{2,}\s*(?:Mensagem original|Original Message|Mensagem encaminhada|'
+               r'Forwarded message)\s*-{2,}[ \t]*$', re.IGNORECASE | re.MULTILINE),
+    # Bloco do Outlook: "De: ..." seguido de "Enviado:"/"Data:"/"Sent:" nas linhas seguintes
+    re.compile(r'^[ \t]*(?:_{10,}[ \t]*\n[ \t]*)?(?:De|From):[^\n]*\n(?:[^\n]*\n){0,2}?[ \t]*'
+               r'(?:Enviad[oa](?:\s*em)?|Data|Sent|Date):', re.IGNORECASE | re.MULTILINE),
+]
+SIGNATURE_DELIMITER = re.compile(r'^--[ \t]*$', re.MULTILINE)
+MOBILE_SIGNATURE = re.compile(r'^[ \t]*(?:Enviado d[oe] meu|Sent from my|Obter o Outlook para)\b[^\n]*$',
+                              re.IGNORECASE | re.MULTILINE)
+# Despedidas: o que vem depois (nome, cargo, telefone) é assinatura
+CLOSING_LINE = re.compile(r'^[ \t]*(?:Atenciosamente|Att\.?|Atte\.?|Abs\.?|Abraços?|Cordialmente|'
+                          r'Saudações|Grat[oa]|Obrigad[oa]|Muito obrigad[oa]|Best regards|Regards)'
+                          r'[ \t]*[,.!]?[ \t]*$', re.IGNORECASE | re.MULTILINE)
+SIGNATURE_MAX_LINES = 6
+SIGNATURE_MAX_LINE_CHARS = 60
+
+# Termos de avisos legais; um parágrafo com dois ou mais (ou um termo forte) é descartado
+DISCLAIMER_TERMS = ('confidencia', 'sigilos', 'privilegiad', 'destinatário', 'esta mensagem', 'este e-mail',
+                    'este email', 'lgpd', 'proteção de dados', 'uso exclusivo', 'confidential',
+                    'intended recipient', 'privileged', 'this message', 'this e-mail')
+STRONG_DISCLAIMER_TERMS = ('por engano', 'por equívoco', 'antes de imprimir', 'pense no meio ambiente',
+                           'in error', 'by mistake', 'before printing')
+PARAGRAPH_SPLIT = re.compile(r'\n[ \t]*\n')
+
+# Sem tokenizador do modelo no projeto: ~4 caracteres por token em português
+CHARS_PER_TOKEN = 4
+
+
+class CondensedText(NamedTuple):
+    text: str
+    removed_ratio: float
+    # Partes removidas: 'quoted', 'signature', 'disclaimer' e 'truncated'
+    removed: Tuple[str, ...]
+
+
+class EmailCondenser:
+    """
+    Reduz o email ao que o remetente escreveu nesta mensagem antes de enviá-lo
+    ao LLM: remove o histórico citado (linhas com ">" e tudo a partir de
+    cabeçalhos como "Em ... escreveu:" ou "De: ... Enviado:"), assinaturas
+    (delimitador "--", "Enviado do meu celular" e as linhas curtas depois de
+    uma despedida) e avisos legais, e corta o restante em CONDENSE_MAX_TOKENS.
+
+    Se a limpeza não deixar nada (ex.: um encaminhamento sem comentário), o
+    texto original é usado, só com o corte de tamanho. A fração de bytes
+    removida vai para a métrica email_condense_removed_ratio.
+    """
+
+    def __init__(self, max_tokens: Optional[int] = None):
+        self.enabled = os.getenv('EMAIL_CONDENSE', 'true').lower() == 'true'
+        self.max_tokens = max_tokens if max_tokens is not None else int(os.getenv('CONDENSE_MAX_TOKENS', 1000))
+
+    def condense(self, text: str) -> CondensedText:
+        if not self.enabled:
+            return CondensedText(text, 0.0, ())
+        with trace_span('condense') as span:
+            try:
+                condensed, removed = self._strip(text)
+            except Exception as e:
+                logger.error(f"Erro ao condensar email: {str(e)}")
+                condensed, removed = text.strip(), []
+            if not condensed:
+                condensed, removed = text.strip(), []
+            condensed, truncated = self._cap(condensed)
+            if truncated:
+                removed.append('truncated')
+
+            original_bytes = len(text.encode('utf-8'))
+            ratio = 1 - len(condensed.encode('utf-8')) / original_bytes if original_bytes else 0.0
+            ratio = round(max(0.0, ratio), 4)
+            CONDENSE_REMOVED_RATIO.observe(ratio)
+            if span is not None:
+                span.set('condense.removed_ratio', ratio)
+                span.set('condense.removed', ','.join(removed))
+        return CondensedText(condensed, ratio, tuple(removed))
+
+    def _strip(self, text: str) -> Tuple[str, List[str]]:
+        removed = []
+        text = text.replace('\r\n', '\n')
+
+        text, found = self._strip_reply_history(text)
+        if found:
+            removed.append('quoted')
+
+        lines = text.split('\n')
+        kept = [line for line in lines if not line.lstrip().startswith('>')]
+        if len(kept) != len(lines) and 'quoted' not in removed:
+            removed.append('quoted')
+        text = '\n'.join(kept)
+
+        text, found = self._strip_disclaimers(text)
+        if found:
+            removed.append('disclaimer')
+
+        text, found = self._strip_signature(text)
+        if found:
+            removed.append('signature')
+
+        # Linhas em branco em sequência viram uma só
+        return re.sub(r'\n[ \t]*(?:\n[ \t]*)+', '\n\n', text).strip(), removed
+
+    @staticmethod
+    def _strip_reply_history(text: str) -> Tuple[str, bool]:
+        found = False
+        for pattern in REPLY_HEADER_PATTERNS:
+            match = pattern.search(text)
+            if match is None:
+                continue
+            found = True
+            rest = text[match.end():].lstrip('\n')
+            if rest.lstrip().startswith('>'):
+                # Resposta intercalada: só o cabeçalho sai aqui; as linhas ">" saem depois
+                text = text[:match.start()] + rest
+            else:
+                text = text[:match.start()]
+        return text, found
+
+    @staticmethod
+    def _disclaimer_score(text: str) -> int:
+        lower = text.lower()
+        if any(term in lower for term in STRONG_DISCLAIMER_TERMS):
+            return 2
+        return sum(1 for term in DISCLAIMER_TERMS if term in lower)
+
+    def _strip_disclaimers(self, text: str) -> Tuple[str, bool]:
+        paragraphs = PARAGRAPH_SPLIT.split(text)
+        kept, found = [], False
+        for index, paragraph in enumerate(paragraphs):
+            # O primeiro parágrafo é o corpo da mensagem; avisos legais vêm depois
+            if index > 0 and self._disclaimer_score(paragraph) >= 2:
+                found = True
+                continue
+            lines = [line for line in paragraph.split('\n') if self._disclaimer_score(line) < 2]
+            if len(lines) != paragraph.count('\n') + 1:
+                found = True
+            kept.append('\n'.join(lines))
+        return '\n\n'.join(kept), found
+
+    @staticmethod
+    def _strip_signature(text: str) -> Tuple[str, bool]:
+        found = False
+        for pattern in (SIGNATURE_DELIMITER, MOBILE_SIGNATURE):
+            match = pattern.search(text)
+            if match is not None:
+                text, found = text[:match.start()], True
+
+        # Despedida seguida só de poucas linhas curtas (nome, cargo, telefone)
+        closings = list(CLOSING_LINE.finditer(text))
+        if closings:
+            closing = closings[-1]
+            tail = [line for line in text[closing.end():].split('\n') if line.strip()]
+            # Frases (terminadas em pontuação) depois da despedida ainda são mensagem
+            if tail and len(tail) <= SIGNATURE_MAX_LINES and all(
+                    len(line) <= SIGNATURE_MAX_LINE_CHARS and not line.rstrip().endswith(('.', '?', '!', ':'))
+                    for line in tail):
+                text, found = text[:closing.end()], True
+        return text, found
+
+    def _cap(self, text: str) -> Tuple[str, bool]:
+        max_chars = self.max_tokens * CHARS_PER_TOKEN
+        if self.max_tokens <= 0 or len(text) <= max_chars:
+            return text, False
+        cut = text.rfind(' ', 0, max_chars)
+        return text[:cut if cut > max_chars // 2 else max_chars].rstrip(), True
+
+
+_condenser: Optional[EmailCondenser] = None
+_condenser_lock = threading.Lock()
+
+
+def get_email_condenser() -> EmailCondenser:
+    global _condenser
+    with _condenser_lock:
+        if _condenser is None:
+            _condenser = EmailCondenser()
+        return _condenser
@@ -1,88 +1,181 @@
-import re
-import nltk
-import PyPDF2
+import os
+import time
 from io import BytesIO
 import logging
-from typing import Optional
+from typing import Iterator, Optional, Union
+from services.analyzed_email import AnalyzedEmail, normalize_text
+from services.email_condenser import CondensedText, get_email_condenser
+from services.mail_reader import MAIL_EXTENSIONS, MailboxReader
+from services.pdf_parallel import get_pdf_extractor
+from services.stream_reader import StreamFormatError
+from services.metrics import ERRORS, EXTRACTION_SECONDS, PREPROCESS_SECONDS
+from services.tracing import trace_span
 
 logger = logging.getLogger(__name__)
 
+class UnsupportedFileError(ValueError):
+    """Upload em formato que a rota não aceita: erro do cliente (400), não do servidor."""
+    pass
+
 class EmailProcessor:
     def __init__(self):
-        # Best-effort: ensure NLTK resources if available, but never fail startup on serverless
-        self._download_nltk_data()
+        # Limites de extração de PDF (0 = sem limite): a classificação não precisa do documento inteiro
+        self.pdf_max_pages = int(os.getenv('PDF_MAX_PAGES', 100))
+        self.pdf_max_chars = int(os.getenv('PDF_MAX_CHARS', 100000))
+        self.pdf_parallel = os.getenv('PDF_PARALLEL', 'true').lower() == 'true'
+        self.mail_max_message_bytes = int(os.getenv('MAIL_MAX_MESSAGE_BYTES', 25 * 1024 * 1024))
     
-    def _download_nltk_data(self):
-        try:
-            # If resources are already present, nothing to do
-            nltk.data.find('tokenizers/punkt')
-            nltk.data.find('corpora/stopwords')
-        except LookupError:
-            # Attempt download, but ignore failures to keep function responsive on Vercel
-            try:
-                nltk.download('punkt', quiet=True)
-                nltk.download('stopwords', quiet=True)
-            except Exception as e:
-                logger.warning(f"Falha ao baixar dados NLTK (ignorado): {str(e)}")
+    # PyPDF2 só é importado no primeiro PDF recebido, para não pesar no cold start.
+    # Dados do NLTK não são usados no caminho da requisição: veja setup_nltk.py.
+    def warm_up(self):
+        import PyPDF2  # noqa: F401
     
     def process_file(self, file) -> str:
+        start_time = time.perf_counter()
         try:
             filename = file.filename.lower()
             
-            if filename.endswith('.txt'):
-                return file.read().decode('utf-8')
-            elif filename.endswith('.pdf'):
-                return self._extract_pdf_text(file)
-            else:
-                raise ValueError(f"Formato de arquivo não suportado: {filename}")
+            with trace_span('extract') as span:
+                if filename.endswith('.txt'):
+                    text = file.read().decode('utf-8')
+                    file_format = 'txt'
+                elif filename.endswith('.pdf'):
+                    text = self._extract_pdf_text(file)
+                    file_format = 'pdf'
+                elif filename.endswith('.eml'):
+                    item = next(iter(self.iter_mail_items(file)), None)
+                    if item is None:
+                        raise StreamFormatError("Arquivo .eml vazio")
+                    if isinstance(item, Exception):
+                        raise item
+                    text = item['text']
+                    file_format = 'eml'
+                elif filename.endswith('.mbox'):
+                    raise UnsupportedFileError("Arquivo .mbox tem várias mensagens: envie para /classify/stream ou /jobs")
+                else:
+                    raise UnsupportedFileError(f"Formato de arquivo não suportado: {filename}")
+                if span is not None:
+                    span.set('file.format', file_format)
+                    span.set('file.chars', len(text))
+            
+            EXTRACTION_SECONDS.observe(time.perf_counter() - start_time, format=file_format)
+            return text
                 
         except Exception as e:
+            ERRORS.inc(stage='extraction')
             logger.error(f"Erro ao processar arquivo {file.filename}: {str(e)}")
             raise
     
-    def _extract_pdf_text(self, file) -> str:
+    @staticmethod
+    def is_mail_file(filename: str) -> bool:
+        return filename.lower().endswith(MAIL_EXTENSIONS)
+    
+    def iter_mail_items(self, file, filename: Optional[str] = None) -> MailboxReader:
+        """
+        Mensagens de um upload (ou arquivo aberto em modo binário) .eml ou
+        .mbox, lidas uma a uma do stream, como itens de
+        EmailPipeline.process_items() (o .mbox nunca é carregado inteiro).
+        """
+        filename = filename or file.filename
+        stream = getattr(file, 'stream', file)
+        if hasattr(stream, 'seekable') and stream.seekable():
+            stream.seek(0)
+        return MailboxReader(stream, single=filename.lower().endswith('.eml'),
+                             pdf_text=self._attachment_pdf_text,
+                             max_message_bytes=self.mail_max_message_bytes)
+    
+    def _attachment_pdf_text(self, data: bytes) -> str:
+        return self._extract_pdf_text(BytesIO(data))
+    
+    def _pdf_stream(self, file):
+        # Lê direto do stream do upload (werkzeug já o mantém em memória ou em
+        # arquivo temporário) em vez de copiar tudo para um novo BytesIO
+        stream = getattr(file, 'stream', file)
+        if hasattr(stream, 'seekable') and stream.seekable():
+            stream.seek(0)
+            return stream
+        return BytesIO(file.read())
+    
+    def iter_pdf_pages(self, file, max_pages: Optional[int] = None) -> Iterator[str]:
+        import PyPDF2
+        
+        stream = self._pdf_stream(file)
+        pdf_reader = PyPDF2.PdfReader(stream)
+        page_count = len(pdf_reader.pages)
+        if max_pages:
+            page_count = min(page_count, max_pages)
+        
+        if self.pdf_parallel:
+            extractor = get_pdf_extractor()
+            if extractor.should_parallelize(page_count):
+                stream.seek(0)
+                yield from extractor.iter_pages(stream, page_count)
+                return
+        
+        for page_number in range(page_count):
+            yield pdf_reader.pages[page_number].extract_text() or ""
+    
+    def _extract_pdf_text(self, file, max_pages: Optional[int] = None,
+                          max_chars: Optional[int] = None) -> str:
+        max_pages = self.pdf_max_pages if max_pages is None else max_pages
+        max_chars = self.pdf_max_chars if max_chars is None else max_chars
         try:
-            pdf_reader = PyPDF2.PdfReader(BytesIO(file.read()))
-            text = ""
+            pages = []
+            total_chars = 0
+            page_iterator = self.iter_pdf_pages(file, max_pages)
             
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
+            try:
+                for page_text in page_iterator:
+                    pages.append(page_text)
+                    total_chars += len(page_text) + 1
+                    if max_chars and total_chars >= max_chars:
+                        break
+            finally:
+                page_iterator.close()
             
+            text = "\n".join(pages)
+            if max_chars:
+                text = text[:max_chars]
             return text.strip()
             
         except Exception as e:
             logger.error(f"Erro ao extrair texto do PDF: {str(e)}")
             raise ValueError("Erro ao processar arquivo PDF")
     
+    def analyze(self, text: str) -> AnalyzedEmail:
+        """Analisa o email uma vez; classificador, gerador e features reaproveitam o resultado."""
+        start_time = time.perf_counter()
+        with trace_span('preprocess'):
+            email = AnalyzedEmail(text, self.preprocess_text(text))
+        PREPROCESS_SECONDS.observe(time.perf_counter() - start_time)
+        return email
+    
+    def condense(self, email: Union[str, AnalyzedEmail]) -> CondensedText:
+        """Só a mensagem atual (sem histórico citado, assinatura e avisos legais), limitada para o LLM."""
+        if isinstance(email, AnalyzedEmail):
+            return email.condensed
+        return get_email_condenser().condense(email)
+    
     def preprocess_text(self, text: str) -> str:
         try:
-            text = re.sub(r'[^\w\s\.\,\!\?\-]', ' ', text)
-            text = re.sub(r'\s+', ' ', text)
-            text = re.sub(r'\n+', '\n', text)
-            processed_text = text.lower().strip()
-            return processed_text
+            return normalize_text(text)
             
         except Exception as e:
             logger.error(f"Erro no pré-processamento: {str(e)}")
             return text
     
-    def extract_email_features(self, text: str) -> dict:
+    def extract_email_features(self, email: Union[str, AnalyzedEmail]) -> dict:
+        if not isinstance(email, AnalyzedEmail):
+            email = self.analyze(email)
+        hits = email.keyword_hits
         features = {
-            'length': len(text),
-            'word_count': len(text.split()),
-            'has_question': '?' in text,
-            'has_urgency': any(word in text.lower() for word in [
-                'urgente', 'imediato', 'asap', 'prioridade', 'emergência'
-            ]),
-            'has_greeting': any(word in text.lower() for word in [
-                'olá', 'oi', 'bom dia', 'boa tarde', 'boa noite'
-            ]),
-            'has_thanks': any(word in text.lower() for word in [
-                'obrigado', 'obrigada', 'agradeço', 'grato', 'grata'
-            ]),
-            'has_request': any(word in text.lower() for word in [
-                'solicito', 'preciso', 'gostaria', 'poderia', 'favor'
-            ])
+            'length': len(email.original),
+            'word_count': email.word_count,
+            'has_question': '?' in email.original,
+            'has_urgency': bool(hits['feature.urgency']),
+            'has_greeting': bool(hits['feature.greeting']),
+            'has_thanks': bool(hits['feature.thanks']),
+            'has_request': bool(hits['feature.request'])
         }
         
-        return features
\ No newline at end of file
+        return features
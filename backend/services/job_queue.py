@@ -0,0 +1,355 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import logging
+from typing import Dict, Iterable, List, Optional
+from services.local_model import BACKEND_DIR
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOBS_DB_PATH = os.path.join(BACKEND_DIR, 'data', 'jobs.db')
+
+# Estados de um item: pendente, reservado por um worker, concluído
+ITEM_PENDING, ITEM_CLAIMED, ITEM_DONE = 0, 1, 2
+# Itens gravados por transação em submit(); o banco é liberado para os workers entre elas
+SUBMIT_BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    use_cache INTEGER NOT NULL DEFAULT 1,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    state INTEGER NOT NULL DEFAULT 0,
+    owner INTEGER,
+    claimed_at REAL,
+    input TEXT,
+    result TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS job_items_pending ON job_items (state, job_id, idx);
+"""
+
+
+class JobQueue:
+    """
+    Fila persistente (SQLite) de jobs de classificação em lote, processada por
+    um pool de threads em segundo plano com o mesmo EmailPipeline das rotas.
+
+    Cada job é gravado item a item. Os workers reservam grupos de itens
+    pendentes em uma transação, processam com EmailPipeline.process_items e
+    gravam os resultados junto com o progresso do job. Se o processo cair, os
+    itens reservados por ele voltam para a fila na próxima inicialização (ou,
+    se não der para saber se o dono ainda existe, quando a reserva expira) e
+    o job continua do último item concluído. Vários processos (ex.: workers
+    do gunicorn) podem compartilhar o mesmo arquivo.
+    """
+
+    def __init__(self, pipeline, db_path: Optional[str] = None, workers: Optional[int] = None,
+                 chunk_size: Optional[int] = None):
+        self.pipeline = pipeline
+        self.db_path = db_path or os.getenv('JOBS_DB_PATH', DEFAULT_JOBS_DB_PATH)
+        self.workers = workers if workers is not None else int(os.getenv('JOBS_WORKERS', 2))
+        self.chunk_size = chunk_size or int(os.getenv('JOBS_CHUNK_SIZE', 32))
+        # Jobs enviados por outros processos são percebidos por polling
+        self.poll_interval = float(os.getenv('JOBS_POLL_INTERVAL', 2))
+        # Reserva mais antiga que isto é considerada abandonada
+        self.lease_seconds = float(os.getenv('JOBS_LEASE_SECONDS', 600))
+        self._local = threading.local()
+        self._wakeup = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._started = False
+        self._schema_ready = False
+        self._start_lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Conexões SQLite não são compartilhadas entre threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _ensure_schema(self):
+        if self._schema_ready:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._connection().executescript(SCHEMA)
+        self._schema_ready = True
+
+    def start(self):
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+            self._ensure_schema()
+            self._recover()
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f'job-worker-{number}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            logger.info(f"Fila de jobs iniciada ({self.db_path}, {self.workers} workers)")
+
+    def resume(self):
+        """Inicia os workers se já existe banco de jobs, retomando os de uma execução anterior."""
+        if not self._started and os.path.exists(self.db_path):
+            self.start()
+
+    def _recover(self):
+        # Itens reservados por processos que já não existem voltam a ficar pendentes.
+        # Reservas com o nosso pid são de uma execução anterior (pids se repetem em
+        # containers): este processo ainda não reservou nada
+        connection = self._connection()
+        owners = [row[0] for row in connection.execute(
+            'SELECT DISTINCT owner FROM job_items WHERE state = ?', (ITEM_CLAIMED,))]
+        dead = [owner for owner in owners
+                if owner is None or owner == os.getpid() or not _process_alive(owner)]
+        for owner in dead:
+            connection.execute('UPDATE job_items SET state = ?, owner = NULL WHERE state = ? AND owner IS ?',
+                               (ITEM_PENDING, ITEM_CLAIMED, owner))
+        if dead:
+            logger.info(f"Itens de {len(dead)} processo(s) interrompido(s) devolvidos à fila")
+
+        # Jobs cujo envio foi interrompido no meio (o processo caiu lendo a entrada)
+        stale = [row[0] for row in connection.execute(
+            "SELECT id FROM jobs WHERE status = 'loading' AND updated_at < ?",
+            (time.time() - self.lease_seconds,))]
+        for job_id in stale:
+            self._delete_job(connection, job_id)
+        if stale:
+            logger.info(f"{len(stale)} job(s) com envio interrompido descartado(s)")
+
+    def _release_expired(self):
+        self._connection().execute(
+            'UPDATE job_items SET state = ?, owner = NULL WHERE state = ? AND claimed_at < ?',
+            (ITEM_PENDING, ITEM_CLAIMED, time.time() - self.lease_seconds)
+        )
+
+    def submit(self, items: Iterable, use_cache: bool = True) -> str:
+        """
+        Grava o job e seus itens e acorda os workers. Itens são lidos sob
+        demanda, então um iterador (ex.: JsonStreamReader) não é carregado
+        inteiro em memória. Exceções no lugar de um item viram resultados de
+        erro já concluídos; uma exceção lançada pelo iterador desfaz o job.
+
+        Ler a entrada pode levar minutos (ex.: um .mbox com anexos PDF), então
+        os itens são gravados em grupos, cada um em uma transação curta: o
+        banco não fica bloqueado para os workers durante a leitura. Enquanto
+        isso o job fica em 'loading', estado que os workers ignoram.
+        """
+        self.start()
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        connection = self._connection()
+        connection.execute(
+            'INSERT INTO jobs (id, status, use_cache, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+            (job_id, 'loading', int(use_cache), now, now)
+        )
+        try:
+            total = failed = 0
+            rows = []
+            for item in items:
+                if isinstance(item, Exception):
+                    rows.append((job_id, total, ITEM_DONE, None,
+                                 json.dumps({'index': total, 'error': str(item)})))
+                    failed += 1
+                else:
+                    rows.append((job_id, total, ITEM_PENDING, json.dumps(item), None))
+                total += 1
+                if len(rows) >= SUBMIT_BATCH_SIZE:
+                    self._insert_items(connection, job_id, rows)
+                    rows = []
+            self._insert_items(connection, job_id, rows)
+            status = 'queued' if total > failed else 'completed'
+            connection.execute(
+                'UPDATE jobs SET status = ?, total = ?, completed = ?, failed = ?, updated_at = ? WHERE id = ?',
+                (status, total, failed, failed, time.time(), job_id)
+            )
+        except BaseException:
+            self._delete_job(connection, job_id)
+            raise
+
+        with self._wakeup:
+            self._wakeup.notify_all()
+        return job_id
+
+    @staticmethod
+    def _insert_items(connection, job_id: str, rows):
+        if not rows:
+            return
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(
+                'INSERT INTO job_items (job_id, idx, state, input, result) VALUES (?, ?, ?, ?, ?)', rows
+            )
+            # updated_at recente indica que o job ainda está sendo carregado (veja _recover)
+            connection.execute('UPDATE jobs SET updated_at = ? WHERE id = ?', (time.time(), job_id))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    @staticmethod
+    def _delete_job(connection, job_id: str):
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute('DELETE FROM job_items WHERE job_id = ?', (job_id,))
+            connection.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+            connection.execute('COMMIT')
+        except Exception as e:
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            logger.error(f"Erro ao descartar o job {job_id}: {str(e)}")
+
+    def _claim(self):
+        """Reserva o próximo grupo de itens pendentes, do job mais antigo para o mais novo."""
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            jobs = connection.execute(
+                "SELECT id, use_cache FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+            for job_id, use_cache in jobs:
+                claimed = connection.execute(
+                    'SELECT idx, input FROM job_items WHERE state = ? AND job_id = ? ORDER BY idx LIMIT ?',
+                    (ITEM_PENDING, job_id, self.chunk_size)
+                ).fetchall()
+                if not claimed:
+                    continue
+                now = time.time()
+                connection.executemany(
+                    'UPDATE job_items SET state = ?, owner = ?, claimed_at = ? WHERE job_id = ? AND idx = ?',
+                    [(ITEM_CLAIMED, os.getpid(), now, job_id, idx) for idx, _ in claimed]
+                )
+                connection.execute(
+                    "UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ? AND status = 'queued'",
+                    (now, job_id)
+                )
+                connection.execute('COMMIT')
+                return job_id, bool(use_cache), claimed
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return None, True, []
+
+    def _complete(self, job_id: str, indexes: List[int], results: List[Dict]):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            completed = failed = 0
+            for idx, result in zip(indexes, results):
+                # Só grava itens ainda reservados por este processo: se a reserva
+                # expirou e outro worker já concluiu o item, ele não conta duas vezes
+                cursor = connection.execute(
+                    'UPDATE job_items SET state = ?, owner = NULL, result = ? '
+                    'WHERE job_id = ? AND idx = ? AND state = ? AND owner = ?',
+                    (ITEM_DONE, json.dumps(result), job_id, idx, ITEM_CLAIMED, os.getpid())
+                )
+                if cursor.rowcount:
+                    completed += 1
+                    failed += 'error' in result
+            connection.execute(
+                'UPDATE jobs SET completed = completed + ?, failed = failed + ?, updated_at = ?, '
+                "status = CASE WHEN completed + ? >= total THEN 'completed' ELSE status END WHERE id = ?",
+                (completed, failed, time.time(), completed, job_id)
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def _worker_loop(self):
+        while True:
+            try:
+                job_id, use_cache, claimed = self._claim()
+                if not claimed:
+                    self._release_expired()
+            except Exception as e:
+                logger.error(f"Erro ao reservar itens da fila de jobs: {str(e)}")
+                claimed = []
+
+            if not claimed:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+
+            indexes = [idx for idx, _ in claimed]
+            items = [json.loads(data) for _, data in claimed]
+            try:
+                results = self.pipeline.process_items(items, use_cache=use_cache)
+            except Exception as e:
+                logger.error(f"Erro ao processar itens do job {job_id}: {str(e)}")
+                results = [{'error': str(e)} for _ in items]
+            for idx, result in zip(indexes, results):
+                result['index'] = idx
+
+            try:
+                self._complete(job_id, indexes, results)
+            except Exception as e:
+                # Os itens continuam reservados e voltam à fila quando o processo reiniciar
+                logger.error(f"Erro ao gravar resultados do job {job_id}: {str(e)}")
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        # Só leitura: consultar um job não inicia os workers
+        if not self._schema_ready and not os.path.exists(self.db_path):
+            return None
+        self._ensure_schema()
+        row = self._connection().execute(
+            'SELECT id, status, total, completed, failed, created_at, updated_at FROM jobs WHERE id = ?',
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job_id, status, total, completed, failed, created_at, updated_at = row
+        return {
+            'id': job_id,
+            'status': status,
+            'total': total,
+            'completed': completed,
+            'failed': failed,
+            'progress': round(completed / total, 4) if total else 1.0,
+            'created_at': created_at,
+            'updated_at': updated_at,
+        }
+
+    def results(self, job_id: str, offset: int = 0, limit: int = 100) -> List[Dict]:
+        """Resultados já concluídos com índice em [offset, offset + limit), em ordem."""
+        if not self._schema_ready and not os.path.exists(self.db_path):
+            return []
+        self._ensure_schema()
+        rows = self._connection().execute(
+            'SELECT result FROM job_items WHERE job_id = ? AND idx >= ? AND idx < ? AND state = ? ORDER BY idx',
+            (job_id, offset, offset + limit, ITEM_DONE)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def stats(self) -> Dict:
+        if not self._started:
+            return {'started': False}
+        counts = dict(self._connection().execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+        return {'started': True, 'workers': self.workers, 'jobs': counts}
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
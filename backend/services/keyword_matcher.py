@@ -0,0 +1,181 @@
+import re
+import unicodedata
+from bisect import bisect_right
+from typing import AbstractSet, Dict, Iterable, Iterator, List, Mapping, Sequence, Set, Tuple
+
+
+def _build_fold_table() -> Dict[int, str]:
+    # Letra acentuada -> letra base ('ç' -> 'c', 'ã' -> 'a'). Um caractere por
+    # caractere, então posições no texto dobrado valem para o original
+    table = {}
+    for code in range(0xC0, 0x250):
+        decomposed = unicodedata.normalize('NFD', chr(code))
+        if len(decomposed) > 1 and decomposed[0].isascii() and \
+                all(unicodedata.combining(mark) for mark in decomposed[1:]):
+            table[code] = decomposed[0]
+    return table
+
+
+FOLD_TABLE = _build_fold_table()
+
+# Letra base -> classe regex com as variantes acentuadas em minúsculas ('c' -> '[cç]')
+_ACCENT_CLASSES: Dict[str, str] = {}
+for _code, _base in FOLD_TABLE.items():
+    if chr(_code).islower():
+        _ACCENT_CLASSES[_base] = _ACCENT_CLASSES.get(_base, _base) + chr(_code)
+_ACCENT_CLASSES = {base: f'[{variants}]' for base, variants in _ACCENT_CLASSES.items()}
+
+
+def fold_accents(text: str) -> str:
+    return text.translate(FOLD_TABLE)
+
+
+class KeywordMatcher:
+    """
+    Casa vários grupos de palavras-chave em uma única passada sobre o texto.
+
+    Todas as palavras-chave são compiladas uma única vez em uma alternância
+    regex dentro de um lookahead, o que permite encontrar ocorrências
+    sobrepostas. A alternância é montada como uma árvore de prefixos
+    ('erro(?:s)?' em vez de 'erros|erro'), então cada posição do texto é
+    descartada em poucos passos em vez de testar palavra-chave por palavra-chave. Palavras-chave que são prefixo de outras (ex.: 'erro' e
+    'erros') são resolvidas por uma tabela pré-calculada, então o custo
+    cresce com o tamanho do texto e não com o número de palavras-chave.
+
+    Com ``word_boundary=True`` a palavra-chave só casa no início de uma
+    palavra: 'erro' deixa de casar dentro de 'ferro', mas flexões como
+    'erros' ou 'problemas' continuam contando.
+
+    Com ``fold_accents=True`` palavras-chave e texto são comparados sem
+    acentos, então 'tecnico' e 'nao funciona' casam com 'técnico' e
+    'não funciona'. As variantes acentuadas entram na própria regex como
+    classes de caracteres; só o trecho casado é convertido para a forma
+    sem acento, nunca o texto inteiro.
+    """
+
+    SEPARATOR = '\x00'
+    # Grupos sem ocorrência compartilham este conjunto: criar um set por grupo
+    # e por email custava mais que a própria varredura
+    EMPTY: AbstractSet[str] = frozenset()
+
+    def __init__(self, groups: Mapping[str, Iterable[str]], word_boundary: bool = False,
+                 fold_accents: bool = False):
+        self.word_boundary = word_boundary
+        self.fold_accents = fold_accents
+        self._groups_by_keyword: Dict[str, Set[str]] = {}
+        for group, keywords in groups.items():
+            for keyword in keywords:
+                keyword = self._canonical(keyword.lower())
+                if keyword and self.SEPARATOR not in keyword:
+                    self._groups_by_keyword.setdefault(keyword, set()).add(group)
+        self.groups = tuple(groups.keys())
+
+        keywords = sorted(self._groups_by_keyword, key=len, reverse=True)
+        # Para cada palavra-chave, as menores que também casam na mesma posição
+        self._prefixes: Dict[str, Tuple[str, ...]] = {
+            keyword: tuple(other for other in keywords
+                           if other != keyword and keyword.startswith(other))
+            for keyword in keywords
+        }
+
+        alternation = self._trie_pattern(keywords)
+        if not alternation:
+            self._pattern = None
+        elif word_boundary:
+            self._pattern = re.compile(rf'(?<!\w)(?=({alternation}))')
+        else:
+            self._pattern = re.compile(rf'(?=({alternation}))')
+
+    def _char_pattern(self, char: str) -> str:
+        if self.fold_accents and char in _ACCENT_CLASSES:
+            return _ACCENT_CLASSES[char]
+        return re.escape(char)
+
+    def _trie_pattern(self, keywords: Iterable[str]) -> str:
+        # Ramos de um nó começam por caracteres distintos e o sufixo opcional é
+        # guloso, então o casamento em cada posição continua sendo o mais longo
+        trie: Dict[str, dict] = {}
+        for keyword in keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = {}
+
+        def build(node: Dict[str, dict]) -> str:
+            branches = [self._char_pattern(char) + build(child)
+                        for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ''
+            body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+            if '' in node:
+                return body + '?' if len(branches) > 1 else f'(?:{body})?'
+            return body
+
+        return build(trie)
+
+    def normalize(self, text: str) -> str:
+        """Forma do texto comparada com as palavras-chave."""
+        return text.lower()
+
+    def _canonical(self, keyword: str) -> str:
+        # Forma sem acento usada como chave, quando o texto casado tinha acentos
+        if keyword.isascii():
+            return keyword
+        return fold_accents(keyword) if self.fold_accents else keyword
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, str, Set[str]]]:
+        """
+        Gera (posição, palavra-chave, grupos) para cada ocorrência no texto, que
+        já deve estar na forma de normalize().
+        """
+        if self._pattern is None:
+            return
+        for match in self._pattern.finditer(text):
+            keyword = self._canonical(match.group(1))
+            start = match.start()
+            yield start, keyword, self._groups_by_keyword[keyword]
+            for prefix in self._prefixes[keyword]:
+                yield start, prefix, self._groups_by_keyword[prefix]
+
+    def _add(self, found: Dict[str, AbstractSet[str]], keyword: str, groups: Set[str]):
+        for group in groups:
+            current = found[group]
+            if current is self.EMPTY:
+                found[group] = {keyword}
+            else:
+                current.add(keyword)
+
+    def hits(self, text: str) -> Dict[str, AbstractSet[str]]:
+        """Retorna, por grupo, o conjunto de palavras-chave distintas encontradas."""
+        return self.hits_normalized(self.normalize(text))
+
+    def hits_normalized(self, text: str) -> Dict[str, AbstractSet[str]]:
+        """Como hits(), para um texto que já passou por normalize()."""
+        found = dict.fromkeys(self.groups, self.EMPTY)
+        for _, keyword, groups in self.finditer(text):
+            self._add(found, keyword, groups)
+        return found
+
+    def hits_many(self, texts: Sequence[str]) -> List[Dict[str, AbstractSet[str]]]:
+        """
+        Como hits(), mas para um lote: os textos são unidos por um separador que
+        nenhuma palavra-chave contém e varridos de uma só vez.
+        """
+        return self.hits_many_normalized([self.normalize(text) for text in texts])
+
+    def hits_many_normalized(self, texts: Sequence[str]) -> List[Dict[str, AbstractSet[str]]]:
+        """Como hits_many(), para textos que já passaram por normalize()."""
+        results = [dict.fromkeys(self.groups, self.EMPTY) for _ in texts]
+        if not texts:
+            return results
+        starts = []
+        position = 0
+        for text in texts:
+            starts.append(position)
+            position += len(text) + len(self.SEPARATOR)
+        for start, keyword, groups in self.finditer(self.SEPARATOR.join(texts)):
+            self._add(results[bisect_right(starts, start) - 1], keyword, groups)
+        return results
+
+    def keywords(self, group: str) -> List[str]:
+        return [keyword for keyword, groups in self._groups_by_keyword.items() if group in groups]
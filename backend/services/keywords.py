@@ -0,0 +1,77 @@
+import os
+import threading
+from typing import Dict, List, Optional
+from services.keyword_matcher import KeywordMatcher
+
+# Palavras-chave da classificação por regras
+RULE_KEYWORDS = {
+    'productive': [
+        'suporte', 'técnico', 'problema', 'erro', 'bug', 'falha',
+        'solicitação', 'pedido', 'requisição', 'dúvida', 'questão',
+        'status', 'atualização', 'andamento', 'prazo', 'urgente',
+        'sistema', 'aplicação', 'funcionalidade', 'recurso',
+        'configuração', 'instalação', 'acesso', 'login', 'senha',
+        'relatório', 'dados', 'informação', 'documento', 'arquivo'
+    ],
+    'unproductive': [
+        'parabéns', 'felicitações', 'aniversário', 'natal', 'ano novo',
+        'feriado', 'férias', 'obrigado', 'agradecimento', 'grato',
+        'bom dia', 'boa tarde', 'boa noite', 'cumprimento',
+        'convite', 'evento', 'festa', 'reunião social', 'coffee'
+    ],
+    'request': ['preciso', 'gostaria', 'poderia', 'favor', 'solicito'],
+    'problem': ['não funciona', 'erro', 'problema', 'falha'],
+}
+
+# Templates de resposta, em ordem de prioridade por classificação
+TEMPLATE_KEYWORDS = {
+    'productive': {
+        'technical_support': ['suporte', 'técnico', 'problema', 'erro', 'bug'],
+        'status_request': ['status', 'andamento', 'atualização'],
+        'question': ['dúvida', 'questão', 'pergunta'],
+        'document_request': ['documento', 'arquivo', 'relatório'],
+    },
+    'unproductive': {
+        'thanks': ['obrigado', 'agradecimento', 'grato'],
+        'congratulations': ['parabéns', 'felicitações', 'aniversário'],
+        'holidays': ['natal', 'ano novo', 'feriado'],
+    },
+}
+
+# Sinais de EmailProcessor.extract_email_features
+FEATURE_KEYWORDS = {
+    'urgency': ['urgente', 'imediato', 'asap', 'prioridade', 'emergência'],
+    'greeting': ['olá', 'oi', 'bom dia', 'boa tarde', 'boa noite'],
+    'thanks': ['obrigado', 'obrigada', 'agradeço', 'grato', 'grata'],
+    'request': ['solicito', 'preciso', 'gostaria', 'poderia', 'favor'],
+}
+
+
+def _all_groups() -> Dict[str, List[str]]:
+    # Nomes com prefixo por consumidor: 'rules.request' e 'feature.request' não se confundem
+    groups = {f'rules.{name}': keywords for name, keywords in RULE_KEYWORDS.items()}
+    for kind in TEMPLATE_KEYWORDS.values():
+        groups.update({f'template.{name}': keywords for name, keywords in kind.items()})
+    groups.update({f'feature.{name}': keywords for name, keywords in FEATURE_KEYWORDS.items()})
+    return groups
+
+
+_matcher: Optional[KeywordMatcher] = None
+_matcher_lock = threading.Lock()
+
+
+def get_email_matcher() -> KeywordMatcher:
+    """
+    Matcher único com os grupos de regras, templates e features: uma só
+    varredura do email atende classificador, gerador de respostas e
+    extração de features.
+    """
+    global _matcher
+    with _matcher_lock:
+        if _matcher is None:
+            _matcher = KeywordMatcher(
+                _all_groups(),
+                word_boundary=os.getenv('RULES_WORD_BOUNDARY', 'false').lower() == 'true',
+                fold_accents=os.getenv('RULES_FOLD_ACCENTS', 'false').lower() == 'true'
+            )
+        return _matcher
@@ -0,0 +1,187 @@
+import os
+import threading
+import importlib.util
+import logging
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Timeouts de leitura por operação (segundos); conexão, escrita e pool são comuns
+OPERATION_READ_TIMEOUTS = {
+    'classify': ('OPENAI_CLASSIFY_TIMEOUT', 15.0),
+    'generate': ('OPENAI_GENERATE_TIMEOUT', 20.0),
+    'training': ('OPENAI_TRAINING_TIMEOUT', 120.0),
+}
+
+
+class LLMClientFactory:
+    """
+    Fábrica única, por processo, dos clientes OpenAI (síncrono e assíncrono).
+
+    Todos os serviços e scripts compartilham o mesmo pool de conexões httpx
+    com keep-alive, então classificação e geração de respostas reaproveitam
+    conexões TLS já abertas. Os limites do pool, os timeouts e o uso de HTTP/2
+    (quando o pacote h2 está instalado) vêm de variáveis de ambiente.
+    """
+
+    def __init__(self):
+        self.max_connections = int(os.getenv('OPENAI_MAX_CONNECTIONS', 20))
+        self.max_keepalive_connections = int(os.getenv('OPENAI_MAX_KEEPALIVE_CONNECTIONS', 10))
+        self.keepalive_expiry = float(os.getenv('OPENAI_KEEPALIVE_EXPIRY', 30))
+        self.connect_timeout = float(os.getenv('OPENAI_CONNECT_TIMEOUT', 5))
+        self.write_timeout = float(os.getenv('OPENAI_WRITE_TIMEOUT', 10))
+        self.pool_timeout = float(os.getenv('OPENAI_POOL_TIMEOUT', 5))
+        # Outro endpoint compatível com a API (ex.: loadtest/fake_openai.py em testes de carga)
+        self.base_url = os.getenv('OPENAI_BASE_URL') or None
+
+        http2_setting = os.getenv('OPENAI_HTTP2', 'auto').lower()
+        h2_available = importlib.util.find_spec('h2') is not None
+        self.http2 = h2_available if http2_setting == 'auto' else (http2_setting == 'true' and h2_available)
+        if http2_setting == 'true' and not h2_available:
+            logger.warning("OPENAI_HTTP2=true, mas o pacote h2 não está instalado; usando HTTP/1.1")
+
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        # Clientes por chave de API; todos compartilham o mesmo pool de conexões
+        self._clients: Dict[Optional[str], object] = {}
+        self._async_clients: Dict[Optional[str], object] = {}
+        self._http_client = None
+        self._async_http_client = None
+        self._counters = {'requests': 0, 'responses': 0, 'errors': 0}
+
+    def timeout_for(self, operation: str = 'classify'):
+        import httpx
+
+        env_name, default = OPERATION_READ_TIMEOUTS.get(operation, OPERATION_READ_TIMEOUTS['classify'])
+        return httpx.Timeout(
+            connect=self.connect_timeout,
+            read=float(os.getenv(env_name, default)),
+            write=self.write_timeout,
+            pool=self.pool_timeout,
+        )
+
+    def _limits(self):
+        import httpx
+
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _on_request(self, request):
+        self._count('requests')
+
+    def _on_response(self, response):
+        self._count('responses' if response.status_code < 400 else 'errors')
+
+    async def _aon_request(self, request):
+        self._on_request(request)
+
+    async def _aon_response(self, response):
+        self._on_response(response)
+
+    def _check_fork(self):
+        # Conexões não sobrevivem a um fork (ex.: gunicorn --preload): recria no processo filho
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._clients, self._async_clients = {}, {}
+            self._http_client = self._async_http_client = None
+
+    def get_client(self, api_key: Optional[str] = None):
+        api_key = api_key or os.getenv('OPENAI_API_KEY')
+        with self._lock:
+            self._check_fork()
+            client = self._clients.get(api_key)
+            if client is None:
+                import httpx
+                import openai
+
+                if self._http_client is None:
+                    self._http_client = httpx.Client(
+                        limits=self._limits(),
+                        timeout=self.timeout_for('classify'),
+                        http2=self.http2,
+                        event_hooks={'request': [self._on_request], 'response': [self._on_response]},
+                    )
+                client = self._clients[api_key] = openai.OpenAI(
+                    api_key=api_key,
+                    base_url=self.base_url,
+                    http_client=self._http_client,
+                    max_retries=int(os.getenv('OPENAI_MAX_RETRIES', 2)),
+                )
+            return client
+
+    def get_async_client(self, api_key: Optional[str] = None):
+        api_key = api_key or os.getenv('OPENAI_API_KEY')
+        with self._lock:
+            self._check_fork()
+            client = self._async_clients.get(api_key)
+            if client is None:
+                import httpx
+                import openai
+
+                if self._async_http_client is None:
+                    self._async_http_client = httpx.AsyncClient(
+                        limits=self._limits(),
+                        timeout=self.timeout_for('classify'),
+                        http2=self.http2,
+                        event_hooks={'request': [self._aon_request], 'response': [self._aon_response]},
+                    )
+                client = self._async_clients[api_key] = openai.AsyncOpenAI(
+                    api_key=api_key,
+                    base_url=self.base_url,
+                    http_client=self._async_http_client,
+                    max_retries=int(os.getenv('OPENAI_MAX_RETRIES', 2)),
+                )
+            return client
+
+    @staticmethod
+    def _pool_stats(http_client) -> Optional[Dict]:
+        if http_client is None:
+            return None
+        try:
+            # Acesso best-effort ao pool do httpcore (não faz parte da API pública do httpx)
+            connections = list(http_client._transport._pool.connections)
+            idle = sum(1 for connection in connections if connection.is_idle())
+            return {'connections': len(connections), 'idle': idle, 'active': len(connections) - idle}
+        except Exception:
+            return {'connections': None, 'idle': None, 'active': None}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            'base_url': self.base_url,
+            'http2': self.http2,
+            'max_connections': self.max_connections,
+            'max_keepalive_connections': self.max_keepalive_connections,
+            'keepalive_expiry': self.keepalive_expiry,
+            'sync_pool': self._pool_stats(self._http_client),
+            'async_pool': self._pool_stats(self._async_http_client),
+            **counters,
+        }
+
+
+_factory: Optional[LLMClientFactory] = None
+_factory_lock = threading.Lock()
+
+
+def get_llm_factory() -> LLMClientFactory:
+    global _factory
+    with _factory_lock:
+        if _factory is None:
+            _factory = LLMClientFactory()
+        return _factory
+
+
+def get_openai_client(api_key: Optional[str] = None):
+    return get_llm_factory().get_client(api_key)
+
+
+def get_async_openai_client(api_key: Optional[str] = None):
+    return get_llm_factory().get_async_client(api_key)
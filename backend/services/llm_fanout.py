@@ -0,0 +1,84 @@
+import os
+import asyncio
+import threading
+import contextvars
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncFanout:
+    """
+    Executa chamadas assíncronas à OpenAI a partir das rotas síncronas do Flask.
+
+    Um único event loop roda em uma thread de fundo durante toda a vida do
+    processo, então os clientes AsyncOpenAI (e suas conexões) ficam presos a
+    um só loop e o limite global de chamadas em andamento é um semáforo
+    comum compartilhado por todas as requisições.
+    """
+
+    def __init__(self, max_in_flight: Optional[int] = None, batch_concurrency: Optional[int] = None):
+        self.max_in_flight = max_in_flight or int(os.getenv('OPENAI_MAX_IN_FLIGHT', 32))
+        self.batch_concurrency = batch_concurrency or int(os.getenv('OPENAI_BATCH_CONCURRENCY', 8))
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._in_flight: Optional[asyncio.Semaphore] = None
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name='llm-fanout', daemon=True)
+                thread.start()
+                self._loop = loop
+        return self._loop
+
+    def in_flight(self) -> asyncio.Semaphore:
+        # Só é chamado de corrotinas no loop de fundo, então a criação preguiçosa não disputa
+        if self._in_flight is None:
+            self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        return self._in_flight
+
+    def map(self, function: Callable[[Any], Awaitable[Any]], items: Sequence,
+            concurrency: Optional[int] = None) -> List[Any]:
+        """
+        Aplica a corrotina a cada item com concorrência limitada e devolve os
+        resultados na ordem da entrada; exceções são devolvidas no lugar do item.
+        """
+        if not items:
+            return []
+        return self.run(self._gather(function, items, concurrency or self.batch_concurrency))
+
+    def run(self, coroutine: Awaitable[Any]) -> Any:
+        loop = self._ensure_loop()
+        # A tarefa nasce na thread do loop; leva junto o contexto de quem chamou (ex.: trace da requisição)
+        context = contextvars.copy_context()
+        return asyncio.run_coroutine_threadsafe(_with_context(context, coroutine), loop).result()
+
+    async def _gather(self, function, items, concurrency):
+        limit = asyncio.Semaphore(max(1, concurrency))
+
+        async def run_item(item):
+            async with limit:
+                return await function(item)
+
+        return await asyncio.gather(*(run_item(item) for item in items), return_exceptions=True)
+
+
+async def _with_context(context: contextvars.Context, coroutine: Awaitable[Any]) -> Any:
+    for variable, value in context.items():
+        variable.set(value)
+    return await coroutine
+
+
+_fanout: Optional[AsyncFanout] = None
+_fanout_lock = threading.Lock()
+
+
+def get_fanout() -> AsyncFanout:
+    global _fanout
+    with _fanout_lock:
+        if _fanout is None:
+            _fanout = AsyncFanout()
+        return _fanout
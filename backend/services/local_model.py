@@ -0,0 +1,192 @@
+import os
+import sys
+import glob
+import json
+import math
+import pickle
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_FORMAT_VERSION = 1
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODEL_PATH = os.path.join(BACKEND_DIR, 'models', 'local_classifier.pkl')
+TRAINING_DIR = os.path.join(BACKEND_DIR, 'training')
+
+
+def load_training_examples(augmented_paths: Optional[Iterable[str]] = None) -> List[Dict]:
+    """
+    Junta TRAINING_DATA com os arquivos gerados por DataAugmenter.save_augmented_data,
+    removendo emails repetidos (os arquivos aumentados incluem os originais).
+    """
+    if TRAINING_DIR not in sys.path:
+        sys.path.append(TRAINING_DIR)
+    from training_data import get_training_examples
+
+    if augmented_paths is None:
+        augmented_paths = sorted(glob.glob(os.path.join(TRAINING_DIR, 'augmented*.json')))
+
+    examples = list(get_training_examples())
+    for path in augmented_paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            examples.extend(json.load(f))
+
+    seen = set()
+    unique = []
+    for item in examples:
+        email = (item.get('email') or '').strip().strip('"')
+        category = item.get('category')
+        if not email or category not in ('Produtivo', 'Improdutivo') or email in seen:
+            continue
+        seen.add(email)
+        unique.append({'email': email, 'category': category})
+    return unique
+
+
+class LocalModel:
+    """
+    Classificador local TF-IDF (n-gramas de palavras e de caracteres) + regressão
+    logística, treinado a partir dos dados de treinamento do repositório.
+
+    A probabilidade é calibrada com uma sigmoide (Platt) ajustada sobre os
+    escores de validação cruzada. Para um único email o modelo ajustado é
+    compilado em tabelas n-grama -> (idf, peso), evitando o overhead do
+    scikit-learn por chamada; lotes usam as operações vetorizadas do pipeline.
+    """
+
+    def __init__(self, pipeline, calibration: Tuple[float, float], metadata: Dict):
+        self.pipeline = pipeline
+        self.calibration = calibration
+        self.metadata = metadata
+        self.classes = [str(label) for label in pipeline.classes_]
+        if len(self.classes) != 2:
+            raise ValueError("O modelo local suporta apenas classificação binária")
+        self._compile()
+
+    @property
+    def version(self) -> str:
+        return self.metadata.get('model_version', 'desconhecida')
+
+    @classmethod
+    def train(cls, texts: Sequence[str], labels: Sequence[str]) -> 'LocalModel':
+        import sklearn
+        from collections import Counter
+        from sklearn.base import clone
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.model_selection import cross_val_predict
+        from sklearn.pipeline import FeatureUnion, Pipeline
+
+        texts, labels = list(texts), list(labels)
+        features = FeatureUnion([
+            ('word', TfidfVectorizer(analyzer='word', ngram_range=(1, 2), sublinear_tf=True)),
+            ('char', TfidfVectorizer(analyzer='char_wb', ngram_range=(2, 5), sublinear_tf=True)),
+        ])
+        pipeline = Pipeline([
+            ('features', features),
+            ('classifier', LogisticRegression(C=10.0, max_iter=1000, class_weight='balanced')),
+        ])
+
+        # Calibração de Platt sobre escores fora da amostra, quando há exemplos suficientes
+        calibration = (1.0, 0.0)
+        folds = min(5, min(Counter(labels).values()))
+        if folds >= 3:
+            scores = cross_val_predict(clone(pipeline), texts, labels, cv=folds,
+                                       method='decision_function')
+            platt = LogisticRegression().fit(scores.reshape(-1, 1), labels)
+            calibration = (float(platt.coef_[0][0]), float(platt.intercept_[0]))
+
+        pipeline.fit(texts, labels)
+
+        metadata = {
+            'format_version': ARTIFACT_FORMAT_VERSION,
+            'model_version': datetime.now().strftime('%Y%m%d_%H%M%S'),
+            'sklearn_version': sklearn.__version__,
+            'trained_on': len(texts),
+            'calibrated': calibration != (1.0, 0.0),
+        }
+        return cls(pipeline, calibration, metadata)
+
+    def save(self, path: str = DEFAULT_MODEL_PATH) -> str:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({
+                'metadata': self.metadata,
+                'calibration': self.calibration,
+                'pipeline': self.pipeline,
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_MODEL_PATH) -> 'LocalModel':
+        with open(path, 'rb') as f:
+            artifact = pickle.load(f)
+
+        metadata = artifact.get('metadata', {})
+        if metadata.get('format_version') != ARTIFACT_FORMAT_VERSION:
+            raise ValueError(f"Versão de artefato incompatível: {metadata.get('format_version')}")
+
+        import sklearn
+        if metadata.get('sklearn_version') != sklearn.__version__:
+            logger.warning(
+                f"Modelo local treinado com scikit-learn {metadata.get('sklearn_version')}, "
+                f"executando com {sklearn.__version__}"
+            )
+        return cls(artifact['pipeline'], tuple(artifact['calibration']), metadata)
+
+    def _compile(self):
+        classifier = self.pipeline.named_steps['classifier']
+        coef = classifier.coef_[0]
+        self._intercept = float(classifier.intercept_[0])
+        self._tables = []
+        offset = 0
+        for _, vectorizer in self.pipeline.named_steps['features'].transformer_list:
+            table = {
+                ngram: (float(vectorizer.idf_[index]), float(coef[offset + index]))
+                for ngram, index in vectorizer.vocabulary_.items()
+            }
+            self._tables.append((vectorizer.build_analyzer(), table, vectorizer.sublinear_tf))
+            offset += len(vectorizer.vocabulary_)
+
+    def _probability(self, score: float) -> float:
+        a, b = self.calibration
+        z = a * score + b
+        if z >= 0:
+            return 1.0 / (1.0 + math.exp(-z))
+        ez = math.exp(z)
+        return ez / (1.0 + ez)
+
+    def _result(self, score: float) -> Tuple[str, float]:
+        positive = self._probability(score)
+        if positive >= 0.5:
+            return self.classes[1], positive
+        return self.classes[0], 1.0 - positive
+
+    def predict_one(self, text: str) -> Tuple[str, float]:
+        score = self._intercept
+        for analyzer, table, sublinear in self._tables:
+            counts: Dict[str, int] = {}
+            for ngram in analyzer(text):
+                if ngram in table:
+                    counts[ngram] = counts.get(ngram, 0) + 1
+            dot = 0.0
+            norm = 0.0
+            for ngram, count in counts.items():
+                idf, weight = table[ngram]
+                value = (1.0 + math.log(count) if sublinear else count) * idf
+                dot += value * weight
+                norm += value * value
+            if norm:
+                score += dot / math.sqrt(norm)
+        return self._result(score)
+
+    def predict(self, texts: Sequence[str]) -> List[Tuple[str, float]]:
+        texts = list(texts)
+        if len(texts) == 1:
+            return [self.predict_one(texts[0])]
+        scores = self.pipeline.decision_function(texts)
+        return [self._result(float(score)) for score in scores]
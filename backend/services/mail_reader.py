@@ -0,0 +1,183 @@
+import re
+import logging
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesParser
+from html.parser import HTMLParser
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from services.stream_reader import StreamFormatError
+
+logger = logging.getLogger(__name__)
+
+MAIL_EXTENSIONS = ('.eml', '.mbox')
+# Linha separadora do mbox: "From remetente data" no início da linha, depois de uma linha em branco
+MBOX_FROM_LINE = b'From '
+# mboxrd/mboxo escapam com ">" as linhas do corpo que começam com "From "
+ESCAPED_FROM_LINE = re.compile(rb'^>+From ')
+
+
+class HTMLTextExtractor(HTMLParser):
+    """Texto visível de um corpo HTML, com quebras de linha nos blocos."""
+
+    BLOCK_TAGS = frozenset(('p', 'div', 'br', 'tr', 'li', 'ul', 'ol', 'table', 'blockquote',
+                            'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'pre'))
+    SKIP_TAGS = frozenset(('script', 'style', 'head', 'title'))
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._parts: List[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self._parts.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self.BLOCK_TAGS:
+            self._parts.append('\n')
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._parts.append(data)
+
+    def text(self) -> str:
+        text = re.sub(r'[ \t\r\f\v]+', ' ', ''.join(self._parts))
+        return re.sub(r'\s*\n\s*', '\n', text).strip()
+
+
+def html_to_text(html: str) -> str:
+    extractor = HTMLTextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return extractor.text()
+
+
+class MailboxReader:
+    """
+    Lê as mensagens de um arquivo .mbox (ou de um único .eml) direto do
+    stream, uma por vez: só a mensagem em leitura fica em memória, limitada a
+    ``max_message_bytes``, então exportações de centenas de MB são
+    processadas com memória constante.
+
+    Cada mensagem vira um item no formato de EmailPipeline.process_items():
+    {"text": ..., "id": Message-ID}. O texto é o assunto mais o corpo
+    (text/plain ou, sem ele, o HTML convertido em texto) e o texto dos PDFs
+    anexados, extraído por ``pdf_text``. Uma mensagem ilegível ou acima do
+    limite é devolvida como StreamFormatError no lugar do item.
+    """
+
+    def __init__(self, stream, single: bool = False, pdf_text: Optional[Callable[[bytes], str]] = None,
+                 max_message_bytes: int = 25 * 1024 * 1024, read_size: int = 64 * 1024):
+        self.stream = stream
+        self.single = single
+        self.pdf_text = pdf_text
+        self.max_message_bytes = max_message_bytes
+        self.read_size = read_size
+        self._parser = BytesParser(policy=policy.default)
+
+    def __iter__(self) -> Iterator[Any]:
+        for number, raw in enumerate(self._iter_raw_messages(), start=1):
+            if raw is None:
+                yield StreamFormatError(
+                    f'Mensagem {number} maior que o limite de {self.max_message_bytes} bytes')
+                continue
+            try:
+                yield self._to_item(self._parser.parsebytes(raw))
+            except Exception as e:
+                logger.error(f"Erro ao ler a mensagem {number}: {str(e)}")
+                yield StreamFormatError(f'Mensagem {number} inválida: {str(e)}')
+
+    def _iter_lines(self) -> Iterator[bytes]:
+        # readline com limite: uma linha gigante (anexo sem quebras) não é lida de uma vez
+        while True:
+            line = self.stream.readline(self.read_size)
+            if not line:
+                return
+            yield line
+
+    def _iter_raw_messages(self) -> Iterator[Optional[bytes]]:
+        """Bytes de cada mensagem; None para a que passou do limite (o resto dela é descartado)."""
+        lines: List[bytes] = []
+        size = 0
+        oversized = False
+        line_start = True
+        previous_blank = True
+        for line in self._iter_lines():
+            starts_message = (not self.single and line_start and previous_blank
+                              and line.startswith(MBOX_FROM_LINE))
+            line_start = line.endswith(b'\n')
+            if starts_message:
+                if lines or oversized:
+                    yield None if oversized else b''.join(lines)
+                lines, size, oversized = [], 0, False
+                previous_blank = False
+                continue
+
+            previous_blank = line_start and not line.strip()
+            if oversized:
+                continue
+            if not self.single and ESCAPED_FROM_LINE.match(line):
+                line = line[1:]
+            size += len(line)
+            if size > self.max_message_bytes:
+                lines, oversized = [], True
+                continue
+            lines.append(line)
+
+        if oversized:
+            yield None
+        elif any(line.strip() for line in lines):
+            yield b''.join(lines)
+
+    def _to_item(self, message: EmailMessage) -> Dict:
+        parts = []
+        subject = str(message.get('subject', '') or '').strip()
+        if subject:
+            parts.append(f'Assunto: {subject}')
+        body = self._body_text(message)
+        if body:
+            parts.append(body)
+        parts.extend(self._attachment_texts(message))
+
+        item = {'text': '\n\n'.join(parts)}
+        message_id = str(message.get('message-id', '') or '').strip()
+        if message_id:
+            item['id'] = message_id
+        return item
+
+    @staticmethod
+    def _part_text(part: EmailMessage) -> str:
+        try:
+            return part.get_content()
+        except (LookupError, UnicodeDecodeError):
+            # Charset desconhecido ou errado no cabeçalho
+            payload = part.get_payload(decode=True) or b''
+            return payload.decode('utf-8', errors='replace')
+
+    def _body_text(self, message: EmailMessage) -> str:
+        body = message.get_body(preferencelist=('plain', 'html'))
+        if body is None:
+            return ''
+        text = self._part_text(body)
+        if body.get_content_type() == 'text/html':
+            text = html_to_text(text)
+        return text.strip()
+
+    def _attachment_texts(self, message: EmailMessage) -> Iterator[str]:
+        if self.pdf_text is None:
+            return
+        for part in message.iter_attachments():
+            filename = part.get_filename() or ''
+            if part.get_content_type() != 'application/pdf' and not filename.lower().endswith('.pdf'):
+                continue
+            try:
+                text = self.pdf_text(part.get_payload(decode=True) or b'')
+            except Exception as e:
+                logger.error(f"Erro ao extrair o anexo {filename or 'PDF'}: {str(e)}")
+                continue
+            if text:
+                yield f'Anexo {filename}:\n{text}' if filename else text
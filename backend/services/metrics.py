@@ -0,0 +1,281 @@
+import os
+import json
+import time
+import bisect
+import atexit
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from services.tracing import Span, trace_span
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def snapshot(self) -> List:
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, count: int = 1, **labels):
+        """Registra ``count`` observações de ``value`` (ex.: tempo amortizado de cada item de um lote)."""
+        index = bisect.bisect_left(self.buckets, value)
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Contagem por faixa (não cumulativa; o acúmulo é feito na exposição) e soma
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += count
+            state[1] += value * count
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> List:
+        with self._lock:
+            return [[list(key), [list(counts), total]] for key, (counts, total) in self._values.items()]
+
+
+class MetricsRegistry:
+    """
+    Métricas do processo em memória, expostas no formato texto do Prometheus.
+
+    Atualizar um contador ou histograma custa um lock e algumas somas. Com
+    vários workers (gunicorn) cada processo só enxerga os próprios números;
+    definindo METRICS_MULTIPROC_DIR, cada processo grava periodicamente um
+    instantâneo em um arquivo próprio nesse diretório e o /metrics de
+    qualquer worker soma os arquivos de todos. Arquivos de processos que já
+    terminaram continuam somando, então os contadores nunca regridem.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self.multiproc_dir = os.getenv('METRICS_MULTIPROC_DIR') or None
+        self.flush_interval = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+        self._flusher: Optional[threading.Thread] = None
+        self._flush_lock = threading.Lock()
+        self._file_name = self._new_file_name()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Métrica já registrada: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    @staticmethod
+    def _new_file_name() -> str:
+        # pid + instante de início: um pid reaproveitado não sobrescreve o arquivo de outro processo
+        return f"metrics_{os.getpid()}_{time.time_ns()}.json"
+
+    def _after_fork(self):
+        # Valores herdados do processo pai já estão no arquivo dele
+        for metric in self._metrics.values():
+            metric.reset()
+        self._file_name = self._new_file_name()
+        self._flush_lock = threading.Lock()
+        # Threads não sobrevivem ao fork (ex.: gunicorn --preload); processos
+        # auxiliares sem gravação ativa no pai (pool de PDFs) não ganham arquivo
+        restart = self._flusher is not None
+        self._flusher = None
+        if restart:
+            self.start()
+
+    def start(self):
+        """Inicia a gravação periódica do instantâneo quando METRICS_MULTIPROC_DIR está definido."""
+        if not self.multiproc_dir or self._flusher is not None:
+            return
+        os.makedirs(self.multiproc_dir, exist_ok=True)
+        self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+        self._flusher.start()
+        atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Erro ao gravar métricas: {str(e)}")
+
+    def snapshot(self) -> Dict:
+        return {
+            name: {
+                'kind': metric.kind,
+                'documentation': metric.documentation,
+                'labelnames': list(metric.labelnames),
+                'buckets': list(getattr(metric, 'buckets', ())),
+                'values': metric.snapshot(),
+            }
+            for name, metric in self._metrics.items()
+        }
+
+    def flush(self):
+        if not self.multiproc_dir:
+            return
+        with self._flush_lock:
+            path = os.path.join(self.multiproc_dir, self._file_name)
+            temporary = f"{path}.tmp"
+            with open(temporary, 'w', encoding='utf-8') as file:
+                json.dump(self.snapshot(), file)
+            os.replace(temporary, path)
+
+    def collect(self) -> Dict:
+        """Instantâneo deste processo ou, no modo multiprocesso, a soma dos arquivos de todos."""
+        if not self.multiproc_dir:
+            return self.snapshot()
+
+        self.flush()
+        merged: Dict[str, Dict] = {}
+        for file_name in sorted(os.listdir(self.multiproc_dir)):
+            if not (file_name.startswith('metrics_') and file_name.endswith('.json')):
+                continue
+            try:
+                with open(os.path.join(self.multiproc_dir, file_name), encoding='utf-8') as file:
+                    snapshot = json.load(file)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignorando arquivo de métricas {file_name}: {str(e)}")
+                continue
+            for name, data in snapshot.items():
+                target = merged.setdefault(name, dict(data, values={}))
+                for labels, value in data['values']:
+                    key = tuple(labels)
+                    current = target['values'].get(key)
+                    if current is None:
+                        target['values'][key] = value
+                    elif data['kind'] == 'histogram':
+                        current[0] = [a + b for a, b in zip(current[0], value[0])]
+                        current[1] += value[1]
+                    else:
+                        target['values'][key] = current + value
+        for data in merged.values():
+            data['values'] = [[list(key), value] for key, value in data['values'].items()]
+        return merged
+
+    def render(self) -> str:
+        lines = []
+        for name, data in self.collect().items():
+            lines.append(f"# HELP {name} {data['documentation']}")
+            lines.append(f"# TYPE {name} {data['kind']}")
+            labelnames = data['labelnames']
+            for labels, value in data['values']:
+                pairs = list(zip(labelnames, labels))
+                if data['kind'] == 'counter':
+                    lines.append(f"{name}{_format_labels(pairs)} {_format_value(value)}")
+                    continue
+                counts, total = value
+                cumulative = 0
+                for bound, count in zip(data['buckets'] + ['+Inf'], counts):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else _format_value(bound)
+                    lines.append(f"{name}_bucket{_format_labels(pairs + [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(pairs)} {_format_value(total)}")
+                lines.append(f"{name}_count{_format_labels(pairs)} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(pairs: List[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ''
+    escaped = (
+        f'{name}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value))
+
+
+REGISTRY = MetricsRegistry()
+
+EXTRACTION_SECONDS = REGISTRY.histogram(
+    'email_extraction_seconds', 'Tempo de extração de texto de arquivos enviados', ['format'])
+PREPROCESS_SECONDS = REGISTRY.histogram(
+    'email_preprocess_seconds', 'Tempo de pré-processamento (normalização) de um email')
+CLASSIFICATION_SECONDS = REGISTRY.histogram(
+    'email_classification_seconds', 'Tempo de classificação de um email', ['backend'])
+RESPONSE_SECONDS = REGISTRY.histogram(
+    'email_response_seconds', 'Tempo de geração da resposta sugerida', ['backend'])
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    'llm_request_seconds', 'Latência das chamadas à OpenAI', ['operation', 'outcome'])
+REQUEST_SIZE_BYTES = REGISTRY.histogram(
+    'http_request_size_bytes', 'Tamanho do corpo das requisições', ['endpoint'], SIZE_BUCKETS)
+REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_duration_seconds', 'Tempo até o início da resposta HTTP', ['endpoint', 'method'])
+REQUESTS_TOTAL = REGISTRY.counter(
+    'http_requests_total', 'Requisições HTTP atendidas', ['endpoint', 'method', 'status'])
+CACHE_LOOKUPS = REGISTRY.counter(
+    'cache_lookups_total', 'Consultas aos caches de resultados', ['cache', 'result'])
+FALLBACKS = REGISTRY.counter(
+    'fallbacks_total', 'Falhas de um backend resolvidas por regras ou templates', ['stage', 'backend'])
+CONDENSE_REMOVED_RATIO = REGISTRY.histogram(
+    'email_condense_removed_ratio', 'Fração dos bytes do email removida antes do envio ao LLM',
+    buckets=(0.0, 0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9))
+ERRORS = REGISTRY.counter(
+    'email_errors_total', 'Emails que terminaram em erro', ['stage'])
+
+
+@contextmanager
+def track_llm_request(operation: str, model: Optional[str] = None) -> Iterator[Optional[Span]]:
+    """Mede uma chamada à OpenAI e a registra como span 'llm' do trace atual (devolvido, ou None)."""
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        with trace_span('llm', **{'gen_ai.operation.name': operation, 'gen_ai.request.model': model or ''}) as span:
+            yield span
+        outcome = 'ok'
+    finally:
+        LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, operation=operation, outcome=outcome)
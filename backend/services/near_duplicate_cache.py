@@ -0,0 +1,225 @@
+import os
+import re
+import time
+import zlib
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Primo de Mersenne 2^31 - 1: a * x + b cabe em 64 bits sem estouro
+MERSENNE_PRIME = (1 << 31) - 1
+# Semente fixa: assinaturas comparáveis entre processos e execuções
+HASH_SEED = 20240607
+
+TOKEN_PATTERN = re.compile(r'\S+@\S+|\w+')
+SENTENCE_BREAK = frozenset('.!?:;\n')
+MASK_EMAIL, MASK_NUMBER, MASK_NAME = '<email>', '<num>', '<nome>'
+
+
+class Fingerprint(NamedTuple):
+    signature: object  # numpy.ndarray de uint32
+    masked: FrozenSet[str]
+
+
+def mask_tokens(text: str) -> Tuple[List[str], FrozenSet[str]]:
+    """
+    Tokens do email com os dados que variam entre mensagens do mesmo modelo
+    trocados por marcadores: endereços de email, qualquer palavra com dígitos
+    (protocolos, finais de cartão, datas, valores) e nomes próprios, isto é,
+    palavras capitalizadas fora do início de uma frase. Marcadores iguais em
+    sequência viram um só. Devolve também os valores mascarados, em minúsculas.
+    """
+    tokens = []
+    masked = set()
+    sentence_start = True
+    position = 0
+    for match in TOKEN_PATTERN.finditer(text):
+        if not SENTENCE_BREAK.isdisjoint(text[position:match.start()]):
+            sentence_start = True
+        position = match.end()
+        word = match.group()
+        if '@' in word:
+            token = MASK_EMAIL
+        elif any(char.isdigit() for char in word):
+            token = MASK_NUMBER
+        elif not sentence_start and word[0].isupper() and not word.isupper():
+            token = MASK_NAME
+        else:
+            token = word.lower()
+        sentence_start = False
+        if token in (MASK_EMAIL, MASK_NUMBER, MASK_NAME):
+            masked.add(word.lower())
+            # "Ana Paula Costa" e "Pedro", "2024-99812" e "5531" contam como um único token
+            if tokens and tokens[-1] == token:
+                continue
+        tokens.append(token)
+    return tokens, frozenset(masked)
+
+
+class NearDuplicateCache:
+    """
+    Cache de emails quase duplicados, consultado quando o cache exato
+    (ResultCache) falha.
+
+    O email é reduzido a tokens com números, nomes e endereços mascarados
+    (mask_tokens), e o conjunto de trigramas desses tokens vira uma assinatura
+    MinHash de bands * rows valores. Um índice LSH por faixas (bands) encontra
+    os candidatos que coincidem em pelo menos uma faixa, e o mais parecido é
+    reaproveitado se a similaridade estimada (fração de valores iguais nas
+    assinaturas, que aproxima o índice de Jaccard) atingir o limiar.
+
+    A memória é limitada pelo número de entradas (despejo LRU) e cada entrada
+    expira após o TTL. Resultados cuja resposta cita algum dado mascarado do
+    email de origem (ex.: o número do protocolo) não são indexados, para não
+    serem devolvidos a outro cliente.
+
+    NEAR_DUP_CACHE=auto (padrão) só consulta o cache quando a classificação ou
+    a resposta usam a OpenAI: com modelo local ou regras, calcular a
+    assinatura custa mais do que classificar de novo.
+    """
+
+    def __init__(self, threshold: Optional[float] = None, max_entries: Optional[int] = None,
+                 ttl: Optional[float] = None, bands: Optional[int] = None, rows: Optional[int] = None):
+        self.mode = os.getenv('NEAR_DUP_CACHE', 'auto').strip().lower()
+        self.enabled = self.mode != 'false'
+        self.threshold = threshold if threshold is not None else float(os.getenv('NEAR_DUP_THRESHOLD', 0.9))
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('NEAR_DUP_MAX_ENTRIES', 5000))
+        self.ttl = ttl if ttl is not None else float(os.getenv('NEAR_DUP_TTL', 3600))
+        self.bands = bands or int(os.getenv('NEAR_DUP_BANDS', 8))
+        self.rows = rows or int(os.getenv('NEAR_DUP_ROWS', 8))
+        # Emails muito curtos têm poucos trigramas e a estimativa fica instável
+        self.min_tokens = int(os.getenv('NEAR_DUP_MIN_TOKENS', 8))
+
+        self._coefficients = None
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._buckets: List[Dict[bytes, set]] = [{} for _ in range(self.bands)]
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.unsafe = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.candidates = 0
+        self._similarity_total = 0.0
+
+    def _permutations(self):
+        if self._coefficients is None:
+            import numpy as np
+            generator = np.random.default_rng(HASH_SEED)
+            size = (self.bands * self.rows, 1)
+            self._coefficients = (
+                generator.integers(1, MERSENNE_PRIME, size=size, dtype=np.uint64),
+                generator.integers(0, MERSENNE_PRIME, size=size, dtype=np.uint64),
+            )
+        return self._coefficients
+
+    def fingerprint(self, text: str) -> Optional[Fingerprint]:
+        """Assinatura MinHash do email; None se for curto demais para comparar."""
+        tokens, masked = mask_tokens(text)
+        if len(tokens) < self.min_tokens:
+            with self._lock:
+                self.skipped += 1
+            return None
+
+        import numpy as np
+        shingles = {' '.join(tokens[i:i + 3]) for i in range(len(tokens) - 2)}
+        hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8', 'surrogatepass')) for shingle in shingles),
+                             dtype=np.uint64, count=len(shingles)) % MERSENNE_PRIME
+        a, b = self._permutations()
+        signature = ((a * hashes + b) % MERSENNE_PRIME).min(axis=1).astype(np.uint32)
+        return Fingerprint(signature, masked)
+
+    def _band_keys(self, signature) -> List[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def get(self, fingerprint: Fingerprint, identity: str) -> Optional[Tuple[Dict, float]]:
+        """Resultado do email indexado mais parecido e a similaridade estimada, se atingir o limiar."""
+        with self._lock:
+            candidates = set()
+            for bucket, key in zip(self._buckets, self._band_keys(fingerprint.signature)):
+                candidates.update(bucket.get(key, ()))
+
+            now = time.monotonic()
+            best_id, best_similarity = None, 0.0
+            for entry_id in candidates:
+                entry_identity, signature, _, _, expires_at = self._entries[entry_id]
+                if expires_at <= now:
+                    self._remove(entry_id)
+                    self.expirations += 1
+                    continue
+                if entry_identity != identity:
+                    continue
+                similarity = float((signature == fingerprint.signature).mean())
+                if similarity > best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+            self.candidates += len(candidates)
+
+            if best_id is None or best_similarity < self.threshold:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            self._similarity_total += best_similarity
+            return dict(self._entries[best_id][2]), best_similarity
+
+    def put(self, fingerprint: Fingerprint, identity: str, value: Dict):
+        if self.max_entries <= 0:
+            return
+        response = value.get('suggested_response') or ''
+        if not fingerprint.masked.isdisjoint(word.lower() for word in TOKEN_PATTERN.findall(response)):
+            with self._lock:
+                self.unsafe += 1
+            return
+
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            band_keys = self._band_keys(fingerprint.signature)
+            self._entries[entry_id] = (identity, fingerprint.signature, dict(value), band_keys,
+                                       time.monotonic() + self.ttl)
+            for bucket, key in zip(self._buckets, band_keys):
+                bucket.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, entry_id: int):
+        _, _, _, band_keys, _ = self._entries.pop(entry_id)
+        for bucket, key in zip(self._buckets, band_keys):
+            ids = bucket.get(key)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del bucket[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets = [{} for _ in range(self.bands)]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'mode': self.mode,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'threshold': self.threshold,
+                'bands': self.bands,
+                'rows': self.rows,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'mean_hit_similarity': round(self._similarity_total / self.hits, 4) if self.hits else None,
+                'candidates_per_lookup': round(self.candidates / lookups, 2) if lookups else 0.0,
+                'skipped_short': self.skipped,
+                'unsafe_responses': self.unsafe,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
@@ -0,0 +1,103 @@
+import os
+import math
+import shutil
+import tempfile
+import threading
+import multiprocessing
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Cache do último documento aberto em cada processo do pool: faixas seguidas
+# do mesmo PDF não precisam reler a tabela xref
+_worker_reader = (None, None)
+
+
+def _extract_page_range(path: str, start: int, end: int) -> List[str]:
+    global _worker_reader
+    import PyPDF2
+
+    cached_path, reader = _worker_reader
+    if cached_path != path:
+        reader = PyPDF2.PdfReader(path)
+        _worker_reader = (path, reader)
+    return [reader.pages[number].extract_text() or "" for number in range(start, end)]
+
+
+class ParallelPdfExtractor:
+    """
+    Extrai o texto de PDFs grandes em paralelo em um pool de processos persistente.
+
+    O upload é copiado uma vez para um arquivo temporário compartilhado; o
+    documento é dividido em faixas de páginas e cada processo abre o arquivo
+    e extrai a sua faixa. Os textos são devolvidos em ordem de página, e as
+    faixas ainda não iniciadas são canceladas quando quem consome o gerador
+    para de ler (por exemplo, ao atingir o limite de caracteres).
+    """
+
+    def __init__(self, workers: Optional[int] = None, min_pages: Optional[int] = None):
+        self.workers = workers or int(os.getenv('PDF_WORKERS', 0)) or (os.cpu_count() or 1)
+        self.min_pages = min_pages if min_pages is not None else int(os.getenv('PDF_PARALLEL_MIN_PAGES', 50))
+        # 'spawn' evita herdar locks e threads do processo Flask em um fork. Os processos
+        # reimportam o módulo principal: main.py e api/index.py não iniciam nada fora do pai
+        self.start_method = os.getenv('PDF_POOL_START_METHOD', 'spawn')
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def should_parallelize(self, page_count: int) -> bool:
+        return self.min_pages > 0 and self.workers > 1 and page_count >= self.min_pages
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.start_method)
+                )
+            return self._executor
+
+    def _page_ranges(self, page_count: int):
+        # Algumas faixas por processo equilibram páginas de custo desigual
+        chunk = max(1, math.ceil(page_count / (self.workers * 4)))
+        return [(start, min(start + chunk, page_count)) for start in range(0, page_count, chunk)]
+
+    def iter_pages(self, stream, page_count: int) -> Iterator[str]:
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp:
+            shutil.copyfileobj(stream, tmp)
+            path = tmp.name
+
+        futures = []
+        try:
+            executor = self._get_executor()
+            futures = [executor.submit(_extract_page_range, path, start, end)
+                       for start, end in self._page_ranges(page_count)]
+            for future in futures:
+                yield from future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+            # Faixas já em execução carregaram o documento em memória; o arquivo pode sair
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+_extractor: Optional[ParallelPdfExtractor] = None
+_extractor_lock = threading.Lock()
+
+
+def get_pdf_extractor() -> ParallelPdfExtractor:
+    global _extractor
+    with _extractor_lock:
+        if _extractor is None:
+            _extractor = ParallelPdfExtractor()
+        return _extractor
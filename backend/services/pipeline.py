@@ -0,0 +1,364 @@
+import os
+import time
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from services.analyzed_email import AnalyzedEmail
+from services.llm_fanout import get_fanout
+from services.metrics import CACHE_LOOKUPS, ERRORS
+from services.tracing import trace_span
+from services.near_duplicate_cache import Fingerprint
+from services.result_cache import ResultCache
+from services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class EmailPipeline:
+    """
+    Encadeia pré-processamento, classificação e geração de resposta,
+    compartilhado pelas aplicações Flask (backend/main.py e api/index.py).
+
+    Não guarda estado por requisição: cada chamada devolve seus próprios
+    resultados, então uma única instância pode atender várias threads.
+    """
+
+    def __init__(self, email_processor, ai_classifier, response_generator, result_cache=None,
+                 near_duplicate_cache=None):
+        self.email_processor = email_processor
+        self.ai_classifier = ai_classifier
+        self.response_generator = response_generator
+        self.result_cache = result_cache
+        self.near_duplicate_cache = near_duplicate_cache
+        # Maior grupo de itens processado de uma vez em process_stream
+        self.stream_batch_size = int(os.getenv('STREAM_BATCH_SIZE', 16))
+        self.single_flight = SingleFlight()
+
+    def warm_up(self):
+        self.email_processor.warm_up()
+        self.ai_classifier.warm_up()
+        self.response_generator.warm_up()
+
+    def _model_identity(self) -> str:
+        return f"{self.ai_classifier.model_identity}|{self.response_generator.model_identity}"
+
+    def _cache_key(self, processed_text: str) -> Optional[str]:
+        if self.result_cache is None or not self.result_cache.enabled:
+            return None
+        return self.result_cache.make_key(processed_text, self._model_identity())
+
+    def _cache_get(self, cache_key: Optional[str]) -> Optional[Dict]:
+        if cache_key is None:
+            return None
+        with trace_span('cache'):
+            cached = self.result_cache.get(cache_key)
+        CACHE_LOOKUPS.inc(cache='exact', result='miss' if cached is None else 'hit')
+        return cached
+
+    def _near_duplicate_active(self) -> bool:
+        near_cache = self.near_duplicate_cache
+        if near_cache is None or not near_cache.enabled:
+            return False
+        # Em modo auto só compensa quando um email novo custaria uma chamada à OpenAI
+        return near_cache.mode != 'auto' or self.ai_classifier.use_openai or self.response_generator.use_openai
+
+    def _near_duplicate_lookup(self, email: AnalyzedEmail,
+                               cache_key: Optional[str]) -> Tuple[Optional[Dict], Optional[Fingerprint]]:
+        """Resultado de um email quase igual já processado e a assinatura para indexar este, se faltar."""
+        if not self._near_duplicate_active():
+            return None, None
+        try:
+            with trace_span('near_duplicate'):
+                fingerprint = self.near_duplicate_cache.fingerprint(email.original)
+                found = self.near_duplicate_cache.get(fingerprint, self._model_identity()) if fingerprint else None
+        except Exception as e:
+            # Inclui ImportError (numpy ausente): o cache é só otimização e nunca derruba a requisição
+            self._disable_near_duplicate(e)
+            return None, None
+        if fingerprint is None:
+            return None, None
+        CACHE_LOOKUPS.inc(cache='near_duplicate', result='miss' if found is None else 'hit')
+        if found is None:
+            return None, fingerprint
+        output, _ = found
+        # Próximas ocorrências do mesmo texto saem direto do cache exato
+        if cache_key is not None:
+            self.result_cache.put(cache_key, output)
+        output.update({'cached': True, 'near_duplicate': True})
+        return output, None
+
+    def _store(self, cache_key: Optional[str], fingerprint: Optional[Fingerprint], output: Dict):
+        if cache_key is not None:
+            self.result_cache.put(cache_key, output)
+        if fingerprint is not None and self.near_duplicate_cache.enabled:
+            try:
+                self.near_duplicate_cache.put(fingerprint, self._model_identity(), output)
+            except Exception as e:
+                self._disable_near_duplicate(e)
+
+    def _disable_near_duplicate(self, error: Exception):
+        if self.near_duplicate_cache.enabled:
+            logger.error(f"Cache de quase duplicados desativado após erro: {str(error)}")
+        self.near_duplicate_cache.enabled = False
+        ERRORS.inc(stage='near_duplicate')
+
+    def process(self, email_text: str, use_cache: bool = True) -> Dict:
+        # Normalização, minúsculas e palavras-chave calculadas uma vez para todas as etapas
+        email = self.email_processor.analyze(email_text)
+
+        cache_key = self._cache_key(email.normalized) if use_cache else None
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            cached['cached'] = True
+            return cached
+
+        # Emails idênticos em andamento ao mesmo tempo (ex.: respostas a uma campanha)
+        # esperam uma única classificação em vez de chamar a OpenAI cada um
+        flight_key = cache_key or ResultCache.make_key(email.normalized, self._model_identity())
+        output, shared = self.single_flight.do(
+            f"{int(use_cache)}:{flight_key}", lambda: self._process_uncached(email, cache_key, use_cache)
+        )
+        if shared:
+            output = dict(output, coalesced=True)
+        return output
+
+    def _process_uncached(self, email: AnalyzedEmail, cache_key: Optional[str], use_cache: bool) -> Dict:
+        fingerprint = None
+        if use_cache:
+            near_duplicate, fingerprint = self._near_duplicate_lookup(email, cache_key)
+            if near_duplicate is not None:
+                return near_duplicate
+
+        with trace_span('classify') as span:
+            result = self.ai_classifier.classify(email)
+            _annotate(span, result)
+        suggested_response = result.suggested_response
+        if not suggested_response:
+            with trace_span('respond'):
+                suggested_response = self.response_generator.generate_response(
+                    email, result.category, self._use_llm_response(result)
+                )
+
+        output = {
+            'category': result.category,
+            'suggested_response': suggested_response,
+            'confidence': result.confidence,
+        }
+        self._store(cache_key, fingerprint, output)
+        output['cached'] = False
+        return output
+
+    def process_events(self, email_text: str, use_cache: bool = True) -> Iterator[Tuple[str, Dict]]:
+        """
+        Processa um email devolvendo eventos à medida que cada parte fica
+        pronta: ('classification', categoria e confiança) assim que o
+        classificador termina, ('response', trecho) para cada pedaço da resposta
+        sugerida e ('done', resultado completo). Resultados do cache e respostas
+        de template saem em um único trecho.
+        """
+        email = self.email_processor.analyze(email_text)
+        cache_key = self._cache_key(email.normalized) if use_cache else None
+        fingerprint = None
+        output = self._cache_get(cache_key)
+        if output is not None:
+            output['cached'] = True
+        elif use_cache:
+            output, fingerprint = self._near_duplicate_lookup(email, cache_key)
+
+        if output is not None:
+            classification = {'category': output['category'], 'confidence': output['confidence'], 'cached': True}
+            if output.get('near_duplicate'):
+                classification['near_duplicate'] = True
+            yield 'classification', classification
+            yield 'response', {'text': output['suggested_response']}
+            yield 'done', output
+            return
+
+        # Sem agrupamento (single flight): cada cliente recebe o próprio stream
+        with trace_span('classify') as span:
+            result = self.ai_classifier.classify(email)
+            _annotate(span, result)
+        yield 'classification', {'category': result.category, 'confidence': result.confidence, 'cached': False}
+
+        if result.suggested_response:
+            chunks = iter([result.suggested_response])
+        else:
+            chunks = self.response_generator.stream_response(email, result.category, self._use_llm_response(result))
+        parts = []
+        with trace_span('respond'):
+            for chunk in chunks:
+                parts.append(chunk)
+                yield 'response', {'text': chunk}
+
+        output = {
+            'category': result.category,
+            'suggested_response': ''.join(parts).strip(),
+            'confidence': result.confidence,
+        }
+        self._store(cache_key, fingerprint, output)
+        output['cached'] = False
+        yield 'done', output
+
+    def process_many(self, emails: List, use_cache: bool = True) -> List[Dict]:
+        start_time = time.perf_counter()
+        results: List[Dict] = [None] * len(emails)
+
+        pending_indexes = []
+        pending_emails = []
+        pending_keys = []
+        pending_fingerprints = []
+        # Textos repetidos no mesmo lote são processados uma vez: índice -> posição em pending
+        duplicates: Dict[int, int] = {}
+        pending_by_text: Dict[str, int] = {}
+        for i, email_text in enumerate(emails):
+            if not isinstance(email_text, str):
+                ERRORS.inc(stage='invalid_input')
+                results[i] = {'index': i, 'error': 'Email deve ser um texto'}
+                continue
+
+            email = self.email_processor.analyze(email_text)
+            cache_key = self._cache_key(email.normalized) if use_cache else None
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                cached.update({'index': i, 'cached': True, 'processing_time': 0.0})
+                results[i] = cached
+                continue
+
+            if self.single_flight.enabled and email.normalized in pending_by_text:
+                duplicates[i] = pending_by_text[email.normalized]
+                continue
+
+            fingerprint = None
+            if use_cache:
+                near_duplicate, fingerprint = self._near_duplicate_lookup(email, cache_key)
+                if near_duplicate is not None:
+                    near_duplicate.update({'index': i, 'processing_time': 0.0})
+                    results[i] = near_duplicate
+                    continue
+
+            pending_by_text[email.normalized] = len(pending_indexes)
+            pending_indexes.append(i)
+            pending_emails.append(email)
+            pending_keys.append(cache_key)
+            pending_fingerprints.append(fingerprint)
+
+        if not pending_indexes:
+            return results
+
+        if self.ai_classifier.use_openai or self.response_generator.use_openai:
+            # Itens do lote em paralelo no event loop compartilhado, com concorrência limitada
+            outcomes = get_fanout().map(self._aprocess_item, pending_emails)
+        else:
+            outcomes = self._process_batch(pending_emails, start_time)
+
+        for i, cache_key, fingerprint, outcome in zip(pending_indexes, pending_keys,
+                                                      pending_fingerprints, outcomes):
+            if isinstance(outcome, Exception):
+                ERRORS.inc(stage='batch_item')
+                results[i] = {'index': i, 'error': str(outcome)}
+                continue
+            result, suggested_response, item_processing_time = outcome
+            output = {
+                'category': result.category,
+                'suggested_response': suggested_response,
+                'confidence': result.confidence,
+            }
+            self._store(cache_key, fingerprint, output)
+            output.update({'index': i, 'cached': False, 'processing_time': item_processing_time})
+            results[i] = output
+
+        for i, position in duplicates.items():
+            results[i] = dict(results[pending_indexes[position]], index=i, coalesced=True)
+        self.single_flight.add_coalesced(len(duplicates))
+
+        return results
+
+    def process_stream(self, items: Iterable, use_cache: bool = True) -> Iterator[Dict]:
+        """
+        Processa itens conforme chegam e devolve cada resultado assim que o seu
+        grupo termina. Os grupos começam com um item e dobram até
+        stream_batch_size: o primeiro resultado sai logo e os seguintes ainda
+        aproveitam o processamento em lote. Só o grupo atual fica em memória.
+
+        Os itens seguem o formato de process_items().
+        """
+        index = 0
+        group_size = 1
+        group: List = []
+        for item in items:
+            group.append(item)
+            if len(group) >= group_size:
+                for result in self.process_items(group, use_cache):
+                    result['index'] += index
+                    yield result
+                index += len(group)
+                group = []
+                group_size = min(group_size * 2, max(1, self.stream_batch_size))
+        if group:
+            for result in self.process_items(group, use_cache):
+                result['index'] += index
+                yield result
+
+    def process_items(self, items: List, use_cache: bool = True) -> List[Dict]:
+        """
+        Como process_many, para itens vindos de fora (stream ou fila de jobs):
+        cada item pode ser o texto do email ou um objeto {"text": ..., "id": ...},
+        e o "id" é devolvido no resultado. Exceções no lugar de um item (linha
+        inválida na entrada) viram um resultado de erro com o mesmo índice.
+        """
+        emails = []
+        for item in items:
+            if isinstance(item, dict):
+                item = item.get('text', item.get('email'))
+            emails.append(None if isinstance(item, Exception) else item)
+
+        results = self.process_many(emails, use_cache=use_cache)
+        for item, result in zip(items, results):
+            if isinstance(item, Exception):
+                result['error'] = str(item)
+            elif isinstance(item, dict) and 'id' in item:
+                result['id'] = item['id']
+        return results
+
+    def _process_batch(self, emails: List[AnalyzedEmail], start_time: float) -> List:
+        try:
+            with trace_span('classify', emails=len(emails)):
+                classifications = self.ai_classifier.classify_many(emails)
+            with trace_span('respond', emails=len(emails)):
+                responses = self.response_generator.generate_many(
+                    emails, [result.category for result in classifications]
+                )
+        except Exception as e:
+            logger.error(f"Erro ao processar lote de emails: {str(e)}")
+            return [e] * len(emails)
+
+        # Tempo amortizado: o lote é processado como uma unidade
+        item_processing_time = round((time.perf_counter() - start_time) / len(emails), 3)
+        return [(result, suggested_response, item_processing_time)
+                for result, suggested_response in zip(classifications, responses)]
+
+    async def _aprocess_item(self, email: AnalyzedEmail) -> Tuple:
+        start_time = time.perf_counter()
+        with trace_span('classify') as span:
+            result = await self.ai_classifier.aclassify(email)
+            _annotate(span, result)
+        # No modo combinado a resposta já veio na mesma chamada da classificação
+        suggested_response = result.suggested_response
+        if not suggested_response:
+            with trace_span('respond'):
+                suggested_response = await self.response_generator.agenerate_response(
+                    email, result.category, self._use_llm_response(result)
+                )
+        return result, suggested_response, round(time.perf_counter() - start_time, 3)
+
+    def _use_llm_response(self, result) -> Optional[bool]:
+        # Na cascata, email resolvido pelo nível barato recebe resposta de template:
+        # o LLM só é chamado para os emails escalonados
+        if self.ai_classifier.cascade_active and result.backend != 'openai':
+            return False
+        return None
+
+
+def _annotate(span, result):
+    if span is not None:
+        span.set('classifier.backend', result.backend)
+        span.set('classifier.category', result.category)
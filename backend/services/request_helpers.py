@@ -0,0 +1,139 @@
+import json
+import time
+import logging
+from io import BytesIO
+from typing import Iterable, Optional
+from flask import Flask, Response, g, request, stream_with_context
+from werkzeug.datastructures import FileStorage
+from services.metrics import REQUEST_SECONDS, REQUEST_SIZE_BYTES, REQUESTS_TOTAL
+from services.stream_reader import StreamFormatError
+from services.tracing import current_trace, iter_in_context, start_trace
+
+logger = logging.getLogger(__name__)
+
+# Cabeçalhos das respostas em streaming: X-Accel-Buffering desliga o buffer de
+# proxies (nginx) para cada linha ou evento sair na hora
+STREAM_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+def register_request_hooks(app: Flask):
+    """
+    Registra em uma aplicação Flask (backend/main.py ou api/index.py) as
+    métricas por rota e o trace de cada requisição, com o cabeçalho
+    Server-Timing na resposta.
+    """
+    app.before_request(start_request_timer)
+    app.after_request(record_request_metrics)
+    app.teardown_request(finish_request_trace)
+
+
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    rule = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.trace = start_trace(f"{request.method} {rule}", **{'http.method': request.method, 'http.route': rule})
+
+
+def record_request_metrics(response):
+    # Rota pelo padrão registrado (ex.: /jobs/<job_id>) para não multiplicar as séries
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    elapsed = time.perf_counter() - g.get('request_start', time.perf_counter())
+    REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, method=request.method)
+    REQUESTS_TOTAL.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    if request.content_length:
+        REQUEST_SIZE_BYTES.observe(request.content_length, endpoint=endpoint)
+    trace = g.get('trace')
+    if trace is not None:
+        trace.root.set('http.status_code', response.status_code)
+        response.headers['Server-Timing'] = trace.server_timing()
+        if response.is_streamed:
+            # O corpo ainda vai ser gerado: o trace só termina quando o stream fechar
+            response.call_on_close(g.pop('trace').finish)
+    return response
+
+
+def finish_request_trace(error=None):
+    trace = g.pop('trace', None)
+    if trace is not None:
+        trace.finish()
+
+
+def use_cache_for(data=None, read_form: bool = True) -> bool:
+    # Permite ignorar o cache por requisição: ?cache=false, campo "cache": false ou Cache-Control: no-cache
+    if 'no-cache' in request.headers.get('Cache-Control', ''):
+        return False
+    flag = request.args.get('cache')
+    if flag is None and read_form:
+        flag = request.form.get('cache')
+    if flag is None and isinstance(data, dict):
+        flag = data.get('cache')
+    if flag is None:
+        return True
+    return str(flag).lower() not in ('false', '0', 'no')
+
+
+def wants_timings(data=None) -> bool:
+    # Tempo por etapa no corpo da resposta: ?timings=true ou campo "timings": true
+    flag = request.args.get('timings')
+    if flag is None and isinstance(data, dict):
+        flag = data.get('timings')
+    return str(flag).lower() in ('true', '1', 'yes')
+
+
+def add_timings(response_data: dict, data=None) -> dict:
+    trace = current_trace()
+    if trace is not None and wants_timings(data):
+        response_data['timings'] = trace.durations()
+    return response_data
+
+
+def detach_upload(file: FileStorage) -> FileStorage:
+    # O Flask fecha os arquivos do upload quando a view retorna, antes de o
+    # stream ser lido: o gerador assume o arquivo e o fecha ao terminar
+    upload = FileStorage(file.stream, file.filename)
+    file.stream = BytesIO()
+    return upload
+
+
+def ndjson_response(pipeline, reader: Iterable, use_cache: bool, upload: Optional[FileStorage] = None) -> Response:
+    """Resultados de EmailPipeline.process_stream() em NDJSON, à medida que ficam prontos."""
+    def generate():
+        start_time = time.time()
+        total = 0
+        try:
+            for result in pipeline.process_stream(reader, use_cache=use_cache):
+                total += 1
+                yield json.dumps(result) + '\n'
+        except StreamFormatError as e:
+            yield json.dumps({'error': str(e)}) + '\n'
+        except Exception as e:
+            logger.error(f"Erro ao processar stream de emails: {str(e)}")
+            yield json.dumps({'error': f'Erro interno do servidor: {str(e)}'}) + '\n'
+        finally:
+            if upload is not None:
+                upload.close()
+        yield json.dumps({'done': True, 'total': total,
+                          'processing_time': round(time.time() - start_time, 3)}) + '\n'
+
+    return Response(stream_with_context(iter_in_context(generate())), mimetype='application/x-ndjson',
+                    headers=STREAM_HEADERS)
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def sse_response(pipeline, email_text: str, use_cache: bool) -> Response:
+    """Eventos de EmailPipeline.process_events() como Server-Sent Events."""
+    def generate():
+        start_time = time.time()
+        try:
+            for event, payload in pipeline.process_events(email_text, use_cache=use_cache):
+                if event == 'done':
+                    payload['processing_time'] = round(time.time() - start_time, 3)
+                yield sse_event(event, payload)
+        except Exception as e:
+            logger.error(f"Erro ao processar email: {str(e)}")
+            yield sse_event('error', {'error': f'Erro interno do servidor: {str(e)}'})
+
+    return Response(stream_with_context(iter_in_context(generate())), mimetype='text/event-stream',
+                    headers=STREAM_HEADERS)
@@ -1,7 +1,18 @@
 import os
+import asyncio
+import contextvars
 import logging
 import random
-from typing import Dict, List
+import threading
+import time
+from typing import AbstractSet, Dict, Iterator, List, Optional, Sequence, Union
+from services.analyzed_email import AnalyzedEmail, prime_keyword_hits
+from services.email_condenser import get_email_condenser
+from services.keywords import TEMPLATE_KEYWORDS, get_email_matcher
+from services.llm_fanout import get_fanout
+from services.llm_client import get_llm_factory
+from services.metrics import FALLBACKS, RESPONSE_SECONDS, track_llm_request
+from services.tracing import record_token_usage
 
 logger = logging.getLogger(__name__)
 
@@ -9,100 +20,258 @@ class ResponseGenerator:
     def __init__(self):
         self.openai_api_key = os.getenv('OPENAI_API_KEY')
         self.client = None
+        self.async_client = None
+        # Processo que obteve os clientes da fábrica: depois de um fork (ex.: gunicorn
+        # --preload com LAZY_INIT=false) o filho pede clientes novos, sem herdar conexões
+        self._clients_pid: Optional[int] = None
+        self.timeout = None
         self.use_openai = False
+        self.response_model = "gpt-3.5-turbo"
+        # O SDK da OpenAI só é importado na primeira geração (ou em warm_up)
+        self._init_lock = threading.Lock()
         
         if self.openai_api_key:
+            self.use_openai = True
+            logger.info("Usando OpenAI para geração de respostas")
+        else:
+            logger.info("OpenAI não configurado, usando templates de resposta")
+        
+        self._load_response_templates()
+        self.keyword_matcher = get_email_matcher()
+    
+    def warm_up(self):
+        if not self.use_openai:
+            return
+        try:
+            self._ensure_openai_clients()
+        except Exception:
+            pass
+    
+    def _clients_ready(self) -> bool:
+        # Clientes atribuídos de fora (ex.: falsos nos benchmarks) não têm processo registrado
+        return self.client is not None and self._clients_pid in (None, os.getpid())
+    
+    def _ensure_openai_clients(self):
+        if self._clients_ready():
+            return
+        with self._init_lock:
+            if self._clients_ready():
+                return
             try:
                 import openai
                 if hasattr(openai, 'OpenAI'):
-                    self.client = openai.OpenAI(api_key=self.openai_api_key)
+                    factory = get_llm_factory()
+                    self.timeout = factory.timeout_for('generate')
+                    if hasattr(openai, 'AsyncOpenAI'):
+                        self.async_client = factory.get_async_client(self.openai_api_key)
+                    self.client = factory.get_client(self.openai_api_key)
+                    self._clients_pid = os.getpid()
                 else:
                     openai.api_key = self.openai_api_key
                     self.client = openai
-                
-                self.use_openai = True
-                logger.info("Usando OpenAI para geração de respostas")
             except Exception as e:
                 logger.error(f"Erro ao inicializar OpenAI: {str(e)}")
                 logger.info("Fallback para templates de resposta")
                 self.use_openai = False
-        else:
-            logger.info("OpenAI não configurado, usando templates de resposta")
-        
-        self._load_response_templates()
+                raise
     
-    def generate_response(self, email_text: str, classification: str) -> str:
+    @property
+    def model_identity(self) -> str:
+        return f"openai:{self.response_model}" if self.use_openai else "templates"
+    
+    @staticmethod
+    def _as_analyzed(email_text: Union[str, AnalyzedEmail]) -> AnalyzedEmail:
+        return email_text if isinstance(email_text, AnalyzedEmail) else AnalyzedEmail(email_text)
+    
+    def generate_response(self, email_text: Union[str, AnalyzedEmail], classification: str,
+                          use_openai: Optional[bool] = None) -> str:
+        # use_openai=False força os templates (ex.: emails resolvidos pelo nível barato da cascata)
+        start_time = time.perf_counter()
+        backend = 'templates'
         try:
-            if self.use_openai:
-                return self._generate_with_openai(email_text, classification)
+            if self.use_openai and use_openai is not False:
+                backend = 'openai'
+                response = self._generate_with_openai(email_text, classification)
             else:
-                return self._generate_with_templates(email_text, classification)
+                response = self._generate_with_templates(email_text, classification)
         except Exception as e:
             logger.error(f"Erro na geração de resposta: {str(e)}")
-            return self._generate_with_templates(email_text, classification)
+            FALLBACKS.inc(stage='response', backend=backend)
+            backend = 'templates'
+            response = self._generate_with_templates(email_text, classification)
+        RESPONSE_SECONDS.observe(time.perf_counter() - start_time, backend=backend)
+        return response
+    
+    def _response_request(self, email_text: Union[str, AnalyzedEmail], classification: str) -> Dict:
+        # O prompt leva só a mensagem atual, sem histórico citado nem assinatura
+        if isinstance(email_text, AnalyzedEmail):
+            email_text = email_text.condensed.text
+        else:
+            email_text = get_email_condenser().condense(email_text).text
+        return {
+            'model': self.response_model,
+            'messages': [
+                {"role": "system", "content": self._get_response_system_prompt()},
+                {"role": "user", "content": self._build_response_prompt(email_text, classification)}
+            ],
+            'max_tokens': 200,
+            'temperature': 0.3
+        }
     
     def _generate_with_openai(self, email_text: str, classification: str) -> str:
+        self._ensure_openai_clients()
         try:
-            prompt = self._build_response_prompt(email_text, classification)
-            
-            if hasattr(self.client, 'chat') and hasattr(self.client.chat, 'completions'):
-                response = self.client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": self._get_response_system_prompt()},
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=200,
-                    temperature=0.3
-                )
-                return response.choices[0].message.content.strip()
-            else:
-                response = self.client.ChatCompletion.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": self._get_response_system_prompt()},
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=200,
-                    temperature=0.3
-                )
-                return response.choices[0].message.content.strip()
+            with track_llm_request('generate', self.response_model) as span:
+                if hasattr(self.client, 'chat') and hasattr(self.client.chat, 'completions'):
+                    response = self.client.chat.completions.create(
+                        **self._response_request(email_text, classification), timeout=self.timeout
+                    )
+                else:
+                    response = self.client.ChatCompletion.create(
+                        **self._response_request(email_text, classification)
+                    )
+                record_token_usage(span, response)
+            return response.choices[0].message.content.strip()
             
         except Exception as e:
             logger.error(f"Erro na geração OpenAI: {str(e)}")
             raise
     
-    def _generate_with_templates(self, email_text: str, classification: str) -> str:
-        email_lower = email_text.lower()
+    def stream_response(self, email_text: Union[str, AnalyzedEmail], classification: str,
+                        use_openai: Optional[bool] = None) -> Iterator[str]:
+        """
+        Resposta sugerida em trechos, à medida que fica pronta: com a OpenAI,
+        cada pedaço da completion em streaming; com templates (ou se a OpenAI
+        falhar antes do primeiro trecho), a resposta inteira de uma vez.
+        """
+        start_time = time.perf_counter()
+        backend = 'templates'
+        if self.use_openai and use_openai is not False:
+            backend = 'openai'
+            started = False
+            try:
+                for chunk in self._stream_with_openai(email_text, classification):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                # Depois do primeiro trecho o cliente já recebeu parte da resposta
+                if started:
+                    raise
+                logger.error(f"Erro na geração de resposta: {str(e)}")
+            if started:
+                RESPONSE_SECONDS.observe(time.perf_counter() - start_time, backend=backend)
+                return
+            FALLBACKS.inc(stage='response', backend=backend)
+            backend = 'templates'
+        yield self._generate_with_templates(email_text, classification)
+        RESPONSE_SECONDS.observe(time.perf_counter() - start_time, backend=backend)
+    
+    def _stream_with_openai(self, email_text: Union[str, AnalyzedEmail], classification: str) -> Iterator[str]:
+        self._ensure_openai_clients()
+        if not (hasattr(self.client, 'chat') and hasattr(self.client.chat, 'completions')):
+            # Legacy SDK: sem streaming, a resposta inteira em um trecho
+            yield self._generate_with_openai(email_text, classification)
+            return
+
+        start_time = time.perf_counter()
+        with track_llm_request('generate_stream', self.response_model) as span:
+            stream = self.client.chat.completions.create(
+                **self._response_request(email_text, classification), stream=True,
+                stream_options={'include_usage': True}, timeout=self.timeout
+            )
+            try:
+                leading = True
+                for event in stream:
+                    # Só o último evento traz a contagem de tokens (include_usage)
+                    record_token_usage(span, event)
+                    if not event.choices:
+                        continue
+                    text = event.choices[0].delta.content or ''
+                    if leading:
+                        # Como o .strip() da resposta completa
+                        text = text.lstrip()
+                        leading = not text
+                        if text and span is not None:
+                            span.set('gen_ai.response.time_to_first_chunk_ms',
+                                     round((time.perf_counter() - start_time) * 1000, 3))
+                    if text:
+                        yield text
+            finally:
+                close = getattr(stream, 'close', None)
+                if close is not None:
+                    close()
+    
+    async def agenerate_response(self, email_text: Union[str, AnalyzedEmail], classification: str,
+                                 use_openai: Optional[bool] = None) -> str:
+        if not self.use_openai or use_openai is False:
+            return self.generate_response(email_text, classification, use_openai)
+        start_time = time.perf_counter()
+        backend = 'openai'
+        try:
+            response = await self._agenerate_with_openai(email_text, classification)
+        except Exception as e:
+            logger.error(f"Erro na geração de resposta: {str(e)}")
+            FALLBACKS.inc(stage='response', backend='openai')
+            backend = 'templates'
+            response = self._generate_with_templates(email_text, classification)
+        RESPONSE_SECONDS.observe(time.perf_counter() - start_time, backend=backend)
+        return response
+    
+    async def _agenerate_with_openai(self, email_text: str, classification: str) -> str:
+        self._ensure_openai_clients()
+        if self.async_client is None:
+            # SDK sem cliente assíncrono: executa a chamada bloqueante fora do loop
+            loop = asyncio.get_running_loop()
+            async with get_fanout().in_flight():
+                return await loop.run_in_executor(
+                    None, contextvars.copy_context().run, self._generate_with_openai, email_text, classification
+                )
         
-        if classification == "Produtivo":
-            return self._get_productive_response(email_lower)
-        else:
-            return self._get_unproductive_response(email_lower)
-    
-    def _get_productive_response(self, email_text: str) -> str:
-        if any(word in email_text for word in ['suporte', 'técnico', 'problema', 'erro', 'bug']):
-            templates = self.response_templates['productive']['technical_support']
-        elif any(word in email_text for word in ['status', 'andamento', 'atualização']):
-            templates = self.response_templates['productive']['status_request']
-        elif any(word in email_text for word in ['dúvida', 'questão', 'pergunta']):
-            templates = self.response_templates['productive']['question']
-        elif any(word in email_text for word in ['documento', 'arquivo', 'relatório']):
-            templates = self.response_templates['productive']['document_request']
-        else:
-            templates = self.response_templates['productive']['general']
+        try:
+            async with get_fanout().in_flight():
+                with track_llm_request('generate', self.response_model) as span:
+                    response = await self.async_client.chat.completions.create(
+                        **self._response_request(email_text, classification), timeout=self.timeout
+                    )
+                    record_token_usage(span, response)
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            logger.error(f"Erro na geração OpenAI: {str(e)}")
+            raise
+    
+    def generate_many(self, email_texts: Sequence[Union[str, AnalyzedEmail]],
+                      classifications: List[str]) -> List[str]:
+        if self.use_openai:
+            results = get_fanout().map(
+                lambda item: self.agenerate_response(*item), list(zip(email_texts, classifications))
+            )
+            return [result if isinstance(result, str)
+                    else self._generate_with_templates(email_text, classification)
+                    for email_text, classification, result in zip(email_texts, classifications, results)]
         
-        return random.choice(templates)
+        start_time = time.perf_counter()
+        emails = [self._as_analyzed(email_text) for email_text in email_texts]
+        # Sem custo extra quando o classificador por regras já varreu o mesmo lote
+        prime_keyword_hits(emails)
+        responses = [self._select_template(email.keyword_hits, classification)
+                     for email, classification in zip(emails, classifications)]
+        if responses:
+            RESPONSE_SECONDS.observe((time.perf_counter() - start_time) / len(responses),
+                                     count=len(responses), backend='templates')
+        return responses
     
-    def _get_unproductive_response(self, email_text: str) -> str:
-        if any(word in email_text for word in ['obrigado', 'agradecimento', 'grato']):
-            templates = self.response_templates['unproductive']['thanks']
-        elif any(word in email_text for word in ['parabéns', 'felicitações', 'aniversário']):
-            templates = self.response_templates['unproductive']['congratulations']
-        elif any(word in email_text for word in ['natal', 'ano novo', 'feriado']):
-            templates = self.response_templates['unproductive']['holidays']
+    def _generate_with_templates(self, email_text: Union[str, AnalyzedEmail], classification: str) -> str:
+        return self._select_template(self._as_analyzed(email_text).keyword_hits, classification)
+    
+    def _select_template(self, hits: Dict[str, AbstractSet[str]], classification: str) -> str:
+        kind = 'productive' if classification == "Produtivo" else 'unproductive'
+        
+        for name in TEMPLATE_KEYWORDS[kind]:
+            if hits[f'template.{name}']:
+                templates = self.response_templates[kind][name]
+                break
         else:
-            templates = self.response_templates['unproductive']['general']
+            templates = self.response_templates[kind]['general']
         
         return random.choice(templates)
     
@@ -0,0 +1,113 @@
+import os
+import time
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Custo fixo aproximado de uma entrada (chave, tupla, dicionário) além dos textos
+ENTRY_OVERHEAD_BYTES = 256
+
+
+class ResultCache:
+    """
+    Cache LRU de resultados do pipeline, endereçado pelo conteúdo.
+
+    A chave é o hash do texto normalizado por EmailProcessor.preprocess_text
+    junto com a identidade dos modelos de classificação e de resposta, então
+    trocar de backend ou de modelo invalida naturalmente as entradas antigas.
+    O despejo respeita tanto o número de entradas quanto um orçamento de bytes,
+    e cada entrada expira após o TTL.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                 ttl: Optional[float] = None):
+        self.enabled = os.getenv('RESULT_CACHE_ENABLED', 'true').lower() == 'true'
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('RESULT_CACHE_MAX_ENTRIES', 10000))
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+        self.ttl = ttl if ttl is not None else float(os.getenv('RESULT_CACHE_TTL', 3600))
+
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(processed_text: str, model_identity: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(model_identity.encode('utf-8'))
+        digest.update(b'\x00')
+        digest.update(processed_text.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    @staticmethod
+    def _size_of(key: str, value: Dict) -> int:
+        size = ENTRY_OVERHEAD_BYTES + len(key)
+        for item in value.values():
+            if isinstance(item, str):
+                size += len(item.encode('utf-8', 'surrogatepass'))
+        return size
+
+    def get(self, key: str) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(value)
+
+    def put(self, key: str, value: Dict):
+        if not self.enabled:
+            return
+        size = self._size_of(key, value)
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (dict(value), size, time.monotonic() + self.ttl)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
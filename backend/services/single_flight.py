@@ -0,0 +1,95 @@
+import os
+import threading
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Agrupa chamadas simultâneas com a mesma chave em uma única execução.
+
+    A primeira thread a pedir uma chave executa a função; as que chegam
+    enquanto ela está em andamento esperam e recebem o mesmo resultado (ou a
+    mesma exceção). A chave sai do mapa assim que a execução termina, então
+    pedidos posteriores passam pelo cache normalmente. Quem espera mais que
+    ``timeout`` segundos desiste de esperar e executa a função por conta própria,
+    para que uma chamada travada não prenda todas as outras.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.enabled = os.getenv('COALESCE_ENABLED', 'true').lower() == 'true'
+        self.timeout = timeout if timeout is not None else float(os.getenv('COALESCE_TIMEOUT', 30))
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+        self.shared_errors = 0
+        self.timeouts = 0
+
+    def do(self, key: Optional[str], function: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Executa ``function`` ou espera a execução em andamento; devolve (resultado, compartilhado)."""
+        if not self.enabled or key is None:
+            return function(), False
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+
+        if leader:
+            try:
+                call.result = function()
+                return call.result, False
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.event.set()
+
+        if not call.event.wait(self.timeout):
+            with self._lock:
+                self.timeouts += 1
+            logger.warning(f"Chamada agrupada excedeu {self.timeout}s; executando separadamente")
+            return function(), False
+
+        with self._lock:
+            self.coalesced += 1
+            if call.error is not None:
+                self.shared_errors += 1
+        if call.error is not None:
+            raise call.error
+        return call.result, True
+
+    def add_coalesced(self, count: int):
+        """Conta pedidos agrupados fora de do(), como textos repetidos em um mesmo lote."""
+        if count:
+            with self._lock:
+                self.coalesced += count
+
+    def stats(self) -> Dict:
+        with self._lock:
+            requests = self.executions + self.coalesced
+            return {
+                'enabled': self.enabled,
+                'in_flight': len(self._calls),
+                'executions': self.executions,
+                'coalesced': self.coalesced,
+                'coalesced_rate': round(self.coalesced / requests, 4) if requests else 0.0,
+                'shared_errors': self.shared_errors,
+                'timeouts': self.timeouts,
+            }
@@ -0,0 +1,137 @@
+import json
+import codecs
+from typing import Any, Iterator
+
+
+class StreamFormatError(ValueError):
+    pass
+
+
+class JsonStreamReader:
+    """
+    Lê itens JSON de um stream de bytes conforme chegam, sem carregar o corpo inteiro.
+
+    Aceita NDJSON (um valor JSON por linha) ou um único array JSON. Só o item
+    em leitura fica em memória, limitado a ``max_item_chars``. Em NDJSON uma
+    linha inválida é devolvida como StreamFormatError no lugar do item (as
+    demais linhas continuam válidas); em um array o erro interrompe a leitura.
+
+    Servidores WSGI costumam bloquear em ``read(n)`` até juntar os n bytes,
+    então as leituras começam pequenas e dobram até ``read_size``: os
+    primeiros itens ficam disponíveis sem esperar 64 KB de entrada.
+    """
+
+    NUMBER_CHARS = frozenset('0123456789.eE+-')
+
+    def __init__(self, stream, read_size: int = 64 * 1024, max_item_chars: int = 1024 * 1024,
+                 first_read_size: int = 256):
+        self.stream = stream
+        self.read_size = read_size
+        self._next_read_size = min(first_read_size, read_size)
+        self.max_item_chars = max_item_chars
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        """Lê mais um bloco do stream; False quando não há mais dados."""
+        if self._eof:
+            return False
+        chunk = self.stream.read(self._next_read_size)
+        self._next_read_size = min(self._next_read_size * 2, self.read_size)
+        self._eof = not chunk
+        try:
+            text = self._decoder.decode(chunk or b'', final=self._eof)
+        except UnicodeDecodeError:
+            raise StreamFormatError('Corpo da requisição não está em UTF-8')
+        # Descarta o que já foi consumido antes de crescer o buffer
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        return bool(text) or not self._eof
+
+    def _check_item_size(self):
+        if len(self._buffer) - self._pos > self.max_item_chars:
+            raise StreamFormatError(f'Item maior que o limite de {self.max_item_chars} caracteres')
+
+    def _skip_whitespace(self) -> bool:
+        """Avança até o próximo caractere não branco; False no fim do stream."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return True
+            if not self._fill():
+                return False
+
+    def __iter__(self) -> Iterator[Any]:
+        if not self._skip_whitespace():
+            return
+        if self._buffer[self._pos] == '[':
+            self._pos += 1
+            yield from self._iter_array()
+        else:
+            yield from self._iter_lines()
+
+    def _iter_array(self) -> Iterator[Any]:
+        first = True
+        while True:
+            if not self._skip_whitespace():
+                raise StreamFormatError('Array JSON incompleto')
+            if self._buffer[self._pos] == ']' and first:
+                return
+            if not first:
+                separator = self._buffer[self._pos]
+                self._pos += 1
+                if separator == ']':
+                    return
+                if separator != ',':
+                    raise StreamFormatError('Esperado "," entre os itens do array')
+                if not self._skip_whitespace():
+                    raise StreamFormatError('Array JSON incompleto')
+            yield self._decode_value()
+            first = False
+
+    def _decode_value(self) -> Any:
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._pos)
+                # Um número no fim do buffer pode estar cortado ('4' de '42', '4.' de '4.5')
+                truncated = end == len(self._buffer) or (
+                    isinstance(value, (int, float)) and self._buffer[end] in self.NUMBER_CHARS
+                )
+                if self._eof or not truncated:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self._eof:
+                    raise StreamFormatError(f'JSON inválido: {e.msg}')
+            self._check_item_size()
+            self._fill()
+
+    def _iter_lines(self) -> Iterator[Any]:
+        line_number = 0
+        while True:
+            newline = self._buffer.find('\n', self._pos)
+            if newline == -1:
+                self._check_item_size()
+                if self._fill():
+                    continue
+                line = self._buffer[self._pos:]
+                self._pos = len(self._buffer)
+                if line.strip():
+                    yield self._parse_line(line, line_number + 1)
+                return
+
+            line = self._buffer[self._pos:newline]
+            self._pos = newline + 1
+            line_number += 1
+            if line.strip():
+                yield self._parse_line(line, line_number)
+
+    def _parse_line(self, line: str, line_number: int) -> Any:
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError as e:
+            return StreamFormatError(f'JSON inválido na linha {line_number}: {e.msg}')
@@ -0,0 +1,247 @@
+import os
+import json
+import time
+import threading
+import contextvars
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_current_trace: contextvars.ContextVar[Optional['Trace']] = contextvars.ContextVar('current_trace', default=None)
+_current_span: contextvars.ContextVar[Optional['Span']] = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    __slots__ = ('name', 'span_id', 'parent_id', 'start_ns', 'end_ns', 'attributes', 'error')
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+
+class Trace:
+    """
+    Spans de uma requisição: a raiz cobre a requisição inteira e cada etapa
+    (upload, extração, pré-processamento, classificação, chamadas ao LLM,
+    geração de resposta) é um filho. O trace atual fica em um ContextVar,
+    então as etapas não precisam receber nada por parâmetro e corrotinas
+    executadas pelo AsyncFanout continuam no mesmo trace.
+    """
+
+    def __init__(self, name: str, max_spans: int, attributes: Dict[str, Any]):
+        self.trace_id = os.urandom(16).hex()
+        self.max_spans = max_spans
+        self.root = Span(name, None, attributes)
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._tokens = ()
+
+    def add(self, span: Span) -> bool:
+        with self._lock:
+            if len(self.spans) >= self.max_spans:
+                self.dropped += 1
+                return False
+            self.spans.append(span)
+            return True
+
+    def durations(self) -> Dict[str, float]:
+        """Tempo total por etapa em ms (etapas repetidas, como em um lote, são somadas)."""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for span in self.spans:
+                totals[span.name] = totals.get(span.name, 0.0) + span.duration_ms
+        totals['total'] = self.root.duration_ms
+        return {name: round(value, 3) for name, value in totals.items()}
+
+    def server_timing(self) -> str:
+        return ', '.join(f"{name};dur={value}" for name, value in self.durations().items())
+
+    def finish(self):
+        self.root.end()
+        for variable, token in reversed(self._tokens):
+            try:
+                variable.reset(token)
+            except ValueError:
+                # Encerrado em outro contexto (ex.: fim de uma resposta em stream)
+                variable.set(None)
+        self._tokens = ()
+        get_exporter().export(self)
+
+
+def start_trace(name: str, **attributes) -> Optional[Trace]:
+    """Abre um trace no contexto atual; encerre com Trace.finish() no mesmo contexto."""
+    if not TRACING_ENABLED:
+        return None
+    trace = Trace(name, TRACE_MAX_SPANS, attributes)
+    trace._tokens = ((_current_trace, _current_trace.set(trace)), (_current_span, _current_span.set(trace.root)))
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def trace_span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """Span filho do span atual; fora de um trace não registra nada e devolve None."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    parent = _current_span.get()
+    span = Span(name, parent.span_id if parent is not None else None, attributes)
+    if not trace.add(span):
+        yield None
+        return
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        span.end()
+        _current_span.reset(token)
+
+
+def iter_in_context(iterator: Iterator) -> Iterator:
+    """
+    Consome ``iterator`` sempre no contexto de quem chamou esta função. O corpo
+    de uma resposta em stream é gerado depois que a view retorna, fora do
+    contexto da requisição, e sem isso as etapas não entrariam no trace.
+    """
+    context = contextvars.copy_context()
+
+    def run() -> Iterator:
+        while True:
+            try:
+                item = context.run(next, iterator)
+            except StopIteration:
+                return
+            yield item
+
+    return run()
+
+
+def record_token_usage(span: Optional[Span], response):
+    """Contagem de tokens de uma resposta da OpenAI, nos atributos gen_ai.* do OpenTelemetry."""
+    usage = getattr(response, 'usage', None)
+    if span is None or usage is None:
+        return
+    for attribute, field in (('gen_ai.usage.input_tokens', 'prompt_tokens'),
+                             ('gen_ai.usage.output_tokens', 'completion_tokens')):
+        value = getattr(usage, field, None)
+        if value is not None:
+            span.set(attribute, value)
+
+
+class TraceFileExporter:
+    """
+    Grava traces em um arquivo JSONL, um objeto por trace no formato OTLP/JSON
+    do OpenTelemetry (resourceSpans), que ferramentas como o otel-collector
+    (receiver otlpjsonfile) ou o Jaeger importam sem depender de rede.
+    Só traces com duração de pelo menos TRACE_EXPORT_MIN_MS são gravados.
+    """
+
+    def __init__(self, path: Optional[str] = None, min_duration_ms: Optional[float] = None):
+        self.path = path if path is not None else os.getenv('TRACE_EXPORT_PATH') or None
+        self.min_duration_ms = min_duration_ms if min_duration_ms is not None else \
+            float(os.getenv('TRACE_EXPORT_MIN_MS', 0))
+        self.service_name = os.getenv('OTEL_SERVICE_NAME', 'autou-email-classifier')
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace):
+        if not self.path or trace.root.duration_ms < self.min_duration_ms:
+            return
+        try:
+            line = json.dumps(self.to_otlp(trace), ensure_ascii=False)
+            with self._lock:
+                with open(self.path, 'a', encoding='utf-8') as file:
+                    file.write(line + '\n')
+        except Exception as e:
+            logger.error(f"Erro ao exportar trace: {str(e)}")
+
+    def to_otlp(self, trace: Trace) -> Dict:
+        with trace._lock:
+            spans = [trace.root] + list(trace.spans)
+        root_attributes = dict(trace.root.attributes)
+        if trace.dropped:
+            root_attributes['trace.dropped_spans'] = trace.dropped
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': _otlp_attributes({
+                    'service.name': self.service_name,
+                    'process.pid': os.getpid(),
+                })},
+                'scopeSpans': [{
+                    'scope': {'name': 'services.tracing'},
+                    'spans': [
+                        {
+                            'traceId': trace.trace_id,
+                            'spanId': span.span_id,
+                            'parentSpanId': span.parent_id or '',
+                            'name': span.name,
+                            # 2 = SERVER para a raiz, 1 = INTERNAL para as etapas
+                            'kind': 2 if span is trace.root else 1,
+                            'startTimeUnixNano': str(span.start_ns),
+                            'endTimeUnixNano': str(span.end_ns or span.start_ns),
+                            'attributes': _otlp_attributes(root_attributes if span is trace.root
+                                                           else span.attributes),
+                            'status': {'code': 2, 'message': span.error} if span.error else {'code': 1},
+                        }
+                        for span in spans
+                    ],
+                }],
+            }]
+        }
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict]:
+    converted = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            typed = {'boolValue': value}
+        elif isinstance(value, int):
+            typed = {'intValue': str(value)}
+        elif isinstance(value, float):
+            typed = {'doubleValue': value}
+        else:
+            typed = {'stringValue': str(value)}
+        converted.append({'key': key, 'value': typed})
+    return converted
+
+
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'true').lower() == 'true'
+# Lotes grandes geram um span por etapa de cada email; acima do limite os spans são só contados
+TRACE_MAX_SPANS = int(os.getenv('TRACE_MAX_SPANS', 1000))
+
+_exporter: Optional[TraceFileExporter] = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter() -> TraceFileExporter:
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = TraceFileExporter()
+        return _exporter
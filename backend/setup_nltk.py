@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Baixa os dados do NLTK usados no desenvolvimento e no build da imagem.
+
+O serviço não depende do NLTK para atender requisições, então este passo
+nunca é executado durante o serving (inclusive na Vercel).
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+NLTK_RESOURCES = {
+    'punkt': 'tokenizers/punkt',
+    'stopwords': 'corpora/stopwords',
+}
+
+
+def download_nltk_data():
+    try:
+        import nltk
+    except ImportError:
+        print("⚠️  NLTK não instalado, pulando download de dados")
+        return
+
+    for package, resource in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            try:
+                nltk.download(package, quiet=True)
+            except Exception as e:
+                logger.warning(f"Falha ao baixar dados NLTK '{package}' (ignorado): {str(e)}")
+
+
+if __name__ == "__main__":
+    download_nltk_data()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Relatório de tempo de inicialização (cold start) da API.
+
+Importa a aplicação em um processo Python novo com `-X importtime`, mede o
+tempo até a aplicação estar pronta e o da primeira requisição, e lista os
+módulos mais caros. Também indica quais módulos pesados foram carregados
+na inicialização; com a inicialização preguiçosa eles só devem aparecer
+depois da primeira requisição que precisar deles.
+
+Uso:
+    python tools/startup_report.py [--target api|backend] [--top 15] [--json]
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT_DIR = os.path.dirname(BACKEND_DIR)
+
+HEAVY_MODULES = ['nltk', 'PyPDF2', 'openai', 'httpx', 'sklearn', 'numpy', 'scipy']
+
+TARGETS = {
+    'api': (os.path.join(ROOT_DIR, 'api'), 'index', '/api/classify'),
+    'backend': (BACKEND_DIR, 'main', '/classify'),
+}
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module} as app_module
+ready = time.perf_counter() - start
+loaded_at_startup = sorted(name for name in {heavy!r} if name in sys.modules)
+client = app_module.app.test_client()
+start = time.perf_counter()
+client.post({route!r}, json={{'text': 'Preciso de ajuda com o acesso ao sistema?'}})
+first_request = time.perf_counter() - start
+print(json.dumps({{'ready_seconds': ready, 'first_request_seconds': first_request,
+                  'heavy_modules_at_startup': loaded_at_startup}}))
+"""
+
+
+def parse_importtime(stderr: str):
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            modules.append({
+                'module': name.strip(),
+                'depth': (len(name) - len(name.lstrip()) - 1) // 2,
+                'self_ms': int(self_us) / 1000,
+                'cumulative_ms': int(cumulative_us) / 1000,
+            })
+        except ValueError:
+            continue
+    return modules
+
+
+def run_report(target: str, top: int):
+    cwd, module, route = TARGETS[target]
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    env.pop('OPENAI_API_KEY', None)
+    probe = PROBE.format(module=module, heavy=HEAVY_MODULES, route=route)
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', probe],
+        cwd=cwd, env=env, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr[-2000:])
+
+    probe_result = json.loads(completed.stdout.strip().splitlines()[-1])
+    modules = parse_importtime(completed.stderr)
+    top_level = [m for m in modules if m['depth'] == 0]
+    return {
+        'target': target,
+        'python': sys.version.split()[0],
+        **probe_result,
+        'import_total_ms': round(sum(m['cumulative_ms'] for m in top_level), 1),
+        'top_cumulative': sorted(top_level, key=lambda m: m['cumulative_ms'], reverse=True)[:top],
+        'top_self': sorted(modules, key=lambda m: m['self_ms'], reverse=True)[:top],
+    }
+
+
+def print_report(report):
+    print(f"=== Cold start: {report['target']} (Python {report['python']}) ===")
+    print(f"Aplicação pronta em:      {report['ready_seconds'] * 1000:8.1f} ms")
+    print(f"Primeira requisição em:   {report['first_request_seconds'] * 1000:8.1f} ms")
+    print(f"Total de imports (-X importtime): {report['import_total_ms']:.1f} ms")
+    heavy = report['heavy_modules_at_startup']
+    print(f"Módulos pesados na inicialização: {', '.join(heavy) if heavy else 'nenhum'}")
+    print("\nImports de nível superior mais caros (cumulativo):")
+    for m in report['top_cumulative']:
+        print(f"  {m['cumulative_ms']:9.1f} ms  {m['module']}")
+    print("\nMódulos mais caros (tempo próprio):")
+    for m in report['top_self']:
+        print(f"  {m['self_ms']:9.1f} ms  {m['module']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Relatório de tempo de inicialização')
+    parser.add_argument('--target', choices=sorted(TARGETS), default='api')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--json', action='store_true', help='Emite o relatório em JSON')
+    args = parser.parse_args()
+
+    report = run_report(args.target, args.top)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
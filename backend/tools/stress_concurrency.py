@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Teste de estresse de concorrência do pipeline de classificação.
+
+Executa o mesmo conjunto de emails sequencialmente e depois a partir de um
+pool de threads (direto no pipeline e pelas rotas Flask), e verifica que cada
+requisição recebe exatamente o resultado da sua própria entrada. O caminho
+OpenAI é exercitado com um cliente falso que responde com latência aleatória,
+para que as chamadas se intercalem como em produção.
+
+Uso:
+    python tools/stress_concurrency.py [--threads 32] [--rounds 20]
+"""
+
+import os
+import sys
+import json
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'training'))
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'benchmarks'))
+
+from training_data import TRAINING_DATA, VALIDATION_DATA
+from services.email_processor import EmailProcessor
+from services.ai_classifier import AIClassifier
+from services.response_generator import ResponseGenerator
+from services.pipeline import EmailPipeline
+from synthetic import fake_clients, fake_llm_output
+
+
+def _fake_verdict(classifier, text: str):
+    """Categoria e confiança que o cliente falso devolve para o pedido de classificação de ``text``."""
+    request = classifier._classification_request(classifier._as_analyzed(text).llm_text)
+    verdict = json.loads(fake_llm_output(request['messages']))
+    return verdict['classificacao'], verdict['confianca']
+
+
+def build_corpus(size: int):
+    base = [item['email'] for item in TRAINING_DATA + VALIDATION_DATA]
+    rng = random.Random(42)
+    return [f"{rng.choice(base)} Protocolo {i}." for i in range(size)]
+
+
+def run_pool(function, items, threads):
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(function, items))
+
+
+def check(name, expected, actual):
+    mismatches = sum(1 for e, a in zip(expected, actual) if e != a)
+    status = 'OK' if mismatches == 0 and len(expected) == len(actual) else 'FALHOU'
+    print(f"[{status}] {name}: {len(actual)} resultados, {mismatches} divergentes")
+    return status == 'OK'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de estresse de concorrência')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ.pop('OPENAI_API_KEY', None)
+    corpus = build_corpus(args.threads * args.rounds)
+
+    processor = EmailProcessor()
+    classifier = AIClassifier()
+    generator = ResponseGenerator()
+    pipeline = EmailPipeline(processor, classifier, generator)
+    ok = True
+
+    def classify_key(text):
+        result = classifier.classify(processor.preprocess_text(text))
+        return result.category, result.confidence
+
+    def pipeline_key(text):
+        result = pipeline.process(text)
+        return result['category'], result['confidence']
+
+    # Backend ativo (regras ou modelo local)
+    expected = [classify_key(text) for text in corpus]
+    ok &= check(f"classify ({classifier.backend})", expected,
+                run_pool(classify_key, corpus, args.threads))
+    ok &= check("pipeline.process", expected, run_pool(pipeline_key, corpus, args.threads))
+
+    # Caminho OpenAI com cliente falso e latência aleatória
+    classifier.client, classifier.async_client = fake_clients(jitter=0.005)
+    classifier.use_openai = True
+    expected = [_fake_verdict(classifier, processor.preprocess_text(text)) for text in corpus]
+    ok &= check("classify (openai falso)", expected, run_pool(classify_key, corpus, args.threads))
+
+    # Rotas Flask, como em um servidor com workers em threads
+    from main import app, pipeline as app_pipeline
+    app_pipeline.ai_classifier = classifier
+    client = app.test_client()
+
+    # Sem cache: os textos só diferem no número do protocolo, que o cache de quase
+    # duplicados mascara, e um resultado reaproveitado não testaria a reentrância
+    def route_key(text):
+        data = client.post('/classify', json={'text': text, 'cache': False}).get_json()
+        return data['category'], data['confidence']
+
+    ok &= check("POST /classify", expected, run_pool(route_key, corpus, args.threads))
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,20 +5,21 @@ Script para aumentar os dados de treinamento usando variações automáticas
 import os
 import json
 import sys
-from openai import OpenAI
 from training_data import get_training_examples
 import random
 
 # Adicionar o diretório pai ao path para importar load_env
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from load_env import load_env
+from services.llm_client import get_llm_factory
 
 # Carregar variáveis de ambiente
 load_env()
 
 class DataAugmenter:
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        factory = get_llm_factory()
+        self.client = factory.get_client().with_options(timeout=factory.timeout_for('training'))
         
     def generate_variations(self, original_email, category, num_variations=3):
         """
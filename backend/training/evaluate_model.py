@@ -5,7 +5,6 @@ Script para avaliar a performance do modelo treinado
 import json
 import os
 import sys
-from openai import OpenAI
 from training_data import get_validation_examples, get_training_examples
 import re
 from collections import Counter
@@ -13,13 +12,15 @@ from collections import Counter
 # Adicionar o diretório pai ao path para importar load_env
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from load_env import load_env
+from services.llm_client import get_llm_factory
 
 # Carregar variáveis de ambiente
 load_env()
 
 class ModelEvaluator:
     def __init__(self, model_id=None):
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        factory = get_llm_factory()
+        self.client = factory.get_client().with_options(timeout=factory.timeout_for('training'))
         self.model_id = model_id or "gpt-3.5-turbo"  # Modelo padrão se não especificado
         
     def extract_classification(self, response_text):
@@ -0,0 +1,56 @@
+"""
+Script para treinar o classificador local (TF-IDF + regressão logística)
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Adicionar o diretório pai ao path para importar os serviços
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.email_processor import EmailProcessor
+from services.local_model import LocalModel, DEFAULT_MODEL_PATH, load_training_examples
+from training_data import get_validation_examples
+
+
+def main():
+    """
+    Treina o modelo local e salva o artefato versionado
+    """
+    parser = argparse.ArgumentParser(description='Treina o classificador local de emails')
+    parser.add_argument('--output', default=os.getenv('LOCAL_MODEL_PATH', DEFAULT_MODEL_PATH),
+                        help='Caminho do artefato do modelo')
+    parser.add_argument('--augmented', nargs='*', default=None,
+                        help='Arquivos JSON de dados aumentados (padrão: training/augmented*.json)')
+    args = parser.parse_args()
+
+    processor = EmailProcessor()
+    examples = load_training_examples(args.augmented)
+    texts = [processor.preprocess_text(item['email']) for item in examples]
+    labels = [item['category'] for item in examples]
+
+    print(f"Treinando modelo local com {len(texts)} exemplos...")
+    model = LocalModel.train(texts, labels)
+
+    # Mantém uma cópia por versão e atualiza o artefato carregado pela API
+    base, ext = os.path.splitext(args.output)
+    versioned_path = model.save(f"{base}_{model.version}{ext}")
+    model.save(args.output)
+    print(f"Modelo salvo em: {args.output} (versão {model.version}, cópia em {versioned_path})")
+
+    validation = get_validation_examples()
+    validation_texts = [processor.preprocess_text(item['email']) for item in validation]
+    predictions = model.predict(validation_texts)
+    correct = sum(1 for (category, _), item in zip(predictions, validation)
+                  if category == item['category'])
+    print(f"Acurácia na validação: {correct}/{len(validation)}")
+
+    start = time.perf_counter()
+    model.predict(texts)
+    elapsed = time.perf_counter() - start
+    print(f"Latência média de inferência em lote: {elapsed / len(texts) * 1000:.3f} ms/email")
+
+
+if __name__ == "__main__":
+    main()
@@ -34,9 +34,9 @@ export class AppComponent {
   onFileSelected(event: any) {
     const file = event.target.files[0];
     if (file) {
-      const allowedTypes = ['text/plain', 'application/pdf'];
-      if (!allowedTypes.includes(file.type) && !file.name.endsWith('.txt') && !file.name.endsWith('.pdf')) {
-        this.snackBar.open('Tipo de arquivo não suportado. Use apenas .txt ou .pdf', 'Fechar', {
+      const allowedTypes = ['text/plain', 'application/pdf', 'message/rfc822'];
+      if (!allowedTypes.includes(file.type) && !file.name.endsWith('.txt') && !file.name.endsWith('.pdf') && !file.name.endsWith('.eml')) {
+        this.snackBar.open('Tipo de arquivo não suportado. Use apenas .txt, .pdf ou .eml', 'Fechar', {
           duration: 4000,
           horizontalPosition: 'center',
           verticalPosition: 'bottom'